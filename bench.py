@@ -0,0 +1,512 @@
+# bench.py (入退室 ingest / レポート系エンドポイントの負荷テスト・ベンチマーク)
+"""
+合成した学校データ（学科・生徒・1年分の授業計画・入退室の打刻）を投入し、
+Flask アプリを test client もしくはローカルサーバ経由で指定並列度で叩いて、
+ルートごとの p50/p95/p99 レイテンシ・スループット・1リクエストあたりのクエリ数を
+JSON に保存する。結果ファイルを run ごとに比較すれば性能劣化を検出できる。
+
+使い方:
+  # SQLite（既定: 一時ファイル）に合成データを投入して test client で計測
+  python bench.py --gakka 3 --students 40 --requests 300 --concurrency 8
+
+  # ローカル PostgreSQL に投入して計測
+  python bench.py --db postgresql://user:pw@localhost/bench
+
+  # 既に起動済みのサーバ（gunicorn 等）を HTTP で叩く（データ投入は --db 側に行う）
+  python bench.py --db postgresql://... --mode server --url http://127.0.0.1:5000
+
+  # 打刻専用サービス（APP_PROFILE=ingest, :5001）だけを叩く。画面側に帳票の負荷を
+  # かけながら実行すれば、打刻の応答が影響を受けていないかを確認できる
+  python bench.py --db postgresql://... --no-seed --mode server --url http://127.0.0.1:5001 \
+      --routes api_add,api_camlog
+
+  # 前回結果と比較（p95 が 20% 以上悪化したルートを表示）
+  python bench.py --compare bench_results_prev.json
+
+  # コールドスタート: APP_PROFILE ごとの import 時間・メモリ（RSS）・読み込みモジュール数
+  python bench.py --mode import --repeat 10
+
+※ 投入先 DB の既存データは全て削除されます。school3.db など本番 DB には使わないこと。
+"""
+import argparse
+import json
+import math
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time as time_mod
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+
+# =========================================================================
+# 合成データの定数
+# =========================================================================
+PERIODS = [
+    (1, time(8, 50), time(10, 30)),
+    (2, time(10, 35), time(12, 15)),
+    (3, time(13, 0), time(14, 40)),
+    (4, time(14, 45), time(16, 25)),
+    (5, time(16, 40), time(18, 20)),
+]
+WEEKDAY_NAMES = ["授業日", "月曜日", "火曜日", "水曜日", "木曜日", "金曜日", "土曜日", "日曜日", "祝祭日"]
+SUBJECTS_PER_GAKKA = 12
+
+# 打刻分布（1日単位）
+P_ABSENT_DAY = 0.05      # その日まるごと欠席
+P_LATE_DAY   = 0.10      # 1限に遅刻
+P_LUNCH_OUT  = 0.60      # 昼休みに一度退出→再入室
+
+
+# =========================================================================
+# 合成データ投入
+# =========================================================================
+def _school_year_days(year: int):
+    """year 年度（4/1〜翌3/31）の平日を (日付, 期, 曜日) で返す。期は四半期で 1〜4。"""
+    d = date(year, 4, 1)
+    end = date(year + 1, 3, 31)
+    while d <= end:
+        wd = d.isoweekday()  # 1=月 … 7=日
+        if wd <= 5:
+            months_from_april = (d.month - 4) % 12
+            term = months_from_april // 3 + 1
+            yield d, term, wd
+        d += timedelta(days=1)
+
+
+def _taps_for_day(rng: random.Random, d: date):
+    """1生徒1日分の打刻 [(datetime, 入室区分)] を生成する。"""
+    if rng.random() < P_ABSENT_DAY:
+        return []
+    first_start = datetime.combine(d, PERIODS[0][1])
+    if rng.random() < P_LATE_DAY:
+        first_in = first_start + timedelta(minutes=rng.uniform(1, 30))
+    else:
+        first_in = first_start - timedelta(minutes=abs(rng.gauss(8, 5)))
+    taps = [(first_in, "入室")]
+    if rng.random() < P_LUNCH_OUT:
+        lunch_out = datetime.combine(d, PERIODS[1][2]) + timedelta(minutes=rng.uniform(0, 10))
+        lunch_in = datetime.combine(d, PERIODS[2][1]) - timedelta(minutes=rng.uniform(0, 10))
+        taps += [(lunch_out, "退出"), (lunch_in, "入室")]
+    last_end = datetime.combine(d, PERIODS[3][2])
+    taps.append((last_end + timedelta(minutes=rng.uniform(0, 40)), "退出"))
+    return taps
+
+
+def _status_for(ts: datetime, kubun: str) -> str:
+    """web.get_attendance_status と同じ規則を TimeTable 定数で近似する（投入の高速化用）。"""
+    t = ts.time()
+    rec = next((p for p in PERIODS if p[1] <= t < p[2]), None)
+    if rec is None:
+        rec = PERIODS[0] if t < PERIODS[0][1] else next(
+            (p for p in PERIODS if t < p[1]), PERIODS[-1])
+    if kubun == "退出":
+        return "一時退出" if t < rec[2] else "退出"
+    if t <= rec[1]:
+        return "出席"
+    return "遅刻" if t <= rec[2] else "欠席"
+
+
+def seed_synthetic_school(web, *, gakka: int, students: int, year: int,
+                          until: Optional[date], seed: int) -> dict:
+    """既存データを消去し、合成した学校データを一括投入する。投入件数を返す。"""
+    rng = random.Random(seed)
+    import models as m
+    from datastore import _to_utc
+    tables = [
+        m.入退室, m.カメラ区間, m.カメラログ, m.出欠集計, m.欠席理由, m.特別時間割, m.週時間割, m.授業計画,
+        m.入退室_入力, m.生徒, m.授業科目, m.教室, m.学科, m.TimeTable, m.期マスタ, m.曜日マスタ,
+    ]
+    plan = [(d, term, wd) for d, term, wd in _school_year_days(year)
+            if until is None or d <= until]
+
+    rows = {
+        "曜日マスタ": [{"曜日ID": i, "曜日名": n} for i, n in enumerate(WEEKDAY_NAMES)],
+        "期マスタ": [{"期ID": i, "期名": f"{i}期"} for i in range(1, 5)],
+        "TimeTable": [{"時限": p, "開始時刻": s, "終了時刻": e, "備考": f"{p}限目"}
+                      for p, s, e in PERIODS],
+        "学科": [{"学科ID": g, "学科名": f"合成学科{g}"} for g in range(1, gakka + 1)],
+        "教室": [{"教室ID": 100 + g, "教室名": f"R{g:03d}", "収容人数": students}
+                 for g in range(1, gakka + 1)],
+        "授業科目": [],
+        "週時間割": [],
+        "生徒": [],
+        "授業計画": [{"日付": d, "期": term, "授業曜日": wd} for d, term, wd in plan],
+        "入退室": [],
+    }
+    for g in range(1, gakka + 1):
+        subj_ids = [g * 100 + k for k in range(1, SUBJECTS_PER_GAKKA + 1)]
+        rows["授業科目"] += [
+            {"授業科目ID": sid, "授業科目名": f"科目{sid}", "学科ID": g, "単位": 2, "学科フラグ": 0}
+            for sid in subj_ids
+        ]
+        for term in range(1, 5):
+            for wd in range(1, 6):
+                for p, _, _ in PERIODS[:4]:
+                    rows["週時間割"].append({
+                        "年度": year, "学科ID": g, "期": term, "曜日": wd, "時限": p,
+                        "科目ID": rng.choice(subj_ids), "教室ID": 100 + g, "備考": "合成",
+                    })
+        rows["生徒"] += [
+            {"学科ID": g, "学生番号": n, "生徒名": f"生徒{g}-{n:03d}"}
+            for n in range(1, students + 1)
+        ]
+        for n in range(1, students + 1):
+            name = f"生徒{g}-{n:03d}"
+            for d, _, _ in plan:
+                for ts, kubun in _taps_for_day(rng, d):
+                    rows["入退室"].append({
+                        "学生番号": n, "生徒名": name, "学科ID": g,
+                        "入退出時間": _to_utc(ts.replace(microsecond=0)), "日付": d, "入室区分": kubun,
+                        "出席状態": _status_for(ts, kubun),
+                    })
+
+    with web.app.app_context():
+        with m.db.engine.begin() as conn:
+            for model in tables:
+                conn.execute(model.__table__.delete())
+            for model in reversed(tables):
+                data = rows.get(model.__tablename__)
+                if data:
+                    conn.execute(model.__table__.insert(), data)
+
+    return {k: len(v) for k, v in rows.items()}
+
+
+# =========================================================================
+# クエリ計数（サーバ側で QUERY_STATS=1 のとき Server-Timing ヘッダから読む）
+# =========================================================================
+_SERVER_TIMING_RE = re.compile(r'db;dur=([0-9.]+);desc="queries=(\d+) rows=(\d+)"')
+
+
+def parse_server_timing(header: Optional[str]):
+    """Server-Timing ヘッダから (クエリ数, DB時間ms) を取り出す。無ければ (None, None)。"""
+    m = _SERVER_TIMING_RE.search(header or "")
+    if not m:
+        return None, None
+    return int(m.group(2)), float(m.group(1))
+
+
+# =========================================================================
+# シナリオ（ルートごとのリクエスト生成）
+# =========================================================================
+def build_scenarios(rng: random.Random, *, gakka: int, students: int, year: int):
+    """ルート名 -> (method, path, payload を返す関数)"""
+    def any_student():
+        return rng.randint(1, students), rng.randint(1, gakka)
+
+    def api_add():
+        n, g = any_student()
+        d = date(year, 4, 1) + timedelta(days=rng.randint(0, 364))
+        ts = datetime.combine(d, time(8, 30)) + timedelta(minutes=rng.randint(0, 600))
+        return "POST", "/api/add", {"student": n, "gakka": g, "ts": ts.strftime("%Y-%m-%d %H:%M:%S")}
+
+    def api_camlog():
+        return "POST", "/api/camlog", {
+            "status": rng.choice(["detected", "ok", "ok", "ok", "lost"]),
+            "marker": f"m{rng.randint(1, students)}", "score": round(rng.random(), 3),
+        }
+
+    def kamoku():
+        g = rng.randint(1, gakka)
+        sid = g * 100 + rng.randint(1, SUBJECTS_PER_GAKKA)
+        return "GET", f"/kamoku?subject_id={sid}&term=0", None
+
+    def subject_rate():
+        n, g = any_student()
+        return "GET", f"/subject_rate?student_key={n}-{g}&term=0", None
+
+    def absent_reason():
+        n, g = any_student()
+        sid = g * 100 + rng.randint(1, SUBJECTS_PER_GAKKA)
+        return "GET", f"/absent_reason?term=0&student_key={n}-{g}&subject_id={sid}", None
+
+    def summary():
+        n, g = any_student()
+        q = urllib.parse.urlencode({"student_no": n, "gakka_id": g,
+                                    "start": f"{year}-04-01", "end": f"{year + 1}-03-31"})
+        return "GET", f"/summary?{q}", None
+
+    def index():
+        return "GET", "/", None
+
+    def tukijikanwari():
+        return "GET", f"/tukijikanwari?year={year}&month={rng.randint(1, 12)}", None
+
+    return {
+        "api_add": api_add,
+        "api_camlog": api_camlog,
+        "index": index,
+        "kamoku": kamoku,
+        "subject_rate": subject_rate,
+        "absent_reason": absent_reason,
+        "summary": summary,
+        "tukijikanwari": tukijikanwari,
+    }
+
+
+# =========================================================================
+# 計測
+# =========================================================================
+def _percentile(sorted_vals, pct):
+    """nearest-rank 方式のパーセンタイル"""
+    if not sorted_vals:
+        return None
+    k = max(0, min(len(sorted_vals) - 1, math.ceil(pct / 100.0 * len(sorted_vals)) - 1))
+    return sorted_vals[k]
+
+
+class _ClientDriver:
+    """Flask test client でリクエストを送る（スレッドごとに client を持つ）。"""
+
+    def __init__(self, web):
+        self.web = web
+        self._local = threading.local()
+
+    def _client(self):
+        c = getattr(self._local, "client", None)
+        if c is None:
+            c = self._local.client = self.web.app.test_client()
+            with c.session_transaction() as sess:
+                sess["logs_ok"] = True
+        return c
+
+    def send(self, method, path, payload):
+        c = self._client()
+        if method == "POST":
+            resp = c.post(path, json=payload)
+        else:
+            resp = c.get(path)
+        resp.close()
+        return resp.status_code, parse_server_timing(resp.headers.get("Server-Timing"))
+
+
+class _ServerDriver:
+    """起動済みのサーバへ HTTP でリクエストを送る（サーバを QUERY_STATS=1 で起動すればクエリ数も取れる）。"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+
+    def send(self, method, path, payload):
+        data, headers = None, {}
+        if method == "POST":
+            data = json.dumps(payload).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(req, timeout=60) as resp:
+                resp.read()
+                return resp.status, parse_server_timing(resp.headers.get("Server-Timing"))
+        except urllib.error.HTTPError as e:
+            return e.code, parse_server_timing(e.headers.get("Server-Timing"))
+
+
+def run_route(driver, make_request, *, n_requests: int, concurrency: int) -> dict:
+    latencies, queries, db_times, statuses = [], [], [], {}
+    lock = threading.Lock()
+
+    def one(_):
+        method, path, payload = make_request()
+        t0 = time_mod.perf_counter()
+        try:
+            status, (q, db_ms) = driver.send(method, path, payload)
+        except Exception:
+            status, q, db_ms = "exception", None, None
+        dt = (time_mod.perf_counter() - t0) * 1000.0
+        with lock:
+            latencies.append(dt)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            if q is not None:
+                queries.append(q)
+                db_times.append(db_ms)
+
+    wall0 = time_mod.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        list(ex.map(one, range(n_requests)))
+    wall = time_mod.perf_counter() - wall0
+
+    latencies.sort()
+    errors = sum(c for s, c in statuses.items() if not s.isdigit() or int(s) >= 400)
+    return {
+        "requests": n_requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "status_counts": statuses,
+        "throughput_rps": round(n_requests / wall, 2) if wall > 0 else None,
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies), 3),
+            "p50": round(_percentile(latencies, 50), 3),
+            "p95": round(_percentile(latencies, 95), 3),
+            "p99": round(_percentile(latencies, 99), 3),
+            "max": round(latencies[-1], 3),
+        },
+        "queries_per_request": (round(statistics.fmean(queries), 2) if queries else None),
+        "db_ms_per_request": (round(statistics.fmean(db_times), 3) if db_times else None),
+    }
+
+
+def compare_results(current: dict, previous_path: str, threshold: float = 0.20):
+    """前回の結果ファイルと p95 を比較し、悪化したルートを表示する。"""
+    with open(previous_path, encoding="utf-8") as f:
+        prev = json.load(f)
+    regressions = []
+    for route, cur in current["routes"].items():
+        old = prev.get("routes", {}).get(route)
+        if not old:
+            continue
+        a, b = old["latency_ms"]["p95"], cur["latency_ms"]["p95"]
+        change = (b - a) / a if a else 0.0
+        mark = "  <-- 悪化" if change > threshold else ""
+        print(f"  {route:16s} p95 {a:9.2f}ms -> {b:9.2f}ms ({change:+.0%}){mark}")
+        if change > threshold:
+            regressions.append(route)
+    return regressions
+
+
+# =========================================================================
+# コールドスタート（import 時間・メモリ）
+#   プロファイルごとに新しいインタプリタで `import web` だけを行い、
+#   所要時間・最大 RSS・読み込んだモジュール数を測る（DB には接続しない）。
+# =========================================================================
+_IMPORT_PROBE = """
+import json, resource, sys, time
+t0 = time.perf_counter()
+import web
+elapsed = time.perf_counter() - t0
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({
+    "import_ms": elapsed * 1000,
+    # Linux は KB、macOS は bytes
+    "rss_mb": rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024,
+    "modules": len(sys.modules),
+}))
+"""
+
+
+def run_import_bench(profiles, *, repeat: int, db_url: str) -> dict:
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for profile in profiles:
+        env = {**os.environ, "APP_PROFILE": profile, "DATABASE_URL": db_url}
+        samples = []
+        for _ in range(repeat):
+            out = subprocess.run([sys.executable, "-c", _IMPORT_PROBE], cwd=here, env=env,
+                                 capture_output=True, text=True, check=True).stdout
+            samples.append(json.loads(out.strip().splitlines()[-1]))
+        times = sorted(s["import_ms"] for s in samples)
+        results[profile] = {
+            "import_ms": {"p50": round(_percentile(times, 50), 1),
+                          "min": round(times[0], 1), "max": round(times[-1], 1)},
+            "rss_mb": round(statistics.median(s["rss_mb"] for s in samples), 1),
+            "modules": samples[-1]["modules"],
+        }
+        r = results[profile]
+        print(f"  {profile:8s} import p50 {r['import_ms']['p50']:8.1f}ms  "
+              f"rss {r['rss_mb']:6.1f}MB  modules {r['modules']}")
+    return results
+
+
+# =========================================================================
+# エントリポイント
+# =========================================================================
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="入退室システムのベンチマーク")
+    ap.add_argument("--db", default=None,
+                    help="投入先 DATABASE_URL（既定: 一時ディレクトリの SQLite）")
+    ap.add_argument("--mode", choices=["client", "server", "import"], default="client")
+    ap.add_argument("--url", default="http://127.0.0.1:5000", help="--mode server の接続先")
+    ap.add_argument("--gakka", type=int, default=3, help="学科数")
+    ap.add_argument("--students", type=int, default=30, help="学科あたりの生徒数")
+    ap.add_argument("--year", type=int, default=2025, help="授業計画を生成する年度")
+    ap.add_argument("--until", default=None,
+                    help="この日付(YYYY-MM-DD)までの授業計画・打刻を生成（既定: 年度末まで）")
+    ap.add_argument("--no-seed", action="store_true", help="データ投入を行わず既存データで計測")
+    ap.add_argument("--routes", default=None, help="計測するルート名（カンマ区切り）")
+    ap.add_argument("--requests", type=int, default=200, help="ルートあたりのリクエスト数")
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--seed", type=int, default=42, help="乱数シード")
+    ap.add_argument("--out", default="bench_results.json")
+    ap.add_argument("--compare", default=None, help="比較対象の前回結果 JSON")
+    ap.add_argument("--profiles", default="full,ingest", help="--mode import で測る APP_PROFILE")
+    ap.add_argument("--repeat", type=int, default=5, help="--mode import の試行回数")
+    args = ap.parse_args(argv)
+
+    db_url = args.db or "sqlite:///" + os.path.join(tempfile.gettempdir(), "aribaba_bench.db")
+    if args.mode == "import":
+        results = {
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "mode": "import",
+            "profiles": run_import_bench(args.profiles.split(","), repeat=args.repeat, db_url=db_url),
+        }
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"[bench] 結果を {args.out} に保存しました。")
+        return 0
+    os.environ["DATABASE_URL"] = db_url
+    if args.mode == "client":
+        # クエリ数は instrumentation の Server-Timing ヘッダから読む
+        os.environ["QUERY_STATS"] = "1"
+
+    # DATABASE_URL を確定させてから import する（web はインポート時に DB 設定を読む）
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import web
+    web.init_db_on_startup()
+
+    until = datetime.strptime(args.until, "%Y-%m-%d").date() if args.until else None
+    seeded = None
+    if not args.no_seed:
+        t0 = time_mod.perf_counter()
+        seeded = seed_synthetic_school(web, gakka=args.gakka, students=args.students,
+                                       year=args.year, until=until, seed=args.seed)
+        print(f"[bench] 合成データ投入: {seeded} ({time_mod.perf_counter() - t0:.1f}s)")
+
+    if args.mode == "client":
+        driver = _ClientDriver(web)
+    else:
+        driver = _ServerDriver(args.url)
+
+    rng = random.Random(args.seed)
+    scenarios = build_scenarios(rng, gakka=args.gakka, students=args.students, year=args.year)
+    selected = args.routes.split(",") if args.routes else list(scenarios)
+
+    with web.app.app_context():
+        dialect = web.db.engine.dialect.name
+    results = {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "db": dialect,
+        "mode": args.mode,
+        "params": {k: v for k, v in vars(args).items() if k not in ("compare",)},
+        "seeded_rows": seeded,
+        "routes": {},
+    }
+    for name in selected:
+        if name not in scenarios:
+            print(f"[bench] 未知のルート名: {name}", file=sys.stderr)
+            continue
+        r = run_route(driver, scenarios[name], n_requests=args.requests, concurrency=args.concurrency)
+        results["routes"][name] = r
+        lat = r["latency_ms"]
+        print(f"  {name:16s} {r['throughput_rps']:>8} req/s  p50 {lat['p50']:8.2f}ms  "
+              f"p95 {lat['p95']:8.2f}ms  p99 {lat['p99']:8.2f}ms  "
+              f"q/req {r['queries_per_request']}  db/req {r['db_ms_per_request']}ms  errors {r['errors']}")
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2, default=str)
+    print(f"[bench] 結果を {args.out} に保存しました。")
+
+    if args.compare:
+        regressions = compare_results(results, args.compare)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,398 @@
+# camera_worker.py (教室カメラの AR マーカー検出ワーカー)
+"""
+複数のカメラ / 動画から ArUco マーカーを検出し、/api/camlog/batch へまとめて送る。
+検出したマーカーが生徒に割り当てられていれば、サーバ側（fusion.py）で入室の打刻になる。
+
+  1. 取り込み … ソースごとに1スレッドで VideoCapture から読み、グレースケール化して検出に回す
+                 （検出が追いつかないときは古いフレームを捨てて最新を優先する）
+  2. 検出     … プロセスプールで並列に実行（ArUco 検出器は各ワーカーの起動時に1回だけ作る）
+  3. 状態     … マーカーが映り始めたら detected、映っている間は HEARTBEAT 秒ごとに ok、
+                 LOST_AFTER 秒映らなければ lost を出す（毎フレームは送らない）
+  4. 送信     … イベントを溜め、BATCH 件か FLUSH 秒ごとに JSON 1回で送る。
+                 送れなかった分は残して次回に再送する（上限 MAX_BUFFER 件、古いものから捨てる）
+
+使い方:
+  pip install -r requirements-camera.txt
+
+  # USB カメラ 0 番・1 番と RTSP カメラを監視して ingest サーバへ送る
+  python camera_worker.py --url http://127.0.0.1:5001 \
+      --source room101=0 --source room102=1 --source room103=rtsp://cam103/stream
+
+  # 録画ファイルで検出だけを計測（送信しない）。コアあたりの frames/sec を表示・保存する
+  python camera_worker.py --bench rec1.mp4 rec2.mp4 --workers 4 --out camera_bench.json
+
+ArUco の検出には信頼度が無いので、スコアは写っているマーカーの大きさ（1辺の画素数）を
+FULL_SCORE_SIDE 画素で 1.0 とした目安にする（遠くて小さいマーカーほど低い）。
+サーバ側では FUSION_MIN_SCORE 未満の検出は打刻に使わない。
+"""
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time as time_mod
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+try:
+    import cv2
+    import numpy as np
+except ImportError:  # pragma: no cover - 任意依存（requirements-camera.txt）
+    cv2 = np = None
+
+try:
+    import requests
+except ImportError:  # pragma: no cover - 任意依存（requirements-camera.txt）
+    requests = None
+
+CAMERA_DICT = os.environ.get("CAMERA_DICT", "DICT_4X4_50")
+CAMERA_WORKERS = int(os.environ.get("CAMERA_WORKERS", str(os.cpu_count() or 1)))
+FULL_SCORE_SIDE = float(os.environ.get("CAMERA_FULL_SCORE_SIDE", "40"))  # 画素
+HEARTBEAT = float(os.environ.get("CAMERA_HEARTBEAT", "30"))               # 秒
+LOST_AFTER = float(os.environ.get("CAMERA_LOST_AFTER", "5"))              # 秒
+BATCH = int(os.environ.get("CAMERA_BATCH", "200"))
+FLUSH = float(os.environ.get("CAMERA_FLUSH", "1"))                        # 秒
+MAX_BUFFER = int(os.environ.get("CAMERA_MAX_BUFFER", "20000"))
+
+
+# =========================================================================
+# 検出（プロセスプールのワーカー側）
+# =========================================================================
+_detect = None
+
+
+def _init_detector(dict_name: str):
+    """ワーカー起動時に1回だけ ArUco 検出器を作る。"""
+    global _detect
+    # 並列はプロセスで取るので、OpenCV 内部のスレッドは使わない
+    cv2.setNumThreads(1)
+    dictionary = cv2.aruco.getPredefinedDictionary(getattr(cv2.aruco, dict_name))
+    if hasattr(cv2.aruco, "ArucoDetector"):  # OpenCV 4.7 以降
+        _detect = cv2.aruco.ArucoDetector(dictionary, cv2.aruco.DetectorParameters()).detectMarkers
+    else:
+        params = cv2.aruco.DetectorParameters_create()
+        _detect = lambda img: cv2.aruco.detectMarkers(img, dictionary, parameters=params)
+
+
+def detect_markers(gray) -> list:
+    """グレースケール画像から [(マーカーID, 1辺の画素数), ...] を返す。"""
+    corners, ids, _rejected = _detect(gray)
+    if ids is None:
+        return []
+    found = []
+    for c, marker_id in zip(corners, ids.flatten()):
+        pts = c.reshape(4, 2)
+        side = float(np.linalg.norm(pts - np.roll(pts, 1, axis=0), axis=1).mean())
+        found.append((int(marker_id), side))
+    return found
+
+
+def _score(side: float) -> float:
+    return round(min(1.0, side / FULL_SCORE_SIDE), 3)
+
+
+# =========================================================================
+# 取り込み（ソースごとのスレッド）
+# =========================================================================
+def parse_source(spec: str, index: int):
+    """'名前=0' / '名前=rtsp://...' / '0' / 'video.mp4' → (名前, VideoCapture に渡す値)"""
+    name, sep, target = spec.partition("=")
+    if not sep:
+        name, target = f"cam{index}", spec
+    return name, int(target) if target.isdigit() else target
+
+
+class MarkerTracker:
+    """1ソース分のマーカーの映り方を覚え、detected / ok / lost のイベントにする。"""
+
+    def __init__(self, source: str, marker_format: str):
+        self.source = source
+        self.marker_format = marker_format
+        self.seen = {}  # マーカーID -> [最初に映った時刻, 最後に映った時刻, 最後に送った時刻]
+
+    def update(self, now: float, found) -> list:
+        events = []
+        for marker_id, side in found:
+            st = self.seen.get(marker_id)
+            if st is None:
+                self.seen[marker_id] = [now, now, now]
+                events.append(self._event("detected", marker_id, side, now))
+            else:
+                st[1] = now
+                if now - st[2] >= HEARTBEAT:
+                    st[2] = now
+                    events.append(self._event("ok", marker_id, side, now))
+        for marker_id, st in list(self.seen.items()):
+            if now - st[1] > LOST_AFTER:
+                del self.seen[marker_id]
+                events.append(self._event("lost", marker_id, None, now))
+        return events
+
+    def _event(self, status: str, marker_id: int, side, now: float) -> dict:
+        return {
+            "source": self.source, "status": status,
+            "marker": self.marker_format.format(id=marker_id),
+            "score": _score(side) if side is not None else None,
+            # オフセット付きで送る（サーバはオフセット無しを学校の現地時刻とみなすので、
+            # UTC のホスト・コンテナで動かしてもずれないように）
+            "ts": datetime.fromtimestamp(now).astimezone().isoformat(timespec="seconds"),
+        }
+
+
+def capture_loop(name, target, pool, sink, stop: threading.Event, *, every: int, marker_format: str):
+    """1ソースを読み続け、検出結果をイベントにして sink に渡す。"""
+    tracker = MarkerTracker(name, marker_format)
+    cap = cv2.VideoCapture(target)
+    if not cap.isOpened():
+        print(f"[camera] {name}: 開けませんでした: {target}", file=sys.stderr)
+        return
+    inflight = None
+    n = 0
+    try:
+        while not stop.is_set():
+            ok, frame = cap.read()
+            if not ok:
+                # カメラの瞬断は開き直す（動画ファイルなら終わり）
+                if isinstance(target, str) and os.path.isfile(target):
+                    break
+                time_mod.sleep(1.0)
+                cap.release()
+                cap = cv2.VideoCapture(target)
+                continue
+            n += 1
+            if n % every:
+                continue
+            # 前のフレームの検出が終わっていなければこのフレームは捨てる（遅れを溜めない）
+            if inflight is not None:
+                if not inflight.done():
+                    continue
+                sink(tracker.update(*inflight.result()))
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            now = time_mod.time()
+            inflight = _Stamped(pool.submit(detect_markers, gray), now)
+        if inflight is not None:
+            sink(tracker.update(*inflight.result()))
+    finally:
+        cap.release()
+
+
+class _Stamped:
+    """検出の Future に撮影時刻を添える（result() が (時刻, 検出結果) を返す）。"""
+
+    def __init__(self, future, ts: float):
+        self.future = future
+        self.ts = ts
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def result(self):
+        return self.ts, self.future.result()
+
+
+# =========================================================================
+# 送信（/api/camlog/batch）
+# =========================================================================
+class BatchSender:
+    """イベントを溜めてまとめて送る。送れなかった分は次回に再送する。"""
+
+    def __init__(self, url: str, timeout: float = 10.0):
+        self.url = url.rstrip("/") + "/api/camlog/batch"
+        self.timeout = timeout
+        self.queue = queue.Queue()
+        self.buffer = []
+        self.session = requests.Session()
+        self.sent = 0
+        self.dropped = 0
+
+    def put(self, events):
+        for e in events:
+            self.queue.put(e)
+
+    def run(self, stop: threading.Event):
+        delay = FLUSH
+        while True:
+            # BATCH 件たまるか delay 秒たつまで集める
+            deadline = time_mod.monotonic() + delay
+            while len(self.buffer) < BATCH:
+                timeout = deadline - time_mod.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    self.buffer.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            if len(self.buffer) > MAX_BUFFER:
+                self.dropped += len(self.buffer) - MAX_BUFFER
+                del self.buffer[:len(self.buffer) - MAX_BUFFER]
+            while self.buffer and self._post(self.buffer[:BATCH]):
+                del self.buffer[:BATCH]
+            # サーバが落ちているときは間隔を延ばして再送する
+            delay = min(delay * 2, 60.0) if self.buffer else FLUSH
+            if stop.is_set() and self.queue.empty():
+                # 終了時は残りを一度だけ送ってみて、送れなかった分は破棄として数える
+                while self.buffer and self._post(self.buffer[:BATCH]):
+                    del self.buffer[:BATCH]
+                self.dropped += len(self.buffer)
+                self.buffer.clear()
+                break
+
+    def _post(self, events) -> bool:
+        try:
+            resp = self.session.post(self.url, json={"events": events}, timeout=self.timeout)
+        except requests.RequestException as e:
+            print(f"[camera] 送信失敗: {e}", file=sys.stderr)
+            return False
+        if resp.status_code == 400:
+            # 不正なイベントは再送しても通らないので捨てる
+            print(f"[camera] 送信拒否: {resp.text[:200]}", file=sys.stderr)
+            self.dropped += len(events)
+            return True
+        if resp.status_code >= 300:
+            print(f"[camera] 送信失敗: HTTP {resp.status_code}", file=sys.stderr)
+            return False
+        self.sent += len(events)
+        return True
+
+
+def run_worker(args) -> int:
+    sources = [parse_source(s, i) for i, s in enumerate(args.source)]
+    sender = BatchSender(args.url)
+    stop = threading.Event()
+    sender_thread = threading.Thread(target=sender.run, args=(stop,), name="camlog-sender")
+    sender_thread.start()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_detector,
+                             initargs=(args.dict,)) as pool:
+        threads = [
+            threading.Thread(target=capture_loop, name=f"capture-{name}",
+                             args=(name, target, pool, sender.put, stop),
+                             kwargs={"every": args.every, "marker_format": args.marker_format})
+            for name, target in sources
+        ]
+        for t in threads:
+            t.start()
+        print(f"[camera] {len(sources)} ソース / 検出 {args.workers} プロセス → {sender.url}")
+        try:
+            while any(t.is_alive() for t in threads):
+                time_mod.sleep(0.5)
+        except KeyboardInterrupt:
+            pass
+        stop.set()
+        for t in threads:
+            t.join()
+    sender_thread.join()
+    print(f"[camera] 送信 {sender.sent} 件 / 破棄 {sender.dropped} 件")
+    return 0
+
+
+# =========================================================================
+# ベンチマーク（録画ファイルで検出だけを計測）
+# =========================================================================
+def _read_frames(path: str, every: int, out: "queue.Queue"):
+    cap = cv2.VideoCapture(path)
+    n = 0
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        n += 1
+        if n % every == 0:
+            out.put((path, cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)))
+    cap.release()
+    out.put((path, None))
+
+
+def run_bench(args) -> int:
+    """全フレームを（捨てずに）検出し、frames/sec とコアあたりの値を報告する。"""
+    frames = queue.Queue(maxsize=args.workers * 4)
+    readers = [threading.Thread(target=_read_frames, args=(p, args.every, frames), daemon=True)
+               for p in args.bench]
+    per_file = {p: {"frames": 0, "detections": 0, "markers": set()} for p in args.bench}
+    pending = []
+
+    def tally(path, found):
+        per_file[path]["frames"] += 1
+        per_file[path]["detections"] += len(found)
+        per_file[path]["markers"].update(m for m, _ in found)
+
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_detector,
+                             initargs=(args.dict,)) as pool:
+        # ワーカーの起動（検出器の作成）は計測に含めない
+        list(pool.map(detect_markers, [np.zeros((64, 64), dtype=np.uint8)] * args.workers))
+        started = time_mod.perf_counter()
+        for r in readers:
+            r.start()
+        remaining = len(readers)
+        while remaining:
+            path, gray = frames.get()
+            if gray is None:
+                remaining -= 1
+                continue
+            pending.append((path, pool.submit(detect_markers, gray)))
+            # 結果は出来た順に回収し、Future を溜めすぎない
+            while len(pending) > args.workers * 4 or (pending and pending[0][1].done()):
+                p, fut = pending.pop(0)
+                tally(p, fut.result())
+        for p, fut in pending:
+            tally(p, fut.result())
+    wall = time_mod.perf_counter() - started
+
+    total = sum(f["frames"] for f in per_file.values())
+    fps = total / wall if wall > 0 else None
+    results = {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "mode": "bench",
+        "opencv": cv2.__version__,
+        "dict": args.dict,
+        "workers": args.workers,
+        "every": args.every,
+        "frames": total,
+        "seconds": round(wall, 3),
+        "fps": round(fps, 2) if fps else None,
+        "fps_per_core": round(fps / args.workers, 2) if fps else None,
+        "files": {
+            p: {"frames": f["frames"], "detections": f["detections"], "markers": sorted(f["markers"])}
+            for p, f in per_file.items()
+        },
+    }
+    print(f"[camera] {total} フレーム / {wall:.2f}s = {results['fps']} fps"
+          f"（{args.workers} プロセス, 1コアあたり {results['fps_per_core']} fps）")
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"[camera] 結果を {args.out} に保存しました。")
+    return 0
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="教室カメラの AR マーカー検出ワーカー")
+    ap.add_argument("--source", action="append", default=[],
+                    help="カメラ番号・動画ファイル・RTSP URL（名前=値 で送信時のソース名を指定。複数可）")
+    ap.add_argument("--url", default="http://127.0.0.1:5001", help="打刻サーバ（/api/camlog/batch の送り先）")
+    ap.add_argument("--bench", nargs="+", default=None, help="録画ファイルで検出だけを計測する")
+    ap.add_argument("--workers", type=int, default=CAMERA_WORKERS, help="検出プロセス数")
+    ap.add_argument("--every", type=int, default=1, help="N フレームに1回だけ検出する")
+    ap.add_argument("--dict", default=CAMERA_DICT, help="ArUco の辞書（cv2.aruco の定数名）")
+    ap.add_argument("--marker-format", default="{id}",
+                    help="送信するマーカー名の書式（カメラマーカー.名前 と合わせる。例: aruco-{id}）")
+    ap.add_argument("--out", default="camera_bench.json", help="--bench の結果ファイル")
+    args = ap.parse_args(argv)
+
+    if cv2 is None:
+        print("[camera] OpenCV がありません: pip install -r requirements-camera.txt", file=sys.stderr)
+        return 2
+    if not hasattr(cv2, "aruco"):
+        print("[camera] cv2.aruco がありません（opencv-python 4.7 以降を使ってください）", file=sys.stderr)
+        return 2
+    if args.bench:
+        return run_bench(args)
+    if not args.source:
+        ap.error("--source か --bench を指定してください")
+    if requests is None:
+        print("[camera] requests がありません: pip install -r requirements-camera.txt", file=sys.stderr)
+        return 2
+    return run_worker(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
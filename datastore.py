@@ -0,0 +1,1191 @@
+# datastore.py (データアクセス層・集計ロジック)
+"""
+ルート（routes_*.py）から共通に使う DB アクセス・出欠判定・集計の関数群。
+Flask のルートは持たないので、打刻専用プロファイルでも帳票側の画面を読み込まずに使える。
+DB には get_conn() で接続する（アプリコンテキスト内で呼ぶこと）。
+"""
+import os
+from collections import defaultdict
+from datetime import datetime, time, timedelta, timezone, date as date_cls
+from io import BytesIO, StringIO
+from time import monotonic
+from typing import Optional, Any
+from zoneinfo import ZoneInfo
+
+from flask import current_app
+from sqlalchemy import func, text, inspect, select, insert, update, delete, bindparam, true, tuple_
+
+import metrics
+import report_engine
+from models import (
+    db, 曜日マスタ, 期マスタ, 学科, 教室, 授業科目, 生徒, TimeTable, 週時間割,
+    入退室, 授業計画, 特別時間割, 欠席理由,
+    カメラソース, カメラ状態, カメラマーカー, カメラ区間, 連絡先,
+)
+
+# =========================================================================
+# 出席判定定数
+# =========================================================================
+ABSENT_THRESHOLD_MINUTES = 20   # 授業開始+20分で欠席扱い
+LATE_THRESHOLD_MINUTES   = 10   # 授業開始+10分で遅刻扱い
+
+TAP_SOURCE_CAMERA = "カメラ"  # 入退室.打刻元（カメラの入室。カード打刻の切り替えには使わない）
+
+# =========================================================================
+# 時刻の扱い
+#   入退室.入退出時間 は UTC で保存し、学校のタイムゾーン（SCHOOL_TIMEZONE）での日付を
+#   入退室.日付 に書き込み時に入れておく。期間の絞り込みは 日付 の索引で行う（DATE(...) は使わない）。
+#   アプリ内（出欠判定・帳票・時間割との比較）は学校の現地時刻の naive datetime で扱う。
+# =========================================================================
+SCHOOL_TZ = ZoneInfo(os.environ.get("SCHOOL_TIMEZONE", "Asia/Tokyo"))
+
+
+def school_now() -> datetime:
+    """学校の現地時刻の現在（naive）。サーバの OS のタイムゾーンには依らない。"""
+    return datetime.now(SCHOOL_TZ).replace(tzinfo=None)
+
+
+def _to_utc(dt: datetime) -> datetime:
+    """学校の現地時刻（naive）/ タイムゾーン付きの datetime を、保存用の UTC（aware）にする。"""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=SCHOOL_TZ)
+    return dt.astimezone(timezone.utc)
+
+
+def _as_school_time(v) -> datetime:
+    """UTC で保存した TIMESTAMP 列の値を学校の現地時刻の naive datetime にする（SQLite は naive の UTC で返る）。"""
+    dt = v if isinstance(v, datetime) else datetime.fromisoformat(str(v).strip())
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(SCHOOL_TZ).replace(tzinfo=None)
+
+# =========================================================================
+# データアクセス層（SQLAlchemy Core / SQLite・PostgreSQL 共通）
+#   ※ 生SQL（? / %s の混在、IFNULL / strftime / sqlite_sequence 等）は使わない
+#   ※ よく使う文はモジュール定数として一度だけ組み立てる。
+#     SQLAlchemy がコンパイル結果をキャッシュするので、呼び出しごとの SQL 構築が不要。
+# =========================================================================
+
+def get_conn():
+    """
+    SQLAlchemy の Connection を返す（SQLite / PostgreSQL 共通）。
+    `with get_conn() as conn:` で使い、書き込み時は conn.commit() する。
+    結果は .mappings() で取れば row["カラム名"] でアクセスできる。
+    """
+    return db.engine.connect()
+
+
+def _upsert(model, index_elements, update_columns, **extra_set):
+    """方言ごとの INSERT ... ON CONFLICT DO UPDATE 文を返す。
+
+    extra_set には衝突時に追加で更新する列と式（例: 登録時刻=func.now()）を渡す。
+    """
+    if db.engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    stmt = dialect_insert(model.__table__)
+    return stmt.on_conflict_do_update(
+        index_elements=index_elements,
+        set_={**{c: stmt.excluded[c] for c in update_columns}, **extra_set},
+    )
+
+
+def _reset_table(conn, model):
+    """全行削除し、自動採番も 1 から振り直す。"""
+    table = model.__table__
+    if conn.dialect.name == "postgresql":
+        conn.execute(text(f'TRUNCATE TABLE "{table.name}" RESTART IDENTITY'))
+    else:
+        # SQLite の INTEGER PRIMARY KEY は空テーブルなら 1 から採番される
+        conn.execute(delete(table))
+
+
+def _as_date(v) -> date_cls:
+    """DATE 列 / 文字列（YYYY-MM-DD, YYYY/MM/DD）を date に揃える。"""
+    if isinstance(v, datetime):
+        return v.date()
+    if isinstance(v, date_cls):
+        return v
+    return datetime.strptime(str(v).replace("/", "-"), "%Y-%m-%d").date()
+
+
+def _as_datetime(v) -> datetime:
+    """
+    TIMESTAMP 列 / 文字列を学校の現地時刻の naive datetime に揃える。
+    オフセット付きは SCHOOL_TIMEZONE に変換し（normalize_ts と同じ。OS のタイムゾーンには依らない）、
+    オフセット無しは学校の現地時刻とみなしてそのまま返す。
+    """
+    if isinstance(v, datetime):
+        dt = v
+    else:
+        try:
+            dt = datetime.fromisoformat(str(v).strip().replace("/", "-"))
+        except ValueError:
+            raise ValueError(f"Invalid datetime format: {v}")
+    return dt.astimezone(SCHOOL_TZ).replace(tzinfo=None) if dt.tzinfo else dt
+
+
+# ----- 打刻（ingest）系 -----
+SQL_OFFICIAL_STUDENT = (
+    select(生徒.生徒名)
+    .where(生徒.学生番号 == bindparam("学生番号"), 生徒.学科ID == bindparam("学科ID"))
+)
+SQL_GAKKA_ID_BY_NAME = select(学科.学科ID).where(学科.学科名 == bindparam("学科名"))
+SQL_LAST_STATUS = (
+    select(入退室.入室区分)
+    .where(入退室.学生番号 == bindparam("学生番号"), 入退室.学科ID == bindparam("学科ID"))
+    .order_by(入退室.入退出時間.desc(), 入退室.記録ID.desc())
+    .limit(1)
+)
+SQL_INSERT_TAP = insert(入退室)
+SQL_INSERT_CAMLOG = insert(カメラ区間)
+SQL_CAMLOG_LAST = (
+    select(カメラ区間.id, カメラ区間.ステータスID, カメラ区間.終了時刻, カメラ区間.件数,
+           カメラ区間.スコア件数, カメラ区間.スコア合計, カメラ区間.スコア最小, カメラ区間.スコア最大,
+           カメラ区間.メッセージ)
+    .where(カメラ区間.ソースID == bindparam("ソースID"), カメラ区間.マーカーID == bindparam("マーカーID"))
+    .order_by(カメラ区間.終了時刻.desc(), カメラ区間.id.desc())
+    .limit(1)
+)
+# SET 句は実行時の引数（_id 以外の列）から組み立てられる
+SQL_EXTEND_CAMLOG = update(カメラ区間).where(カメラ区間.id == bindparam("_id"))
+SQL_MARKER_STUDENTS = (
+    select(カメラマーカー.名前, カメラマーカー.学生番号, カメラマーカー.学科ID, 生徒.生徒名)
+    .join(生徒, (生徒.学生番号 == カメラマーカー.学生番号) & (生徒.学科ID == カメラマーカー.学科ID))
+)
+SQL_CONTACT_STUDENTS = (
+    select(連絡先.宛先, 連絡先.学科ID, 連絡先.学生番号, 生徒.生徒名)
+    .join(生徒, (生徒.学生番号 == 連絡先.学生番号) & (生徒.学科ID == 連絡先.学科ID))
+    .order_by(連絡先.宛先, 連絡先.学科ID, 連絡先.学生番号)
+)
+
+# ----- レポート系 -----
+SQL_TERMS_1TO4 = select(期マスタ.期ID, 期マスタ.期名).where(期マスタ.期ID.between(1, 4)).order_by(期マスタ.期ID)
+SQL_TIMETABLE = select(TimeTable.時限, TimeTable.開始時刻, TimeTable.終了時刻).order_by(TimeTable.時限)
+SQL_SUBJECT_NAMES = select(授業科目.授業科目ID, 授業科目.授業科目名)
+SQL_ROOM_NAMES = select(教室.教室ID, 教室.教室名)
+SQL_PERIOD_NAMES = select(期マスタ.期ID, 期マスタ.期名)
+SQL_WEEKDAY_NAMES = select(曜日マスタ.曜日ID, 曜日マスタ.曜日名)
+SQL_STUDENT_INS = (
+    select(入退室.入退出時間)
+    .where(
+        入退室.学生番号 == bindparam("学生番号"),
+        入退室.学科ID == bindparam("学科ID"),
+        入退室.入室区分 == "入室",
+        入退室.日付.between(bindparam("dmin"), bindparam("dmax")),
+    )
+    .order_by(入退室.入退出時間)
+)
+SQL_GAKKA_INS = (
+    select(入退室.学生番号, 入退室.入退出時間)
+    .where(
+        入退室.学科ID == bindparam("学科ID"),
+        入退室.入室区分 == "入室",
+        入退室.日付.between(bindparam("dmin"), bindparam("dmax")),
+    )
+    .order_by(入退室.学生番号, 入退室.入退出時間)
+)
+ABSENT_REASON_TYPES = ("病欠", "公欠", "寝坊", "その他")
+SQL_EXCUSED_DAYS = (
+    select(欠席理由.学生番号, 欠席理由.科目ID, 欠席理由.日付)
+    .where(
+        欠席理由.学生番号.in_(bindparam("student_nos", expanding=True)),
+        欠席理由.学科ID == bindparam("学科ID"),
+        欠席理由.理由区分 == "公欠",
+    )
+)
+SQL_ABSENT_REASONS = (
+    select(欠席理由.日付, 欠席理由.理由区分, func.coalesce(欠席理由.その他理由, "").label("その他理由"))
+    .where(
+        欠席理由.学生番号 == bindparam("学生番号"),
+        欠席理由.学科ID == bindparam("学科ID"),
+        欠席理由.科目ID == bindparam("科目ID"),
+    )
+)
+
+# =========================================================================
+# 日付ヘルパー
+# =========================================================================
+def default_month_range():
+    """今月の1日〜今日を YYYY-MM-DD で返す"""
+    # datetime モジュールのインポートが必要
+    from datetime import date
+    today = school_now().date()
+    start = today.replace(day=1).isoformat()
+    end = today.isoformat()
+    return start, end
+
+# =========================================================================
+# 生徒/学科マスタ取得（ORM利用）
+# =========================================================================
+
+def get_official_student(学生番号: int, 学科ID: int) -> Optional[str]:
+    """マスタテーブルから正式な生徒名を取得します。"""
+    with get_conn() as conn:
+        return conn.execute(SQL_OFFICIAL_STUDENT, {"学生番号": 学生番号, "学科ID": 学科ID}).scalar()
+
+def fetch_attendance_totals(学生番号: int, 学科ID: int, start_date: str, end_date: str):
+    """指定期間の出欠合計回数を集計します。"""
+    try:
+        stmt = (
+            select(入退室.出席状態, func.count(入退室.出席状態).label("cnt"))
+            .where(
+                入退室.学生番号 == 学生番号,
+                入退室.学科ID == 学科ID,
+                入退室.入室区分 == "入室",
+                入退室.日付.between(_as_date(start_date), _as_date(end_date)),
+                入退室.出席状態.in_(["出席", "遅刻", "欠席"]),
+            )
+            .group_by(入退室.出席状態)
+        )
+        with get_conn() as conn:
+            counts = conn.execute(stmt).all()
+        totals = {"出席": 0, "遅刻": 0, "欠席": 0}
+        for status, count in counts:
+            totals[status] = count
+
+        totals["合計"] = sum(totals.values())
+        return totals
+    except Exception as e:
+        current_app.logger.error(f"Error fetching attendance totals: {e}")
+        return None
+
+def export_csv_to_memory(start_date: Optional[str] = None, end_date: Optional[str] = None,
+                          学生番号: Optional[int] = None, 学科ID: Optional[int] = None) -> BytesIO:
+    i = 入退室
+    stmt = (
+        select(i.記録ID, i.学生番号, i.生徒名, i.入退出時間, i.入室区分, i.学科ID,
+               func.coalesce(学科.学科名, "").label("学科名"))
+        .outerjoin(学科, 学科.学科ID == i.学科ID)
+        .order_by(i.入退出時間.asc(), i.記録ID.asc())
+    )
+    if start_date:
+        stmt = stmt.where(i.日付 >= _as_date(start_date))
+    if end_date:
+        stmt = stmt.where(i.日付 <= _as_date(end_date))
+    if 学生番号 is not None:
+        stmt = stmt.where(i.学生番号 == 学生番号)
+    if 学科ID is not None:
+        stmt = stmt.where(i.学科ID == 学科ID)
+
+    with get_conn() as conn:
+        rows = conn.execute(stmt).mappings().all()
+
+    import csv
+    text_stream = StringIO()
+    writer = csv.writer(text_stream)
+    headers = ["記録ID", "学生番号", "生徒名", "入退出時間", "入室区分", "学科ID", "学科名"]
+    writer.writerow(headers)
+    for r in rows:
+        row = [r[h] for h in headers]
+        row[3] = _as_school_time(row[3]).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+        writer.writerow(row)
+
+    data = text_stream.getvalue().encode("utf-8-sig")
+    buf = BytesIO(data)
+    buf.seek(0)
+    return buf
+
+# ====== Last status ======
+# def get_last_status(学生番号: int, 学科ID: int) -> Optional[str]:
+#     with get_conn() as conn:
+#         cur = conn.cursor()
+#         cur.execute("""
+#             SELECT "入室区分"
+#             FROM "入退室"
+#             WHERE "学生番号" = %s AND "学科ID" = %s
+#             ORDER BY "入退出時間" DESC, "記録ID" DESC
+#             LIMIT 1
+#         """, (学生番号, 学科ID))
+#         row = cur.fetchone()
+#         return row["入室区分"] if row else None
+
+def get_last_status(学生番号: int, 学科ID: int) -> Optional[str]:
+    """
+    指定された学生の直近の「入室区分」を返す。
+    レコードが無ければ None を返す。
+    """
+    with get_conn() as conn:
+        return conn.execute(SQL_LAST_STATUS, {"学生番号": 学生番号, "学科ID": 学科ID}).scalar()
+
+def fetch_daily_first_checkin(学生番号: int, 学科ID: int, start_date: str, end_date: str):
+    """期間内の各日の最初の入室ログを取得します（ウィンドウ関数 / SQLite・PG 共通）。"""
+    ranked = (
+        select(
+            入退室.日付,
+            入退室.入退出時間.label("最初入室"),
+            入退室.出席状態,
+            func.row_number().over(partition_by=入退室.日付, order_by=入退室.入退出時間.asc()).label("rn"),
+        )
+        .where(
+            入退室.学生番号 == 学生番号,
+            入退室.学科ID == 学科ID,
+            入退室.入室区分 == "入室",
+            入退室.日付.between(_as_date(start_date), _as_date(end_date)),
+        )
+        .subquery()
+    )
+    stmt = (
+        select(ranked.c.日付, ranked.c.最初入室, ranked.c.出席状態)
+        .where(ranked.c.rn == 1)
+        .order_by(ranked.c.日付.desc())
+    )
+    with get_conn() as conn:
+        results = conn.execute(stmt).mappings().all()
+
+    # 結果を辞書リストに変換 (Jinjaテンプレートへの引き渡しを想定)
+    daily_list = [
+        {"日付": r["日付"], "最初入室": _as_school_time(r["最初入室"]), "出席状態": r["出席状態"]}
+        for r in results
+    ]
+    return daily_list
+
+# ====== Common Utils ======
+def normalize_ts(ts_input: Optional[str]) -> Optional[str]:
+    """
+    打刻時刻を学校の現地時刻の 'YYYY-MM-DD HH:MM:SS' に揃える（読めなければ None）。
+    オフセット付き（+09:00 / Z）は学校のタイムゾーンに変換し、オフセット無しは学校の現地時刻とみなす。
+    """
+    if not ts_input:
+        return None
+    s = ts_input.strip().replace('T', ' ')
+    if ":" not in s:
+        return None
+    try:
+        dt = datetime.fromisoformat(s)
+    except ValueError:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(SCHOOL_TZ).replace(tzinfo=None)
+    return dt.strftime("%Y-%m-%d %H:%M:%S")
+
+def get_attendance_status(入室時刻: str) -> str:
+    try:
+        dt = datetime.strptime(入室時刻, "%Y-%m-%d %H:%M:%S")
+        rec = resolve_period_for(dt)
+        t = dt.time()
+        if rec:
+            if t <= rec["start"]:
+                return "出席"
+            elif t <= rec["end"]:
+                return "遅刻"
+            else:
+                return "欠席"
+        # fallback（TimeTableなし）
+        on_time = datetime.strptime(ATT_ON_TIME, "%H:%M:%S").time()
+        absent_t = datetime.strptime(ATT_ABSENT, "%H:%M:%S").time()
+        if t <= on_time:
+            return "出席"
+        elif t <= absent_t:
+            return "遅刻"
+        else:
+            return "欠席"
+    except Exception:
+        return "不正な時刻"
+
+def get_exit_attendance_status(退出時刻: str) -> str:
+    try:
+        dt = datetime.strptime(退出時刻, "%Y-%m-%d %H:%M:%S")
+        rec = resolve_period_for(dt)
+        if rec:
+            return "一時退出" if dt.time() < rec["end"] else "退出"
+        # fallback（TimeTableなし）
+        absent_t = datetime.strptime(ATT_ABSENT, "%H:%M:%S").time()
+        return "一時退出" if dt.time() < absent_t else "退出"
+    except Exception:
+        return "退出"
+
+# ====== Insert entry (existing logic kept) ======
+# def insert_attendance_input(学生番号: int, 生徒名: str, 学科ID: int, 入退出時間: Optional[str] = None):
+#     ts = normalize_ts(入退出時間) if 入退出時間 else datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+#     last = get_last_status(学生番号, 学科ID)
+#     next_status = "退出" if last == "入室" else "入室"
+
+#     with get_conn() as conn:
+#         cur = conn.cursor()
+
+#         # Ensure column 出席状態 exists (do not auto-alter by default)
+#         cur.execute("PRAGMA table_info(入退室);")
+#         cols = [r[1] for r in cur.fetchall()]
+#         if "出席状態" not in cols:
+#             # 既存DBに合わせるため、ここでは自動追加しない
+#             pass
+
+#         # Decide attendance status
+#         if next_status == "入室":
+#             att = get_attendance_status(ts)
+#         else:
+#             att = get_exit_attendance_status(ts)
+
+#         cur.execute("""
+#             INSERT INTO 入退室 (学生番号, 生徒名, 学科ID, 入退出時間, 入室区分, 出席状態)
+#             VALUES (?,?,?,?,?,?)
+#         """, (学生番号, 生徒名, 学科ID, ts, next_status, att))
+#         conn.commit()
+
+def insert_attendance_input(学生番号: int, 生徒名: str, 学科ID: int,
+                            入退出時間: Optional[str] = None):
+    insert_attendance_batch([{"学生番号": 学生番号, "生徒名": 生徒名, "学科ID": 学科ID, "入退出時間": 入退出時間}])
+
+def _last_taps(conn, pairs, card_only: bool = False) -> dict:
+    """
+    {(学生番号, 学科ID): (入室区分, 入退出時間)} … 各生徒の直近の打刻を1クエリで読む。
+    card_only=True ならカメラの入室（打刻元 = TAP_SOURCE_CAMERA）を除いた直近の打刻。
+    """
+    source_ok = func.coalesce(入退室.打刻元, "") != TAP_SOURCE_CAMERA if card_only else true()
+    if len(pairs) == 1:
+        (no, gakka), = pairs
+        row = conn.execute(
+            select(入退室.入室区分, 入退室.入退出時間)
+            .where(入退室.学生番号 == no, 入退室.学科ID == gakka, source_ok)
+            .order_by(入退室.入退出時間.desc(), 入退室.記録ID.desc())
+            .limit(1)
+        ).first()
+        return {(no, gakka): (row[0], _as_school_time(row[1]))} if row else {}
+    rn = func.row_number().over(
+        partition_by=(入退室.学生番号, 入退室.学科ID),
+        order_by=(入退室.入退出時間.desc(), 入退室.記録ID.desc()),
+    ).label("rn")
+    sub = (
+        select(入退室.学生番号, 入退室.学科ID, 入退室.入室区分, 入退室.入退出時間, rn)
+        .where(tuple_(入退室.学生番号, 入退室.学科ID).in_(sorted(pairs)), source_ok)
+        .subquery()
+    )
+    rows = conn.execute(
+        select(sub.c.学生番号, sub.c.学科ID, sub.c.入室区分, sub.c.入退出時間).where(sub.c.rn == 1)
+    )
+    return {(no, gakka): (kubun, _as_school_time(ts)) for no, gakka, kubun, ts in rows}
+
+def insert_attendance_batch(taps, check_in_only: bool = False) -> list:
+    """
+    打刻をまとめて記録する（直近の状態を1クエリで読み、1トランザクションの executemany で書く）。
+    /api/add などの打刻 API とカメラの融合処理（fusion.py）の共通の書き込み口。
+      taps: [{学生番号, 学科ID, 生徒名, 入退出時間（学校の現地時刻。省略時は現在時刻）}, ...]
+      check_in_only: False … 直前のカード打刻が入室なら退出、それ以外は入室（カード打刻）。
+                             カメラの入室は切り替えに使わない（カメラで入室済みでもカードの最初の打刻は入室）
+                     True  … 入室だけを記録し、同じ日に既に入室中の生徒は飛ばす（カメラ用。
+                             打刻元 = TAP_SOURCE_CAMERA で書く）
+    記録した行のリストを返す（入退出時間 は学校の現地時刻。DB には UTC と現地の 日付 で書く）。
+    """
+    rows = []
+    for t in taps:
+        ts = normalize_ts(t.get("入退出時間")) if t.get("入退出時間") else \
+            school_now().strftime("%Y-%m-%d %H:%M:%S")
+        rows.append((ts, t))
+    if not rows:
+        return []
+    rows.sort(key=lambda r: r[0])
+
+    with get_conn() as conn:
+        last = _last_taps(conn, {(t["学生番号"], t["学科ID"]) for _, t in rows}, card_only=not check_in_only)
+        out = []
+        for ts, t in rows:
+            key = (t["学生番号"], t["学科ID"])
+            dt = datetime.strptime(ts, "%Y-%m-%d %H:%M:%S")
+            prev = last.get(key)
+            if check_in_only:
+                if prev and prev[0] == "入室" and prev[1].date() == dt.date():
+                    continue
+                next_status = "入室"
+            else:
+                next_status = "退出" if prev and prev[0] == "入室" else "入室"
+            # 出席状態の判定
+            if next_status == "入室":
+                att = get_attendance_status(ts)
+            else:
+                att = get_exit_attendance_status(ts)
+            out.append({
+                "学生番号": t["学生番号"], "生徒名": t["生徒名"], "学科ID": t["学科ID"],
+                "入退出時間": dt, "日付": dt.date(), "入室区分": next_status, "出席状態": att,
+                "打刻元": TAP_SOURCE_CAMERA if check_in_only else None,
+            })
+            last[key] = (next_status, dt)
+        if out:
+            conn.execute(SQL_INSERT_TAP, [{**r, "入退出時間": _to_utc(r["入退出時間"])} for r in out])
+            conn.commit()
+    for r in out:
+        metrics.observe_tap(r["学科ID"], r["入室区分"], r["出席状態"])
+    return out
+
+def fetch_absent_reasons_map(学生番号: int, 学科ID: int, 科目ID: int):
+    """(日付 'YYYY-MM-DD' -> dict{理由区分, その他理由}) のマップを返す"""
+    with get_conn() as conn:
+        rows = conn.execute(SQL_ABSENT_REASONS, {
+            "学生番号": 学生番号, "学科ID": 学科ID, "科目ID": 科目ID,
+        }).mappings().all()
+    return {_as_date(r["日付"]).isoformat(): {"理由区分": r["理由区分"], "その他理由": r["その他理由"]}
+            for r in rows}
+
+def upsert_absent_reason(学生番号: int, 学科ID: int, 科目ID: int, 日付: str, 理由区分: str, その他理由: str = ""):
+    upsert_absent_reasons([{
+        "学生番号": 学生番号, "学科ID": 学科ID, "科目ID": 科目ID,
+        "日付": 日付, "理由区分": 理由区分, "その他理由": その他理由,
+    }])
+
+def upsert_absent_reasons(rows) -> int:
+    """
+    欠席理由をまとめて登録・更新する（1トランザクション・executemany）。
+    rows: [{学生番号, 学科ID, 科目ID, 日付, 理由区分, その他理由}, ...]
+    """
+    params = [{**r, "日付": _as_date(r["日付"]), "その他理由": r.get("その他理由") or ""} for r in rows]
+    if not params:
+        return 0
+    stmt = _upsert(欠席理由, ["学生番号", "学科ID", "科目ID", "日付"],
+                   ["理由区分", "その他理由"], 登録時刻=func.now())
+    with get_conn() as conn:
+        conn.execute(stmt, params)
+        conn.commit()
+    return len(params)
+
+def fetch_absent_reasons_range(学科ID: int, dmin, dmax) -> dict:
+    """学科・期間の欠席理由を一度に読む。{(学生番号, 科目ID, 'YYYY-MM-DD'): {理由区分, その他理由}}"""
+    stmt = (
+        select(欠席理由.学生番号, 欠席理由.科目ID, 欠席理由.日付, 欠席理由.理由区分,
+               func.coalesce(欠席理由.その他理由, "").label("その他理由"))
+        .where(欠席理由.学科ID == 学科ID, 欠席理由.日付.between(_as_date(dmin), _as_date(dmax)))
+    )
+    with get_conn() as conn:
+        rows = conn.execute(stmt).mappings().all()
+    return {(r["学生番号"], r["科目ID"], _as_date(r["日付"]).isoformat()):
+                {"理由区分": r["理由区分"], "その他理由": r["その他理由"]}
+            for r in rows}
+
+def compute_absent_days(学科ID: int, dmin=None, dmax=None, subject_id: Optional[int] = None, today=None,
+                        student_nos=None, term_list=(1, 2, 3, 4)) -> dict:
+    """
+    学科・期間の生徒の欠席日（欠席理由を登録できる日）。{学生番号: {科目ID: ["YYYY-MM-DD", ...]}}
+    （欠席の無い生徒・科目は含めない）。/absent_reason と一括登録の両方がこれで対象日を決める。
+    student_nos を省略すると学科の全生徒、dmin / dmax を省略すると term_list の期全体。
+    """
+    today = today or school_now().date()
+    with get_conn() as conn:
+        if student_nos is None:
+            student_nos = list(conn.execute(
+                select(生徒.学生番号).where(生徒.学科ID == 学科ID).order_by(生徒.学生番号)
+            ).scalars())
+        sessions = load_class_sessions(conn, 学科ID, list(term_list), subject_id=subject_id,
+                                       dmin=_as_date(dmin) if dmin is not None else None,
+                                       dmax=_as_date(dmax) if dmax is not None else None)
+        taps = load_gakka_ins(conn, 学科ID, student_nos, sessions)
+    return report_engine.absent_days(sessions, taps, today)
+
+# ====== Generate Monthly Schedule ======
+
+def generate_monthly_schedule(selected_month=None, selected_year=None):
+    subj_map = lookup("subjects")
+    room_map = lookup("rooms")
+    with get_conn() as conn:
+        # 週時間割・授業計画を先読み
+        week_schedule = conn.execute(select(
+            週時間割.年度, 週時間割.学科ID, 週時間割.期, 週時間割.曜日,
+            週時間割.時限, 週時間割.科目ID, 週時間割.教室ID, 週時間割.備考,
+        )).mappings().all()
+
+        class_schedule = conn.execute(select(
+            授業計画.日付, 授業計画.期, 授業計画.授業曜日, 授業計画.備考,
+        )).mappings().all()
+
+        # 特別時間割（指定月だけを読み込む。日付は 'YYYY-MM-DD' 文字列）
+        special = {}
+        if selected_month and selected_year:
+            rows = conn.execute(
+                select(特別時間割.日付, 特別時間割.学科ID, 特別時間割.時限,
+                       特別時間割.科目ID, 特別時間割.教室ID, 特別時間割.備考)
+                .where(特別時間割.日付.like(f"{int(selected_year):04d}-{int(selected_month):02d}-%"))
+            ).mappings().all()
+            for r in rows:
+                special[(_as_date(r["日付"]), r["学科ID"], r["時限"])] = dict(r)
+
+    # 月ごとの時間割
+    monthly_schedule = defaultdict(lambda: defaultdict(list))  # 月 -> 日 -> リスト
+
+    for c in class_schedule:
+        # 授業計画の日付を決定
+        d = _as_date(c["日付"])
+        month = d.month
+        day = d.day
+
+        if selected_month and month != selected_month:
+            continue
+        if selected_year and d.year != selected_year:
+            continue
+
+        term = c["期"]
+        youbi = c["授業曜日"]
+
+        # 対象日の全学科×時限候補（週時間割から） 
+        for w in week_schedule:
+            if w["期"] == term and w["曜日"] == youbi:
+                gakka_id = w["学科ID"]
+                period = w["時限"]
+
+                # 特別時間割で上書きがあればそれを使う
+                sp = special.get((d, gakka_id, period))
+                if sp:
+                    subj_id = sp["科目ID"]
+                    room_id = sp["教室ID"]
+                    note = sp["備考"]
+                else:
+                    subj_id = w["科目ID"]
+                    room_id = w["教室ID"]
+                    note = w["備考"]
+
+                subject_name = subj_map.get(subj_id, "（未設定）") if subj_id else "（空コマ）"
+                room_name = room_map.get(room_id, "") if room_id else ""
+
+                monthly_schedule[month][day].append({
+                    "時限": period,
+                    "学科ID": gakka_id,
+                    "科目名": subject_name + (f"（{room_name}）" if room_name else ""),
+                    "教室ID": room_id,
+                    "備考": note or ""
+                })
+
+        # 同日の中で時限順に整列
+        if monthly_schedule[month][day]:
+            monthly_schedule[month][day].sort(key=lambda x: (x["時限"], x["学科ID"]))
+
+    return monthly_schedule
+
+
+# ====== Camera Log（圧縮形式: 辞書テーブル + 区間）======
+# CAMLOG_COMPACT=1 のとき、同じ (ソース, マーカー) で同じステータスのイベントが
+# CAMLOG_COMPACT_GAP 秒以内に続いたら、新しい行を作らず直近の区間を延ばす（件数・スコアを集計）。
+CAMLOG_COMPACT = os.environ.get("CAMLOG_COMPACT", "0") == "1"
+CAMLOG_COMPACT_GAP = timedelta(seconds=float(os.environ.get("CAMLOG_COMPACT_GAP", "10")))
+
+_camlog_ids = {}  # (テーブル名, 名前) -> ID。辞書の行は消さないので使い回せる
+
+
+def _insert_ignore(model, index_elements):
+    """方言ごとの INSERT ... ON CONFLICT DO NOTHING 文を返す。"""
+    if db.engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert(model.__table__).on_conflict_do_nothing(index_elements=index_elements)
+
+
+def _camlog_dict_id(model, name: Optional[str]) -> int:
+    """ソース / ステータス / マーカー名 を辞書テーブルの ID にする（無ければ登録）。"""
+    name = (name or "").strip()
+    key = (model.__tablename__, name)
+    id_ = _camlog_ids.get(key)
+    if id_ is None:
+        # 登録は別トランザクションで確定させてからキャッシュする
+        with db.engine.begin() as conn:
+            conn.execute(_insert_ignore(model, ["名前"]), {"名前": name})
+            id_ = conn.execute(select(model.ID).where(model.名前 == name)).scalar()
+        _camlog_ids[key] = id_
+    return id_
+
+
+def add_camlog(記録時刻: str, ソース: str, ステータス: str,
+               マーカー名: str = None, スコア: float = None, メッセージ: str = None):
+    add_camlogs([{
+        "記録時刻": 記録時刻, "ソース": ソース, "ステータス": ステータス,
+        "マーカー名": マーカー名, "スコア": スコア, "メッセージ": メッセージ,
+    }])
+
+def add_camlogs(events) -> int:
+    """
+    カメラのイベントをまとめて記録する（1トランザクション）。記録したイベント数を返す。
+      events: [{記録時刻, ソース, ステータス, マーカー名, スコア, メッセージ}, ...]
+    区間へのまとめ（CAMLOG_COMPACT）はバッチ内でメモリ上で行い、
+    最後に新しい区間を executemany で INSERT、延ばした既存区間を executemany で UPDATE する。
+    """
+    prepared = []
+    for e in events:
+        prepared.append((
+            _as_datetime(e["記録時刻"]),
+            _camlog_dict_id(カメラソース, e.get("ソース")),
+            _camlog_dict_id(カメラ状態, e.get("ステータス")),
+            _camlog_dict_id(カメラマーカー, e.get("マーカー名")),
+            e.get("スコア"), e.get("メッセージ"),
+        ))
+    if not prepared:
+        return 0
+    prepared.sort(key=lambda p: p[0])
+
+    with get_conn() as conn:
+        current = {}  # (ソースID, マーカーID) -> 区間（このバッチで作った / 延ばしたもの）
+        closed = []   # 同じキーの新しい区間に切り替わった区間
+        for ts, src, status, marker, スコア, メッセージ in prepared:
+            key = (src, marker)
+            last = current.get(key)
+            if last is None and CAMLOG_COMPACT:
+                row = conn.execute(SQL_CAMLOG_LAST, {"ソースID": src, "マーカーID": marker}).mappings().first()
+                if row:
+                    last = current[key] = dict(row, 終了時刻=_as_datetime(row["終了時刻"]), dirty=False)
+            if CAMLOG_COMPACT and last and last["ステータスID"] == status and \
+                    timedelta(0) <= ts - last["終了時刻"] <= CAMLOG_COMPACT_GAP:
+                last["終了時刻"] = ts
+                last["件数"] += 1
+                if スコア is not None:
+                    last["スコア件数"] += 1
+                    last["スコア合計"] = (last["スコア合計"] or 0.0) + スコア
+                    last["スコア最小"] = スコア if last["スコア最小"] is None else min(スコア, last["スコア最小"])
+                    last["スコア最大"] = スコア if last["スコア最大"] is None else max(スコア, last["スコア最大"])
+                if メッセージ:
+                    last["メッセージ"] = メッセージ
+                last["dirty"] = True
+                continue
+            if last is not None:
+                closed.append(last)
+            current[key] = {
+                "id": None, "開始時刻": ts, "終了時刻": ts, "ソースID": src, "ステータスID": status,
+                "マーカーID": marker, "件数": 1, "スコア件数": 0 if スコア is None else 1,
+                "スコア合計": スコア, "スコア最小": スコア, "スコア最大": スコア, "メッセージ": メッセージ,
+            }
+
+        touched = closed + list(current.values())
+        new_rows = [{k: v for k, v in r.items() if k not in ("id", "dirty")} for r in touched if r["id"] is None]
+        extended = [
+            {"_id": r["id"], "終了時刻": r["終了時刻"], "件数": r["件数"], "スコア件数": r["スコア件数"],
+             "スコア合計": r["スコア合計"], "スコア最小": r["スコア最小"], "スコア最大": r["スコア最大"],
+             "メッセージ": r["メッセージ"]}
+            for r in touched if r["id"] is not None and r["dirty"]
+        ]
+        if new_rows:
+            conn.execute(SQL_INSERT_CAMLOG, new_rows)
+        if extended:
+            conn.execute(SQL_EXTEND_CAMLOG, extended)
+        conn.commit()
+    for e in events:
+        metrics.observe_camera_event(e.get("ステータス"))
+    return len(prepared)
+
+def fetch_daily_inout(学生番号: int, 学科ID: int, start_date: str, end_date: str):
+    """日ごとの最初の入室・最後の退出（と各々の出席状態）を新しい日付順で返す。"""
+    stmt = (
+        select(入退室.入退出時間, 入退室.入室区分, 入退室.出席状態)
+        .where(入退室.学生番号 == 学生番号, 入退室.学科ID == 学科ID,
+               入退室.入室区分.in_(["入室", "退出"]),
+               入退室.日付.between(_as_date(start_date), _as_date(end_date)))
+        .order_by(入退室.入退出時間)
+    )
+    with get_conn() as conn:
+        rows = conn.execute(stmt).mappings().all()
+
+    days = {}
+    for r in rows:
+        ts = _as_school_time(r["入退出時間"])
+        rec = days.setdefault(ts.date().isoformat(), {
+            "最初入室": None, "最初入室_出席状態": None,
+            "最後退出": None, "最後退出_出席状態": None,
+        })
+        if r["入室区分"] == "入室" and rec["最初入室"] is None:
+            rec["最初入室"], rec["最初入室_出席状態"] = ts, r["出席状態"]
+        elif r["入室区分"] == "退出":
+            # 時刻昇順なので最後に見た退出が「最後退出」
+            rec["最後退出"], rec["最後退出_出席状態"] = ts, r["出席状態"]
+    return [{"日付": d, **days[d]} for d in sorted(days, reverse=True)]
+
+def fetch_attendance_details(学生番号: int, 学科ID: int, start_date: str, end_date: str):
+    """指定された学生の入退室ログを取得"""
+    # 時限・入室時刻・離席時間は 入退室 テーブルには無いので、ここで補う
+    stmt = (
+        select(入退室.入退出時間, 入退室.入室区分, 入退室.出席状態)
+        .where(入退室.学生番号 == 学生番号, 入退室.学科ID == 学科ID,
+               入退室.日付.between(_as_date(start_date), _as_date(end_date)))
+        .order_by(入退室.入退出時間)
+    )
+    try:
+        with get_conn() as conn:
+            rows = conn.execute(stmt).mappings().all()
+    except Exception as e:
+        current_app.logger.error(f"Error fetching attendance details: {e}")
+        return []
+
+    ttable = lookup("timetable")
+    details = []
+    for r in rows:
+        ts = _as_school_time(r["入退出時間"])
+        rec = resolve_period_for(ts, ttable)
+        details.append({
+            "入退出時間": ts,
+            "入室区分": r["入室区分"],
+            "時限": rec["period"] if rec else None,
+            "出席状態": r["出席状態"],
+            "入室時刻": ts if r["入室区分"] == "入室" else None,
+            "離席時間": None,
+        })
+    return details
+
+def fetch_recent_logs(limit=50):
+    """Recent logs with limit."""
+    stmt = (
+        select(入退室.記録ID, 入退室.学生番号, 入退室.生徒名, 入退室.入退出時間,
+               入退室.入室区分, 入退室.出席状態, 入退室.学科ID, 学科.学科名)
+        .join(学科, 学科.学科ID == 入退室.学科ID)
+        .order_by(入退室.入退出時間.desc(), 入退室.記録ID.desc())
+        .limit(limit)
+    )
+    with get_conn() as conn:
+        rows = conn.execute(stmt).mappings().all()
+    # 表示用の文字列に揃える（方言によって datetime / 文字列のどちらでも返るため）
+    return [{**r, "入退出時間": _as_school_time(r["入退出時間"]).strftime("%Y-%m-%d %H:%M:%S")}
+            for r in rows]
+
+def fetch_gakkas():
+    """List of gakkas."""
+    with get_conn() as conn:
+        return conn.execute(
+            select(学科.学科ID, 学科.学科名).order_by(学科.学科ID)
+        ).mappings().all()
+
+def fetch_recent_camlogs(limit=100):
+    """
+    新しい順のカメラログ（1行 = 1区間）。
+    記録時刻は区間の開始、スコアは区間内の平均（スコアが無ければ 0.0）。
+    """
+    stmt = (
+        select(
+            カメラ区間.id,
+            カメラ区間.開始時刻,
+            カメラ区間.終了時刻,
+            カメラソース.名前.label('ソース'),
+            カメラ状態.名前.label('ステータス'),
+            カメラマーカー.名前.label('マーカー名'),
+            カメラ区間.件数,
+            カメラ区間.スコア件数,
+            カメラ区間.スコア合計,
+            カメラ区間.スコア最小,
+            カメラ区間.スコア最大,
+            func.coalesce(カメラ区間.メッセージ, '').label('メッセージ'),
+        )
+        .join(カメラソース, カメラソース.ID == カメラ区間.ソースID)
+        .join(カメラ状態, カメラ状態.ID == カメラ区間.ステータスID)
+        .join(カメラマーカー, カメラマーカー.ID == カメラ区間.マーカーID)
+        .order_by(カメラ区間.開始時刻.desc(), カメラ区間.id.desc())
+        .limit(limit)
+    )
+    with get_conn() as conn:
+        rows = conn.execute(stmt).mappings().all()
+    return [{
+        "id": r["id"],
+        "記録時刻": _as_datetime(r["開始時刻"]).strftime("%Y-%m-%d %H:%M:%S"),
+        "終了時刻": _as_datetime(r["終了時刻"]).strftime("%Y-%m-%d %H:%M:%S"),
+        "ソース": r["ソース"],
+        "ステータス": r["ステータス"],
+        "マーカー名": r["マーカー名"],
+        "件数": r["件数"],
+        "スコア": round(r["スコア合計"] / r["スコア件数"], 4) if r["スコア件数"] else 0.0,
+        "スコア最小": r["スコア最小"],
+        "スコア最大": r["スコア最大"],
+        "メッセージ": r["メッセージ"],
+    } for r in rows]
+
+def fetch_timetable_1to4():
+    """Fetch 1 to 4 periods timetable."""
+    with get_conn() as conn:
+        return conn.execute(
+            SQL_TIMETABLE.where(TimeTable.時限.between(1, 4))
+        ).mappings().all()
+
+def column_exists(table_class, column: str) -> bool:
+    """
+    指定された SQLAlchemy ORM モデルクラス (テーブル) に指定されたカラムが存在するかチェックする。
+    PostgreSQL環境では PRAGMA table_info は使えないため、SQLAlchemyの inspect を使用。
+    """
+    try:
+        # モデルクラス（テーブル）からマッピング情報を取得
+        insp = inspect(table_class)
+        # カラム名がそのマッピング情報に含まれているかチェック
+        return column in insp.columns
+    except Exception as e:
+        # モデルがまだマップされていない、などのエラーハンドリング
+        print(f"Error inspecting table {table_class.__name__}: {e}")
+        return False
+
+def get_gakka_id_by_name(学科名: str) -> Optional[int]:
+    """Resolve 学科名 -> 学科ID."""
+    with get_conn() as conn:
+        return conn.execute(SQL_GAKKA_ID_BY_NAME, {"学科名": 学科名}).scalar()
+
+def get_subject_name_by_id(subject_id: int) -> str:
+    """授業科目IDから授業科目名を取得"""
+    with get_conn() as conn:
+        name = conn.execute(
+            select(授業科目.授業科目名).where(授業科目.授業科目ID == subject_id)
+        ).scalar()
+    return name or '未設定'
+
+def _next_subject_id(conn) -> int:
+    """次に使用する授業科目IDを取得 (COALESCE(MAX(ID), 0) + 1)。"""
+    max_id = conn.execute(select(func.max(授業科目.授業科目ID))).scalar()
+    return (max_id or 0) + 1
+
+# =========================================================================
+# TimeTable Utility
+# =========================================================================
+
+def _parse_int(value: Any, default: Optional[int]=None) -> Optional[int]:
+    """文字列を整数に安全に変換する。"""
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return default
+
+def _parse_hhmm_or_hhmmss(s) -> time:
+    """'8:50' / '08:50' / '08:50:00'（または time 型）を time に変換"""
+    if isinstance(s, time):
+        return s
+    s = (s or "").strip()
+
+    for fmt in ("%H:%M", "%H:%M:%S", "%H:%M:%S.%f"):
+        try:
+            # datetime.strptime は date part も必要とするが、time() で時間だけ抽出
+            return datetime.strptime(s, fmt).time()
+        except ValueError:
+            pass
+
+    # ':'区切りでパースを試みる（最後の手段）
+    parts = s.split(":")
+    if len(parts) >= 2:
+        try:
+            h = int(parts[0])
+            m = int(parts[1])
+            sec = int(float(parts[2])) if len(parts) == 3 else 0
+            return time(h, m, sec)
+        except ValueError:
+            pass
+
+    raise ValueError(f"Invalid time format: {s}")
+
+def load_timetable() -> list[dict]:
+    """TimeTable を読み込み、(period, start, end) の dict のリストを返す（時限昇順）。"""
+    with get_conn() as conn:
+        rows = conn.execute(SQL_TIMETABLE).mappings().all()
+
+    result = []
+    for r in rows:
+        try:
+            result.append({
+                "period": r["時限"],
+                "start": _parse_hhmm_or_hhmmss(r["開始時刻"]),
+                "end": _parse_hhmm_or_hhmmss(r["終了時刻"]),
+            })
+        except ValueError as e:
+            print(f"Warning: Failed to parse time for period {r['時限']}: {e}")
+            continue
+
+    return result
+
+def resolve_period_for(ts_dt: datetime, ttable: Optional[list] = None) -> Optional[dict]:
+    """タイムスタンプが属する（または最も近い）時限を解決する。
+
+    ttable: 時限表（load_timetable() の形式）。省略時はキャッシュ済みの lookup("timetable")。
+    """
+    if ttable is None:
+        ttable = lookup("timetable")
+    if not ttable:
+        return None
+    t = ts_dt.time()
+
+    # 1. 範囲内の時限を探す
+    for rec in ttable:
+        if rec["start"] <= t < rec["end"]:
+            return rec
+
+    # 2. 範囲外の場合、最も近い時限を決定する
+    first_rec = ttable[0]
+    last_rec = ttable[-1]
+
+    # 始業前の場合、最初の時限を返す
+    if t < first_rec["start"]:
+        return first_rec
+    
+    # 終業後の場合、最後の時限を返す
+    if t >= last_rec["end"]:
+        return last_rec
+
+    # 休憩時間中の場合、次の時限を返す
+    for i in range(len(ttable)-1):
+        if ttable[i]["end"] <= t < ttable[i+1]["start"]:
+            return ttable[i+1]
+            
+    return last_rec # フォールバック
+
+# =========================================================================
+# 読み取り専用キャッシュ（時限表・マスタの ID→名前）
+#   打刻のたびに TimeTable を、帳票のたびに科目名・教室名などを引き直さないよう、
+#   プロセス内に保持する。gunicorn の preload モードではマスタープロセスで
+#   warm_lookups() してから fork するので、全ワーカーが copy-on-write で共有する。
+#   戻り値は共有オブジェクトなので、呼び出し側で書き換えないこと。
+#
+#   更新の反映:
+#     - 同じプロセス内のマスタ編集（/kamoku_add など）… invalidate_lookups() で即時
+#     - 他プロセスでの編集・import-master … LOOKUP_CACHE_TTL 秒以内、
+#       すぐ反映したいときは gunicorn に HUP（on_reload で再読込してからワーカーを入替）
+# =========================================================================
+LOOKUP_CACHE_TTL = float(os.environ.get("LOOKUP_CACHE_TTL", "300"))
+
+_lookup_cache = {}  # name -> (読み込んだ時刻, 値)
+
+
+def _load_name_map(stmt, key: str, name: str) -> dict:
+    with get_conn() as conn:
+        return {r[key]: r[name] for r in conn.execute(stmt).mappings()}
+
+
+def _load_terms() -> list:
+    with get_conn() as conn:
+        return [dict(r) for r in conn.execute(SQL_TERMS_1TO4).mappings()]
+
+
+def _load_marker_students() -> dict:
+    # 生徒に割り当て済みのマーカーだけ: {マーカー名: (学生番号, 学科ID, 生徒名)}
+    with get_conn() as conn:
+        return {r[0]: (r[1], r[2], r[3]) for r in conn.execute(SQL_MARKER_STUDENTS)}
+
+
+def _load_contact_students() -> dict:
+    # LINE のユーザーID → 見てよい生徒: {宛先: [(学科ID, 学生番号, 生徒名), ...]}
+    result = {}
+    with get_conn() as conn:
+        for to, gakka_id, std_no, name in conn.execute(SQL_CONTACT_STUDENTS):
+            result.setdefault(to, []).append((gakka_id, std_no, name))
+    return result
+
+
+LOOKUPS = {
+    "timetable": lambda: load_timetable(),
+    "subjects": lambda: _load_name_map(SQL_SUBJECT_NAMES, "授業科目ID", "授業科目名"),
+    "rooms": lambda: _load_name_map(SQL_ROOM_NAMES, "教室ID", "教室名"),
+    "periods": lambda: _load_name_map(SQL_PERIOD_NAMES, "期ID", "期名"),
+    "weekdays": lambda: _load_name_map(SQL_WEEKDAY_NAMES, "曜日ID", "曜日名"),
+    "terms": _load_terms,
+    "gakkas": lambda: fetch_gakkas(),
+    "markers": _load_marker_students,
+    "contacts": _load_contact_students,
+}
+
+
+def lookup(name: str):
+    """キャッシュ済みのマスタを返す（期限切れ・未読込なら DB から読む）。"""
+    entry = _lookup_cache.get(name)
+    now = monotonic()
+    if entry is not None and now - entry[0] < LOOKUP_CACHE_TTL:
+        metrics.observe_cache(name, True)
+        return entry[1]
+    metrics.observe_cache(name, False)
+    value = LOOKUPS[name]()
+    _lookup_cache[name] = (now, value)
+    return value
+
+
+def invalidate_lookups(*names):
+    """指定したキャッシュを捨てる（名前を省略すると全部）。"""
+    for name in names or list(_lookup_cache):
+        _lookup_cache.pop(name, None)
+
+
+def warm_lookups():
+    """全キャッシュを読み直す（preload 時のマスタープロセス / HUP 時に、アプリコンテキスト内で呼ぶ）。"""
+    invalidate_lookups()
+    for name in LOOKUPS:
+        lookup(name)
+
+# =========================================================================
+# 出欠集計エンジン（report_engine.py）への入力
+# =========================================================================
+def load_class_sessions(conn, gakka_id: int, term_list, subject_id: Optional[int] = None,
+                        dmin: Optional[date_cls] = None, dmax: Optional[date_cls] = None) -> list:
+    """
+    学科の授業コマ [(日付, 科目ID, 開始datetime, 終了datetime), ...] を日付・時限順に返す。
+    平日（授業曜日 1〜5）の授業だけを数える（出席率・欠席日・欠席理由の対象日すべてで共通）。
+    dmin / dmax を指定すると、その日付の範囲（両端を含む）の授業だけに絞る。
+    """
+    tt = lookup("timetable")
+    plan_stmt = (
+        select(授業計画.日付, 授業計画.授業曜日, 授業計画.期)
+        .where(授業計画.期.in_(term_list), 授業計画.授業曜日.between(1, 5))
+        .order_by(授業計画.日付)
+    )
+    if dmin is not None:
+        plan_stmt = plan_stmt.where(授業計画.日付 >= dmin)
+    if dmax is not None:
+        plan_stmt = plan_stmt.where(授業計画.日付 <= dmax)
+    plans = conn.execute(plan_stmt).mappings().all()
+    stmt = (
+        select(週時間割.期, 週時間割.曜日, 週時間割.時限, 週時間割.科目ID)
+        .where(週時間割.学科ID == gakka_id, 週時間割.期.in_(term_list), 週時間割.曜日.between(1, 5),
+               週時間割.科目ID.isnot(None))
+    )
+    if subject_id is not None:
+        stmt = stmt.where(週時間割.科目ID == subject_id)
+    wk = {(r["期"], r["曜日"], r["時限"]): r["科目ID"] for r in conn.execute(stmt).mappings()}
+
+    sessions = []
+    for p in plans:
+        d = _as_date(p["日付"])
+        for rec in tt:
+            subj_id = wk.get((p["期"], p["授業曜日"], rec["period"]))
+            if subj_id:
+                sessions.append((d, subj_id, datetime.combine(d, rec["start"]),
+                                 datetime.combine(d, rec["end"])))
+    return sessions
+
+
+def load_excused_days(conn, gakka_id: int, student_nos) -> dict:
+    """{学生番号: {科目ID: {"YYYY-MM-DD", ...}}}。公欠 の欠席理由を帳票1回につき1クエリで読む。"""
+    excused = {}
+    if not student_nos:
+        return excused
+    for std_no, subj_id, d in conn.execute(SQL_EXCUSED_DAYS, {
+        "学科ID": gakka_id, "student_nos": list(student_nos),
+    }):
+        excused.setdefault(std_no, {}).setdefault(subj_id, set()).add(_as_date(d).isoformat())
+    return excused
+
+
+def _tap_columns(rows):
+    """(学生番号, 入退出時間) を TapColumns.from_rows() に渡す (学生番号, 日付の序数, 秒) にする。"""
+    for std_no, ts in rows:
+        dt = _as_school_time(ts)
+        yield std_no, dt.toordinal(), dt.hour * 3600 + dt.minute * 60 + dt.second
+
+
+def load_gakka_ins(conn, gakka_id: int, student_nos, sessions) -> report_engine.TapColumns:
+    """
+    授業コマの期間の入室時刻を report_engine.TapColumns で返す（入室の無い生徒も含む）。
+    結果の行は datetime のリストにせず、読みながら整数の配列に詰める。
+    """
+    student_nos = list(student_nos)
+    if not sessions:
+        return report_engine.TapColumns.from_rows(student_nos, ())
+    params = {
+        "学科ID": gakka_id,
+        "dmin": min(s[0] for s in sessions),
+        "dmax": max(s[0] for s in sessions),
+    }
+    if len(student_nos) == 1:
+        # 1人分（/subject_rate・/summary）は学科全体を読まない
+        (std_no,) = student_nos
+        rows = ((std_no, ts) for (ts,) in conn.execute(SQL_STUDENT_INS, {**params, "学生番号": std_no}))
+    else:
+        rows = conn.execute(SQL_GAKKA_INS, params)
+    return report_engine.TapColumns.from_rows(student_nos, _tap_columns(rows))
+
+
+def fetch_students():
+    """List of students with gakka name."""
+    stmt = (
+        select(生徒.学科ID, 生徒.学生番号, 生徒.生徒名, 学科.学科名)
+        .join(学科, 学科.学科ID == 生徒.学科ID)
+        .order_by(生徒.学科ID, 生徒.学生番号)
+    )
+    with get_conn() as conn:
+        return conn.execute(stmt).mappings().all()
+
+def fetch_timetable_for_week(gakka_id, period, week_day):
+    """指定された学科ID、期、曜日の時間割を取得"""
+    stmt = (
+        select(週時間割.時限, 週時間割.科目ID, 週時間割.教室ID, 週時間割.備考)
+        .where(週時間割.学科ID == gakka_id, 週時間割.期 == period, 週時間割.曜日 == week_day)
+        .order_by(週時間割.時限)
+    )
+    with get_conn() as conn:
+        return [dict(r) for r in conn.execute(stmt).mappings().all()]
@@ -0,0 +1,346 @@
+# digest.py (担任への出欠のまとめメール)
+"""
+学科ごとの出欠の「気になる点」（欠席者・遅刻の回数・出席不足の要注意）を、
+担任 テーブルに登録した担任へメールで送る（Flask-Mail。requirements-notify.txt）。
+
+  flask --app web digest send                      … 昨日の分（cron で毎朝。例: 30 7 * * 2-6）
+  flask --app web digest send --period weekly      … 直近7日の分（例: 30 7 * * 1）
+  flask --app web digest send --dry-run            … 送らずに1通目の文面と件数だけ表示
+  flask --app web digest smtp-server --port 8025   … 受けたメールを表示するだけのローカル SMTP サーバ
+                                                      （MAIL_SERVER=127.0.0.1 MAIL_PORT=8025 で試す）
+
+処理の流れ:
+  1. 集計 … 担任のいる全学科を1回の走査で数える。期間の授業コマと入室を学科ごとに1回ずつ読み、
+             report_engine で生徒ごとの 欠席 / 遅刻 を数える。欠席理由は全学科分を1クエリで読む。
+             要注意（rollup.at_risk_rows）も全校分を1回だけ求めて学科ごとに分ける
+  2. 文面 … templates/digest_mail.txt を1度だけ読み込み、全学科分をまとめて作る
+  3. 送信 … SMTP の接続を開いたまま続けて送る（MAIL_MAX_EMAILS 通ごとに繋ぎ直す）。
+             同時に開く接続は DIGEST_SMTP_CONNECTIONS 本まで（既定 1 = 1本の接続で全部送る）
+
+環境変数（Flask-Mail の設定。app.config に無いものだけ読む）:
+  MAIL_SERVER / MAIL_PORT / MAIL_USE_TLS / MAIL_USE_SSL / MAIL_USERNAME / MAIL_PASSWORD
+  MAIL_DEFAULT_SENDER（差出人。必須） / MAIL_MAX_EMAILS（1接続で送る上限。既定 無制限）
+"""
+import email
+import email.policy
+import os
+import smtplib
+import socketserver
+import threading
+import time as time_mod
+from datetime import date, datetime, timedelta
+
+import click
+from flask import current_app
+from sqlalchemy import bindparam, select
+
+import report_engine
+from datastore import _as_date, get_conn, load_class_sessions, load_gakka_ins, lookup, school_now
+from models import 欠席理由, 担任, 生徒
+from rollup import AT_RISK_MARGIN, at_risk_rows
+
+DIGEST_SMTP_CONNECTIONS = int(os.environ.get("DIGEST_SMTP_CONNECTIONS", "1"))
+DIGEST_TEMPLATE = "digest_mail.txt"
+PERIOD_DAYS = {"daily": 1, "weekly": 7}
+
+
+def _flag(v: str) -> bool:
+    return v.strip().lower() in ("1", "true", "yes", "on")
+
+
+MAIL_SETTINGS = {
+    "MAIL_SERVER": str, "MAIL_PORT": int, "MAIL_USE_TLS": _flag, "MAIL_USE_SSL": _flag,
+    "MAIL_USERNAME": str, "MAIL_PASSWORD": str, "MAIL_DEFAULT_SENDER": str, "MAIL_MAX_EMAILS": int,
+}
+
+SQL_HOMEROOMS = select(担任.学科ID, 担任.メール).order_by(担任.学科ID, 担任.id)
+SQL_REASONS_RANGE = (
+    select(欠席理由.学科ID, 欠席理由.学生番号, 欠席理由.科目ID, 欠席理由.日付, 欠席理由.理由区分)
+    .where(欠席理由.日付.between(bindparam("dmin"), bindparam("dmax")))
+)
+
+
+# =========================================================================
+# 集計（全学科を1回で）
+# =========================================================================
+def build_digests(dmin: date, dmax: date, term_list=(1, 2, 3, 4), margin: int = AT_RISK_MARGIN) -> list:
+    """
+    担任のいる学科ごとの出欠のまとめを返す（アプリコンテキスト内で呼ぶ）。
+      [{"学科ID", "学科名", "宛先", "コマ数", "欠席者", "遅刻者", "要注意"}, ...]
+    期間の最終日の授業まで終わったものとして数える。
+    """
+    today = dmax + timedelta(days=1)
+    subj_map = lookup("subjects")
+    with get_conn() as conn:
+        recipients = {}
+        for gakka_id, mail in conn.execute(SQL_HOMEROOMS):
+            recipients.setdefault(gakka_id, []).append(mail)
+        reasons = {
+            (g, no, subj_id, _as_date(d).isoformat()): kind
+            for g, no, subj_id, d, kind in conn.execute(SQL_REASONS_RANGE, {"dmin": dmin, "dmax": dmax})
+        }
+
+    at_risk = {}
+    if recipients:
+        for r in at_risk_rows(list(term_list), margin=margin, today=today):
+            if r["学科ID"] in recipients:
+                at_risk.setdefault(r["学科ID"], []).append(r)
+
+    digests = []
+    with get_conn() as conn:
+        for g in lookup("gakkas"):
+            gakka_id = g["学科ID"]
+            if gakka_id not in recipients:
+                continue
+            students = conn.execute(
+                select(生徒.学生番号, 生徒.生徒名).where(生徒.学科ID == gakka_id).order_by(生徒.学生番号)
+            ).all()
+            sessions = load_class_sessions(conn, gakka_id, list(term_list), dmin=dmin, dmax=dmax)
+            ins = load_gakka_ins(conn, gakka_id, [no for no, _ in students], sessions)
+            stats = report_engine.aggregate_students(sessions, ins, today)
+
+            absentees, lates = [], []
+            for std_no, name in students:
+                absent = late = 0
+                by_day = {}  # 日付 -> ["科目名（理由区分）", ...]
+                for subj_id, c in sorted(stats[std_no].items()):
+                    absent += c["欠席"]
+                    late += c["遅刻"]
+                    for d in c["欠席日"]:
+                        kind = reasons.get((gakka_id, std_no, subj_id, d))
+                        by_day.setdefault(d, []).append(
+                            subj_map.get(subj_id, f"科目{subj_id}") + (f"（{kind}）" if kind else ""))
+                if absent:
+                    absentees.append({"学生番号": std_no, "生徒名": name, "欠席": absent, "内訳": " / ".join(
+                        f"{d[5:7]}/{d[8:]} " + "・".join(dict.fromkeys(names)) for d, names in sorted(by_day.items())
+                    )})
+                if late:
+                    lates.append({"学生番号": std_no, "生徒名": name, "遅刻": late})
+            absentees.sort(key=lambda r: (-r["欠席"], r["学生番号"]))
+            lates.sort(key=lambda r: (-r["遅刻"], r["学生番号"]))
+
+            digests.append({
+                "学科ID": gakka_id, "学科名": g["学科名"], "宛先": recipients[gakka_id],
+                "コマ数": len({(s[0], s[2]) for s in sessions}),
+                "欠席者": absentees, "遅刻者": lates, "要注意": at_risk.get(gakka_id, []),
+            })
+    return digests
+
+
+# =========================================================================
+# 文面（まとめて作る）
+# =========================================================================
+def period_label(dmin: date, dmax: date) -> str:
+    if dmin == dmax:
+        return f"{dmax:%Y/%m/%d}"
+    return f"{dmin:%Y/%m/%d}〜{dmax:%m/%d}"
+
+
+def render_digests(digests, dmin: date, dmax: date, margin: int = AT_RISK_MARGIN) -> list:
+    """[(宛先リスト, 件名, 本文), ...]。テンプレートは1度だけ読み込む（アプリコンテキスト内で呼ぶ）。"""
+    template = current_app.jinja_env.get_template(DIGEST_TEMPLATE)
+    label = period_label(dmin, dmax)
+    mails = []
+    for d in digests:
+        subject = (f"[出欠] {d['学科名']} {label} 欠席{len(d['欠席者'])}人"
+                   f" 遅刻{len(d['遅刻者'])}人 要注意{len(d['要注意'])}件")
+        mails.append((d["宛先"], subject, template.render(d=d, period=label, margin=margin)))
+    return mails
+
+
+# =========================================================================
+# 送信（接続を使い回す）
+# =========================================================================
+def configure_mail(app):
+    """環境変数の MAIL_* を app.config に入れる（既に設定されている値は変えない）。"""
+    for key, conv in MAIL_SETTINGS.items():
+        if key in os.environ and key not in app.config:
+            app.config[key] = conv(os.environ[key])
+
+
+def send_mails(mails, connections: int = DIGEST_SMTP_CONNECTIONS) -> dict:
+    """
+    (宛先リスト, 件名, 本文) を送り、{"sent", "failed", "errors", "connections"} を返す（アプリコンテキスト内で呼ぶ）。
+    connections 本の SMTP 接続を開き、それぞれの接続で順に送る（1通ごとには繋ぎ直さない）。
+    送信中に接続が切れたときは繋ぎ直して1回だけ送り直す。
+    """
+    try:
+        from flask_mail import Mail, Message
+    except ImportError as e:
+        raise click.ClickException("Flask-Mail が必要です（pip install -r requirements-notify.txt）") from e
+
+    app = current_app._get_current_object()
+    mail = Mail(app)
+    if not mail.default_sender:
+        raise click.ClickException("MAIL_DEFAULT_SENDER が設定されていません")
+    summary = {"sent": 0, "failed": 0, "errors": [], "connections": 0}
+    lock = threading.Lock()
+    queue = iter(mails)
+
+    def worker():
+        with app.app_context():
+            try:
+                with mail.connect() as conn:
+                    with lock:
+                        summary["connections"] += 1
+                    send_from(conn)
+            except (smtplib.SMTPException, OSError) as e:
+                with lock:
+                    summary["errors"].append(f"SMTP 接続: {e}")
+
+    def send_from(conn):
+        while True:
+            with lock:
+                item = next(queue, None)
+            if item is None:
+                return
+            to, subject, body = item
+            msg = Message(subject, recipients=list(to), body=body)
+            try:
+                try:
+                    conn.send(msg)
+                except smtplib.SMTPServerDisconnected:
+                    conn.host = conn.configure_host()
+                    with lock:
+                        summary["connections"] += 1
+                    conn.send(msg)
+                ok, error = True, None
+            except (smtplib.SMTPException, OSError) as e:
+                ok, error = False, f"{', '.join(to)}: {e}"
+            with lock:
+                if ok:
+                    summary["sent"] += 1
+                else:
+                    summary["errors"].append(error)
+
+    threads = [threading.Thread(target=worker, name=f"digest-smtp-{i}")
+               for i in range(max(1, min(connections, len(mails))))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # 接続できずに送れなかった分も失敗に数える
+    summary["failed"] = len(mails) - summary["sent"]
+    return summary
+
+
+# =========================================================================
+# 受けたメールを表示するだけの SMTP サーバ（試験用）
+# =========================================================================
+def make_smtp_server(host: str = "127.0.0.1", port: int = 8025, quiet: bool = False):
+    """
+    SMTP を受けて捨てるサーバ（serve_forever() で起動する）。
+    受けた接続数は server.connections、メールの通数は server.received に入る。
+    """
+    lock = threading.Lock()
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            with lock:
+                self.server.connections += 1
+            self._send("220 digest-stub ESMTP")
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    return
+                cmd = line.decode("utf-8", "replace").strip().split(" ", 1)[0].upper()
+                if cmd == "EHLO":
+                    self._send("250-digest-stub\r\n250-8BITMIME\r\n250 SMTPUTF8")
+                elif cmd in ("HELO", "MAIL", "RCPT", "RSET", "NOOP"):
+                    self._send("250 OK")
+                elif cmd == "DATA":
+                    self._send("354 End data with <CR><LF>.<CR><LF>")
+                    self._receive()
+                    self._send("250 OK")
+                elif cmd == "QUIT":
+                    self._send("221 Bye")
+                    return
+                else:
+                    self._send("502 Command not implemented")
+
+        def _receive(self):
+            chunks = []
+            while True:
+                line = self.rfile.readline()
+                if not line or line in (b".\r\n", b".\n"):
+                    break
+                chunks.append(line[1:] if line.startswith(b"..") else line)
+            msg = email.message_from_bytes(b"".join(chunks), policy=email.policy.default)
+            with lock:
+                self.server.received += 1
+                n = self.server.received
+            if not quiet:
+                print(f"[digest-stub] #{n} → {msg['To']}: {msg['Subject']}")
+
+        def _send(self, text):
+            self.wfile.write(text.encode("utf-8") + b"\r\n")
+
+    class Server(socketserver.ThreadingTCPServer):
+        daemon_threads = True
+        allow_reuse_address = True
+
+    server = Server((host, port), Handler)
+    server.connections = server.received = 0
+    return server
+
+
+# =========================================================================
+# Flask への組み込み
+# =========================================================================
+def init_app(app, db):
+    """MAIL_* の設定を読み、flask digest send / smtp-server コマンドを登録する。"""
+    configure_mail(app)
+
+    @app.cli.group("digest")
+    def digest_group():
+        """担任への出欠のまとめメール"""
+
+    @digest_group.command("send")
+    @click.option("--period", type=click.Choice(list(PERIOD_DAYS)), default="daily",
+                  help="daily=1日分 / weekly=直近7日分")
+    @click.option("--date", "day", default=None, help="期間の最終日(YYYY-MM-DD)（既定: 昨日）")
+    @click.option("--term", type=int, default=0, help="要注意を数える期（0=全期）")
+    @click.option("--margin", type=int, default=AT_RISK_MARGIN, help="あと休める回数がこれ以下を要注意にする")
+    @click.option("--connections", type=int, default=DIGEST_SMTP_CONNECTIONS, help="同時に開く SMTP 接続の数")
+    @click.option("--dry-run", is_flag=True, help="送らずに1通目の文面と件数だけ表示する")
+    def send_command(period, day, term, margin, connections, dry_run):
+        """担任のいる全学科の出欠をまとめ、担任へメールで送る。"""
+        dmax = datetime.strptime(day, "%Y-%m-%d").date() if day else school_now().date() - timedelta(days=1)
+        dmin = dmax - timedelta(days=PERIOD_DAYS[period] - 1)
+        term_list = [term] if term in (1, 2, 3, 4) else [1, 2, 3, 4]
+
+        started = time_mod.perf_counter()
+        digests = build_digests(dmin, dmax, term_list, margin)
+        computed = time_mod.perf_counter()
+        mails = render_digests(digests, dmin, dmax, margin)
+        rendered = time_mod.perf_counter()
+        timing = f"集計 {computed - started:.2f}s / 文面 {rendered - computed:.2f}s"
+        if not mails:
+            print("[digest] 担任が登録された学科がありません（import-master homerooms）")
+            return
+        if dry_run:
+            to, subject, body = mails[0]
+            print(f"[digest] → {', '.join(to)}\n件名: {subject}\n\n{body}")
+            print(f"[digest] {len(mails)} 通（送信せず, {timing}）")
+            return
+
+        result = send_mails(mails, connections)
+        for error in result["errors"]:
+            print(f"[digest] 失敗: {error}")
+        print(f"[digest] {len(mails)} 通（送信 {result['sent']} / 失敗 {result['failed']},"
+              f" SMTP 接続 {result['connections']} 本, {timing}"
+              f" / 送信 {time_mod.perf_counter() - rendered:.2f}s）")
+
+    @digest_group.command("smtp-server")
+    @click.option("--host", default="127.0.0.1")
+    @click.option("--port", type=int, default=8025)
+    @click.option("--quiet", is_flag=True, help="受けたメールを表示しない")
+    def smtp_server_command(host, port, quiet):
+        """受けたメールの宛先と件名を表示するだけのローカル SMTP サーバを起動する。"""
+        server = make_smtp_server(host, port, quiet)
+        print(f"[digest-stub] smtp://{host}:{port} で待ち受けます（Ctrl+C で終了）")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        print(f"[digest-stub] 接続 {server.connections} 本 / メール {server.received} 通")
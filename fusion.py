@@ -0,0 +1,143 @@
+# fusion.py (カメラのマーカー検出 → 入退室の打刻)
+"""
+/api/camlog に届く AR マーカーの検出を、生徒の入室打刻に変換する。
+
+  1. 対応付け   … マーカー名 → (学生番号, 学科ID)。カメラマーカー テーブルに登録しておく
+                   （flask --app web import-master markers markers.csv。列: 名前, 学科ID, 学生番号）
+  2. しきい値   … スコアが FUSION_MIN_SCORE 未満の検出は捨てる（スコア無しは通す）
+  3. デバウンス … 同じ生徒が映り続けている間（前回の検出から FUSION_DEBOUNCE 秒以内）は
+                   打刻しない。しばらく映らなかった後にまた検出されたときだけ打刻候補にする
+  4. 書き込み   … 候補は溜めておき、FUSION_BATCH 件たまるか FUSION_FLUSH_INTERVAL 秒ごとに
+                   datastore.insert_attendance_batch(check_in_only=True) でまとめて書く
+                   （/api/add と同じ書き込み口。同じ日に既に入室中の生徒は飛ばす）。
+                   打刻元 = 'カメラ' で書くので、カード打刻の入室/退出の切り替えはカメラの行を数えない
+
+1〜3 はプロセス内のメモリだけで判定するので、生のフレーム単位では DB に問い合わせない。
+状態はプロセスごとに持つ。複数の ingest ワーカーが同じ生徒を受けても、
+書き込み時に同じ日の入室済みを確認するので、通常は入室が二重にならない。
+"""
+import atexit
+import os
+import threading
+
+from flask import current_app
+
+from datastore import insert_attendance_batch, lookup, school_now
+
+FUSION_ENABLED = os.environ.get("FUSION_ENABLED", "1") == "1"
+FUSION_MIN_SCORE = float(os.environ.get("FUSION_MIN_SCORE", "0.6"))
+FUSION_DEBOUNCE = float(os.environ.get("FUSION_DEBOUNCE", "300"))           # 秒
+FUSION_BATCH = int(os.environ.get("FUSION_BATCH", "50"))
+FUSION_FLUSH_INTERVAL = float(os.environ.get("FUSION_FLUSH_INTERVAL", "2"))  # 秒。0 以下はその場で書く
+
+# 打刻候補にする検出のステータス（lost などは見ない）
+FUSION_STATUSES = {"detected", "ok"}
+
+
+# =========================================================================
+# プロセス内の状態（fork 後の子プロセスでは作り直す）
+# =========================================================================
+_lock = threading.Lock()
+_wake = threading.Event()
+_last_seen = {}   # (学生番号, 学科ID) -> 最後に検出した時刻
+_pending = []     # insert_attendance_batch() に渡す打刻候補
+_state_pid = None
+_app = None
+
+
+def _ensure_state():
+    """fork 後の最初の呼び出しで状態を捨て、書き込みスレッドを起動する（_lock 内で呼ぶ）。"""
+    global _state_pid, _app
+    if _state_pid == os.getpid():
+        return
+    _last_seen.clear()
+    _pending.clear()
+    _state_pid = os.getpid()
+    _app = current_app._get_current_object()
+    if FUSION_FLUSH_INTERVAL > 0:
+        threading.Thread(target=_flush_loop, name="camera-fusion", daemon=True).start()
+
+
+def _flush_loop():
+    while True:
+        _wake.wait(FUSION_FLUSH_INTERVAL)
+        _wake.clear()
+        try:
+            with _app.app_context():
+                flush()
+        except Exception as e:  # 書けなかった打刻候補は flush() が戻している。次の周期で書き直す
+            _app.logger.error(f"camera fusion flush failed: {e}")
+
+
+# =========================================================================
+# 公開関数
+# =========================================================================
+def feed(events) -> int:
+    """
+    検出イベントを取り込み、打刻候補にした件数を返す（アプリコンテキスト内で呼ぶ）。
+      events: [(記録時刻 datetime, ステータス, マーカー名, スコア), ...]
+    """
+    if not FUSION_ENABLED:
+        return 0
+    markers = lookup("markers")
+    if not markers:
+        return 0
+
+    accepted = 0
+    with _lock:
+        _ensure_state()
+        for ts, status, marker, score in events:
+            if status not in FUSION_STATUSES or not marker:
+                continue
+            student = markers.get(marker)
+            if student is None or (score is not None and score < FUSION_MIN_SCORE):
+                continue
+            学生番号, 学科ID, 生徒名 = student
+            key = (学生番号, 学科ID)
+            last = _last_seen.get(key)
+            if last is not None and ts <= last:
+                continue  # 順序の入れ替わった古い検出
+            _last_seen[key] = ts
+            if last is not None and (ts - last).total_seconds() <= FUSION_DEBOUNCE:
+                continue
+            _pending.append({
+                "学生番号": 学生番号, "生徒名": 生徒名, "学科ID": 学科ID,
+                "入退出時間": ts.strftime("%Y-%m-%d %H:%M:%S"),
+            })
+            accepted += 1
+        full = len(_pending) >= FUSION_BATCH
+
+    if accepted and FUSION_FLUSH_INTERVAL <= 0:
+        flush()
+    elif full:
+        _wake.set()
+    return accepted
+
+
+def flush() -> list:
+    """溜まっている打刻候補を書き込み、記録した行を返す（アプリコンテキスト内で呼ぶ）。"""
+    with _lock:
+        taps = _pending[:]
+        _pending.clear()
+        # 長く映っていない生徒の検出時刻は、デバウンスに使わないので捨てる
+        now = school_now()
+        for key, ts in list(_last_seen.items()):
+            if (now - ts).total_seconds() > FUSION_DEBOUNCE:
+                del _last_seen[key]
+    if not taps:
+        return []
+    try:
+        return insert_attendance_batch(taps, check_in_only=True)
+    except Exception:
+        # 書けなかった分は先頭に戻し、次の flush で書き直す
+        # （_last_seen は更新済みで、デバウンス中の次の検出からは打刻候補が作られないため）
+        with _lock:
+            _pending[:0] = taps
+        raise
+
+
+@atexit.register
+def _flush_at_exit():
+    if _app is not None and _state_pid == os.getpid():
+        with _app.app_context():
+            flush()
@@ -0,0 +1,105 @@
+# gunicorn.conf.py
+#   起動: gunicorn -c gunicorn.conf.py web:app
+#
+# 打刻専用サービス（APP_PROFILE=ingest）
+#   ゲートの読取機が使う /api/add・/api/add_by_names・/api/camlog(/batch) だけを載せた別プロセス群。
+#   帳票（/kamoku, /subject_rate など）の重い処理にワーカーを取られないよう、画面用とは
+#   別のポート・別のワーカープールで動かし、読取機はこちらに向ける。
+#     gunicorn -c gunicorn.conf.py web:app                      … 画面・帳票（:5000）
+#     APP_PROFILE=ingest gunicorn -c gunicorn.conf.py web:app   … 打刻専用（:5001）
+#   打刻は数 ms の短い書き込みなので、スレッドワーカーで同時接続を多めに受け、
+#   タイムアウトも短くする（INGEST_* の環境変数で調整）。
+#   PROMETHEUS_MULTIPROC_DIR は起動時に空にするので、サービスごとに別のディレクトリを指定すること。
+#
+# preload モード（既定: GUNICORN_PRELOAD=1）
+#   マスタープロセスでアプリを読み込み、スキーマ確認・初期データ投入・
+#   読み取り専用キャッシュ（時限表・マスタ）の準備を一度だけ済ませてから fork する。
+#   ワーカーはそれを copy-on-write で共有するので、ワーカー数を増やしても
+#   起動時の DB 負荷とメモリはほとんど増えない。
+#   DB 接続だけはプロセス間で共有できないため、fork 前に閉じ、fork 後に作り直す。
+#
+# 再読込
+#   kill -HUP <master>  … マスタ（時限表・科目名など）を読み直してからワーカーを順次入替。
+#                          import-master 後にすぐ反映したいときはこれ。
+#                          ※ preload ではアプリのコード自体は読み直されない
+#   kill -USR2 <master> → 新マスターの起動を確認してから kill -QUIT <旧master>
+#                       … コード更新を伴う無停止入替
+import os
+import shutil
+
+APP_PROFILE = os.environ.get("APP_PROFILE", "full")
+
+if APP_PROFILE == "ingest":
+    bind = f"0.0.0.0:{os.environ.get('PORT', '5001')}"
+    workers = int(os.environ.get("INGEST_WORKERS", "2"))
+    worker_class = "gthread"
+    threads = int(os.environ.get("INGEST_THREADS", "8"))
+    # 打刻が数秒かかることはない。詰まったワーカーは早めに入れ替える
+    timeout = int(os.environ.get("INGEST_TIMEOUT", "10"))
+    # 読取機は常時接続し直すので keep-alive を長めに
+    keepalive = int(os.environ.get("INGEST_KEEPALIVE", "30"))
+    # 各スレッドが DB 接続を待たずに済むよう、プールをスレッド数に合わせる（web.create_app が読む）
+    os.environ.setdefault("DB_POOL_SIZE", str(threads))
+else:
+    bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+    workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+# HUP / QUIT 時に処理中のリクエストを待つ秒数
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+
+
+# =========================================================================
+# Prometheus multiprocess モード
+#   PROMETHEUS_MULTIPROC_DIR が設定されていれば、各ワーカーのメトリクスを
+#   そのディレクトリ経由で合算する（/metrics はどのワーカーでも全体値を返す）。
+#   preload ではアプリ（＝ prometheus_client）の読み込みが on_starting より前なので、
+#   設定ファイルの読み込み時に空にする。HUP で設定を読み直したときは消さない。
+# =========================================================================
+def _reset_prometheus_dir():
+    prom_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if not prom_dir or os.environ.get("_ARIBABA_PROM_DIR_READY"):
+        return
+    # 前回起動時の値が残らないよう、起動時に空にする
+    shutil.rmtree(prom_dir, ignore_errors=True)
+    os.makedirs(prom_dir, exist_ok=True)
+    os.environ["_ARIBABA_PROM_DIR_READY"] = "1"
+
+
+_reset_prometheus_dir()
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+
+# =========================================================================
+# DB 初期化・キャッシュ
+#   web.py はインポート時に DB へ触らない。
+#   preload: マスターで初期化とキャッシュ準備 → 接続を閉じて fork
+#   非 preload: 各ワーカーの起動直後に一度だけ確認（済んでいれば数クエリで戻る）。
+#   どちらもプロセス間ロックで直列化されるので、ワーカー同士で競合しない。
+# =========================================================================
+def on_starting(server):
+    if preload_app:
+        import web
+        web.prepare_preload()
+
+
+def on_reload(server):
+    # HUP: 新しいワーカーを fork する前にマスター側のキャッシュを読み直す
+    if preload_app:
+        import web
+        web.prepare_preload()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        import web
+        web.reset_after_fork()
+
+
+def post_worker_init(worker):
+    import web
+    web.init_db_on_startup()
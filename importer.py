@@ -0,0 +1,369 @@
+# importer.py (マスタデータの一括取り込み)
+"""
+生徒 / 授業科目 / 週時間割 / 授業計画 / 特別時間割 / カメラマーカー / 連絡先 / 担任 を CSV・XLSX から一括で取り込む。
+
+  flask --app web import-master 生徒 students.csv
+  flask --app web import-master 授業計画 calendar_2026.xlsx --dry-run
+
+ファイルの1行目は見出し行（列名はテーブルの列名そのまま。順不同、余分な列は無視）。
+処理の流れ:
+  1. 読み込み … CSV は UTF-8（BOM 可）、XLSX は先頭シートを openpyxl で読む
+  2. 検証     … 必須列・型・参照先マスタ（学科・期・曜日・時限・科目・教室）の存在を確認。
+                 1件でもエラーがあれば何も書き込まずに行番号付きで報告する
+  3. 取り込み … 1トランザクションで upsert（同じキーの行は上書き）
+                 PostgreSQL: 一時テーブルへ COPY → INSERT ... SELECT ... ON CONFLICT
+                 SQLite    : INSERT ... ON CONFLICT を executemany
+"""
+import csv
+import os
+import time
+from datetime import date, datetime
+from io import StringIO
+
+import click
+from sqlalchemy import select, text
+
+
+class MasterImportError(ValueError):
+    """検証エラー（errors に「行番号: 内容」のリストを持つ）"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"{len(errors)} 件のエラーがあります")
+
+
+# =========================================================================
+# 値の変換
+# =========================================================================
+def _to_int(v):
+    if isinstance(v, bool):
+        raise ValueError(v)
+    if isinstance(v, float):
+        if not v.is_integer():
+            raise ValueError(v)
+        return int(v)
+    return int(str(v).strip())
+
+
+def _to_date(v):
+    if isinstance(v, datetime):
+        return v.date()
+    if isinstance(v, date):
+        return v
+    return datetime.strptime(str(v).strip().replace("/", "-"), "%Y-%m-%d").date()
+
+
+def _to_date_str(v):
+    # 特別時間割.日付 は 'YYYY-MM-DD' 文字列で持っている
+    return _to_date(v).isoformat()
+
+
+def _to_str(v):
+    return str(v).strip()
+
+
+# =========================================================================
+# 取り込み対象の定義
+# =========================================================================
+class Field:
+    __slots__ = ("name", "parse", "required", "default", "ref")
+
+    def __init__(self, name, parse, required=False, default=None, ref=None):
+        self.name = name
+        self.parse = parse
+        self.required = required
+        self.default = default
+        self.ref = ref  # (参照先テーブル, 参照先列)
+
+
+KINDS = {
+    "生徒": {
+        "fields": [
+            Field("学科ID", _to_int, required=True, ref=("学科", "学科ID")),
+            Field("学生番号", _to_int, required=True),
+            Field("生徒名", _to_str, required=True),
+            Field("備考", _to_str),
+        ],
+        "keys": ["学科ID", "学生番号"],
+    },
+    "授業科目": {
+        "fields": [
+            Field("授業科目ID", _to_int, required=True),
+            Field("授業科目名", _to_str, required=True),
+            Field("学科ID", _to_int, required=True, ref=("学科", "学科ID")),
+            Field("単位", _to_int, default=0),
+            Field("学科フラグ", _to_int, default=0),
+            Field("備考", _to_str),
+        ],
+        "keys": ["授業科目ID"],
+    },
+    "週時間割": {
+        "fields": [
+            Field("年度", _to_int, required=True),
+            Field("学科ID", _to_int, required=True, ref=("学科", "学科ID")),
+            Field("期", _to_int, required=True, ref=("期マスタ", "期ID")),
+            Field("曜日", _to_int, required=True, ref=("曜日マスタ", "曜日ID")),
+            Field("時限", _to_int, required=True, ref=("TimeTable", "時限")),
+            Field("科目ID", _to_int, ref=("授業科目", "授業科目ID")),
+            Field("教室ID", _to_int, ref=("教室", "教室ID")),
+            Field("備考", _to_str),
+        ],
+        "keys": ["年度", "学科ID", "期", "曜日", "時限"],
+    },
+    "授業計画": {
+        "fields": [
+            Field("日付", _to_date, required=True),
+            Field("期", _to_int, ref=("期マスタ", "期ID")),
+            Field("授業曜日", _to_int, ref=("曜日マスタ", "曜日ID")),
+            Field("備考", _to_str),
+        ],
+        "keys": ["日付"],
+    },
+    "特別時間割": {
+        "fields": [
+            Field("日付", _to_date_str, required=True),
+            Field("学科ID", _to_int, required=True, ref=("学科", "学科ID")),
+            Field("時限", _to_int, required=True, ref=("TimeTable", "時限")),
+            Field("科目ID", _to_int, ref=("授業科目", "授業科目ID")),
+            Field("教室ID", _to_int, ref=("教室", "教室ID")),
+            Field("備考", _to_str),
+        ],
+        "keys": ["日付", "学科ID", "時限"],
+    },
+    # カメラのマーカー名 → 生徒（fusion.py が検出を打刻に変換する）
+    "カメラマーカー": {
+        "fields": [
+            Field("名前", _to_str, required=True),
+            Field("学科ID", _to_int, ref=("学科", "学科ID")),
+            Field("学生番号", _to_int),
+        ],
+        "keys": ["名前"],
+    },
+    # 欠席を通知する保護者の LINE ユーザーID（notify.py）
+    "連絡先": {
+        "fields": [
+            Field("学科ID", _to_int, required=True, ref=("学科", "学科ID")),
+            Field("学生番号", _to_int, required=True),
+            Field("宛先", _to_str, required=True),
+            Field("名前", _to_str),
+        ],
+        "keys": ["学科ID", "学生番号", "宛先"],
+    },
+    # 出欠のまとめメールを受け取る担任（digest.py）
+    "担任": {
+        "fields": [
+            Field("学科ID", _to_int, required=True, ref=("学科", "学科ID")),
+            Field("メール", _to_str, required=True),
+            Field("名前", _to_str),
+        ],
+        "keys": ["学科ID", "メール"],
+    },
+}
+
+# CLI で英名も受け付ける
+KIND_ALIASES = {
+    "students": "生徒",
+    "subjects": "授業科目",
+    "timetable": "週時間割",
+    "calendar": "授業計画",
+    "special": "特別時間割",
+    "markers": "カメラマーカー",
+    "contacts": "連絡先",
+    "homerooms": "担任",
+}
+
+
+def resolve_kind(kind: str) -> str:
+    kind = KIND_ALIASES.get(kind, kind)
+    if kind not in KINDS:
+        names = ", ".join(list(KINDS) + list(KIND_ALIASES))
+        raise MasterImportError([f"不明な取り込み種別です: {kind}（{names}）"])
+    return kind
+
+
+# =========================================================================
+# 読み込み
+# =========================================================================
+def read_rows(path: str):
+    """(行番号, {列名: 値}) を返すイテレータ。行番号は見出しを1行目とした番号。"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".xlsx", ".xlsm"):
+        return _read_xlsx(path)
+    return _read_csv(path)
+
+
+def _read_csv(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        for lineno, row in enumerate(reader, start=2):
+            yield lineno, {(k or "").strip(): v for k, v in row.items()}
+
+
+def _read_xlsx(path):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise MasterImportError(["XLSX の読み込みには openpyxl が必要です（pip install openpyxl）"])
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = [str(h).strip() if h is not None else "" for h in next(rows, ())]
+        for lineno, values in enumerate(rows, start=2):
+            if all(v is None for v in values):
+                continue
+            yield lineno, dict(zip(header, values))
+    finally:
+        wb.close()
+
+
+# =========================================================================
+# 検証
+# =========================================================================
+def _is_blank(v) -> bool:
+    return v is None or (isinstance(v, str) and not v.strip())
+
+
+def _load_refs(conn, metadata, spec) -> dict:
+    """参照先マスタのキー集合を (テーブル, 列) ごとに一度だけ読む。"""
+    refs = {}
+    for f in spec["fields"]:
+        if f.ref and f.ref not in refs:
+            table = metadata.tables[f.ref[0]]
+            refs[f.ref] = set(conn.execute(select(table.c[f.ref[1]])).scalars())
+    return refs
+
+
+def validate(kind: str, rows, refs: dict) -> list:
+    """行を型変換・検証し、キーで重複を除いた（後勝ち）dict のリストを返す。"""
+    spec = KINDS[kind]
+    fields = spec["fields"]
+    errors = []
+    staged = {}
+    header_checked = False
+
+    for lineno, raw in rows:
+        if not header_checked:
+            missing = [f.name for f in fields if f.required and f.name not in raw]
+            if missing:
+                raise MasterImportError([f"1行目: 必須列がありません: {', '.join(missing)}"])
+            header_checked = True
+
+        rec = {}
+        for f in fields:
+            v = raw.get(f.name)
+            if _is_blank(v):
+                if f.required:
+                    errors.append(f"{lineno}行目: {f.name} が空です")
+                rec[f.name] = f.default
+                continue
+            try:
+                rec[f.name] = f.parse(v)
+            except (TypeError, ValueError):
+                errors.append(f"{lineno}行目: {f.name} の値が不正です: {v!r}")
+                rec[f.name] = None
+                continue
+            if f.ref and rec[f.name] not in refs.get(f.ref, ()):
+                errors.append(f"{lineno}行目: {f.name}={rec[f.name]} は {f.ref[0]} に存在しません")
+        staged[tuple(rec[k] for k in spec["keys"])] = rec
+
+    if errors:
+        raise MasterImportError(errors)
+    return list(staged.values())
+
+
+# =========================================================================
+# 取り込み
+# =========================================================================
+def _upsert_stmt(conn, table, keys, columns):
+    if conn.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    stmt = dialect_insert(table)
+    updates = [c for c in columns if c not in keys]
+    if not updates:
+        return stmt.on_conflict_do_nothing(index_elements=keys)
+    return stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={c: stmt.excluded[c] for c in updates},
+    )
+
+
+def _copy_upsert(conn, table, keys, columns, records):
+    """PostgreSQL: 一時テーブルに COPY してから ON CONFLICT で本表へ反映する。"""
+    q = lambda name: '"' + name.replace('"', '""') + '"'
+    cols = ", ".join(q(c) for c in columns)
+    conn.execute(text(
+        f"CREATE TEMP TABLE _import_stage (LIKE {q(table.name)} INCLUDING DEFAULTS) ON COMMIT DROP"
+    ))
+
+    buf = StringIO()
+    writer = csv.writer(buf)
+    for rec in records:
+        # None は引用符なしの空欄 → COPY ... CSV では NULL になる
+        writer.writerow(["" if rec[c] is None else rec[c] for c in columns])
+    buf.seek(0)
+    # SQLAlchemy のトランザクションと同じ DBAPI 接続で COPY する
+    with conn.connection.cursor() as cur:
+        cur.copy_expert(f"COPY _import_stage ({cols}) FROM STDIN WITH (FORMAT csv)", buf)
+
+    updates = [c for c in columns if c not in keys]
+    conflict = ", ".join(q(k) for k in keys)
+    if updates:
+        action = "DO UPDATE SET " + ", ".join(f"{q(c)} = EXCLUDED.{q(c)}" for c in updates)
+    else:
+        action = "DO NOTHING"
+    conn.execute(text(
+        f"INSERT INTO {q(table.name)} ({cols}) SELECT {cols} FROM _import_stage "
+        f"ON CONFLICT ({conflict}) {action}"
+    ))
+
+
+def import_master(engine, metadata, kind: str, path: str, dry_run: bool = False) -> dict:
+    """ファイルを検証して取り込み、件数と所要時間を返す。"""
+    kind = resolve_kind(kind)
+    spec = KINDS[kind]
+    table = metadata.tables[kind]
+    columns = [f.name for f in spec["fields"]]
+    started = time.perf_counter()
+
+    with engine.begin() as conn:
+        refs = _load_refs(conn, metadata, spec)
+        records = validate(kind, read_rows(path), refs)
+        if records and not dry_run:
+            if conn.dialect.name == "postgresql":
+                _copy_upsert(conn, table, spec["keys"], columns, records)
+            else:
+                conn.execute(_upsert_stmt(conn, table, spec["keys"], columns), records)
+
+    return {
+        "kind": kind,
+        "rows": len(records),
+        "dry_run": dry_run,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+# =========================================================================
+# Flask への組み込み
+# =========================================================================
+def init_app(app, db):
+    """flask import-master コマンドを登録する。"""
+
+    @app.cli.command("import-master")
+    @click.argument("kind")
+    @click.argument("path", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--dry-run", is_flag=True, help="検証だけ行い、書き込まない")
+    def import_master_command(kind, path, dry_run):
+        """マスタデータ（生徒 / 授業科目 / 週時間割 / 授業計画 / 特別時間割 / カメラマーカー / 連絡先）を一括取り込みする。"""
+        try:
+            result = import_master(db.engine, db.metadata, kind, path, dry_run=dry_run)
+        except MasterImportError as e:
+            for msg in e.errors[:50]:
+                print(f"  {msg}")
+            if len(e.errors) > 50:
+                print(f"  ... ほか {len(e.errors) - 50} 件")
+            raise click.ClickException(f"取り込みを中止しました（{e}）")
+        verb = "検証しました" if dry_run else "取り込みました"
+        print(f"[import] {result['kind']}: {result['rows']} 件を{verb}（{result['seconds']}s）")
@@ -0,0 +1,160 @@
+# instrumentation.py (リクエスト単位のクエリ計数・DB時間計測)
+"""
+1リクエストの間に発行された SQL の件数・合計DB時間・最も遅い文・取得行数を記録し、
+Server-Timing ヘッダと /debug/requests のリングバッファで確認できるようにする。
+
+有効化: 環境変数 QUERY_STATS=1
+  無効時は SQLAlchemy のイベントも before/after_request も登録しないので、
+  ほぼオーバーヘッドはない。
+
+計測対象:
+  SQLAlchemy エンジン経由の全クエリ（ORM / Core / get_conn()）… before/after_cursor_execute イベント
+  取得行数 … 行を返す文（SELECT・RETURNING）の cursor.rowcount。INSERT/UPDATE/DELETE の影響行数は数えない
+            （SQLite は SELECT で -1 を返すため、SQLite では接続の row_factory で取得した行を数える）
+"""
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Optional
+
+from flask import g, request
+from sqlalchemy import event
+
+QUERY_STATS_ENABLED = os.environ.get("QUERY_STATS", "0").lower() in ("1", "true", "yes", "on")
+RING_SIZE = int(os.environ.get("QUERY_STATS_RING", "200"))
+SLOW_SQL_MAX_CHARS = 300
+
+_current: ContextVar[Optional["RequestStats"]] = ContextVar("request_stats", default=None)
+_ring = deque(maxlen=RING_SIZE)
+_ring_lock = threading.Lock()
+
+
+class RequestStats:
+    """1リクエスト分の集計値"""
+    __slots__ = ("queries", "db_time", "rows", "slowest_time", "slowest_sql", "started")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.slowest_time = 0.0
+        self.slowest_sql = None
+        self.started = time.perf_counter()
+
+    def record(self, sql, elapsed: float, rowcount: int):
+        self.queries += 1
+        self.db_time += elapsed
+        if rowcount and rowcount > 0:
+            self.rows += rowcount
+        if elapsed > self.slowest_time:
+            self.slowest_time = elapsed
+            self.slowest_sql = sql
+
+
+def _record(sql, elapsed, rowcount):
+    stats = _current.get()
+    if stats is not None:
+        stats.record(sql, elapsed, rowcount)
+
+
+# =========================================================================
+# SQLAlchemy エンジンのイベント
+# =========================================================================
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start_time")
+    if not starts:
+        return
+    # 行を返す文だけ数える（SQLite は row_factory 側で数える）
+    fetched = cursor.description is not None and conn.dialect.name != "sqlite"
+    _record(statement, time.perf_counter() - starts.pop(), cursor.rowcount if fetched else 0)
+
+
+def _handle_error(context):
+    # 失敗したクエリでは after_cursor_execute が来ないので、開始時刻をここで取り除く
+    # （残るとプールに戻った接続の次のクエリが古い開始時刻で計られる）
+    conn = context.connection
+    starts = conn.info.get("query_start_time") if conn is not None else None
+    if not starts:
+        return
+    _record(context.statement, time.perf_counter() - starts.pop(), 0)
+
+
+def _count_row(cursor, row):
+    stats = _current.get()
+    if stats is not None:
+        stats.rows += 1
+    return row
+
+
+def _sqlite_connect(dbapi_conn, connection_record):
+    dbapi_conn.row_factory = _count_row
+
+
+# =========================================================================
+# Flask への組み込み
+# =========================================================================
+def _server_timing(stats: RequestStats, total: float) -> str:
+    return (
+        f'db;dur={stats.db_time * 1000:.2f};desc="queries={stats.queries} rows={stats.rows}", '
+        f"app;dur={total * 1000:.2f}"
+    )
+
+
+def recent_requests() -> list:
+    """リングバッファの内容（新しい順）"""
+    with _ring_lock:
+        return list(reversed(_ring))
+
+
+def init_app(app, engine):
+    """QUERY_STATS=1 のときだけフックを登録する。"""
+    if not QUERY_STATS_ENABLED:
+        return
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _sqlite_connect)
+
+    @app.before_request
+    def _start_request_stats():
+        g._query_stats_token = _current.set(RequestStats())
+
+    @app.after_request
+    def _finish_request_stats(response):
+        stats = _current.get()
+        if stats is None:
+            return response
+        total = time.perf_counter() - stats.started
+        response.headers.add("Server-Timing", _server_timing(stats, total))
+        slow_sql = stats.slowest_sql
+        if slow_sql is not None:
+            slow_sql = " ".join(str(slow_sql).split())[:SLOW_SQL_MAX_CHARS]
+        entry = {
+            "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "method": request.method,
+            "path": request.full_path.rstrip("?"),
+            "endpoint": request.endpoint,
+            "status": response.status_code,
+            "total_ms": round(total * 1000, 2),
+            "queries": stats.queries,
+            "db_ms": round(stats.db_time * 1000, 2),
+            "rows": stats.rows,
+            "slowest": {"ms": round(stats.slowest_time * 1000, 2), "sql": slow_sql},
+        }
+        with _ring_lock:
+            _ring.append(entry)
+        return response
+
+    @app.teardown_request
+    def _reset_request_stats(exc=None):
+        token = g.pop("_query_stats_token", None)
+        if token is not None:
+            _current.reset(token)
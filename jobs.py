@@ -0,0 +1,163 @@
+# jobs.py (重い帳票・エクスポートのバックグラウンド実行)
+"""
+/kamoku・/subject_rate（全期）・/download など数秒かかる処理を、リクエストの外で実行する。
+
+  1. 投入   … submit(kind, params) が report_jobs に1行登録し、スレッドプールに渡す
+  2. 実行   … 対象のビュー関数をそのままリクエストコンテキスト付きで呼び、
+               応答の本文（HTML / CSV）を report_jobs.result に保存する
+  3. 取得   … 状態・進捗は report_jobs を読むので、どの gunicorn ワーカーに問い合わせてもよい
+
+同じ種類・同じパラメータの依頼は、実行中なら同じジョブを返し、
+完了後 JOB_RESULT_TTL 秒以内なら保存済みの結果をそのまま返す（再計算しない）。
+
+実行はジョブを受け付けたプロセス内のスレッドで行う。そのプロセスが落ちた場合、
+JOB_TIMEOUT 秒を過ぎても終わらないジョブは失敗として扱う。
+"""
+import hashlib
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from inspect import unwrap
+from typing import Optional
+
+from sqlalchemy import select
+
+from models import db
+from schema import report_jobs
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_RESULT_TTL = int(os.environ.get("JOB_RESULT_TTL", "600"))    # 結果を使い回す秒数
+JOB_TIMEOUT = int(os.environ.get("JOB_TIMEOUT", "900"))          # これを過ぎた実行中ジョブは失敗扱い
+JOB_RETENTION = int(os.environ.get("JOB_RETENTION", "86400"))    # 終わったジョブを残す秒数
+
+# ジョブの種類 → (実行するエンドポイント, 投入にログ認証が要るか)
+JOB_KINDS = {
+    "kamoku": ("reports.kamoku", False),
+    "kamoku_csv": ("reports.kamoku_csv", False),
+    "subject_rate": ("reports.subject_rate", False),
+    "at_risk_csv": ("reports.at_risk_csv", False),
+    "download": ("reports.download_csv", True),
+}
+
+
+class JobError(ValueError):
+    """投入できないジョブ（不明な種類など）"""
+
+
+# =========================================================================
+# スレッドプール（fork 後の子プロセスでは作り直す）
+# =========================================================================
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="report-job")
+            _executor_pid = os.getpid()
+        return _executor
+
+
+# =========================================================================
+# 投入・参照
+# =========================================================================
+def params_key(kind: str, params: dict) -> str:
+    raw = json.dumps([kind, params], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _find_reusable(conn, kind: str, key: str):
+    """同じ依頼で、実行中のもの / 期限内の完了済みのものがあれば返す。"""
+    now = datetime.now()
+    rows = conn.execute(
+        select(report_jobs.c.id, report_jobs.c.status, report_jobs.c.updated_at,
+               report_jobs.c.finished_at)
+        .where(report_jobs.c.kind == kind, report_jobs.c.params_key == key,
+               report_jobs.c.status.in_(["queued", "running", "done"]))
+        .order_by(report_jobs.c.created_at.desc())
+    ).mappings().all()
+    for r in rows:
+        if r["status"] == "done":
+            if r["finished_at"] and now - r["finished_at"] < timedelta(seconds=JOB_RESULT_TTL):
+                return r["id"]
+        elif now - r["updated_at"] < timedelta(seconds=JOB_TIMEOUT):
+            return r["id"]
+    return None
+
+
+def submit(app, kind: str, params: dict) -> str:
+    """ジョブを登録して実行を始め、ジョブ ID を返す（同じ依頼があればその ID）。"""
+    if kind not in JOB_KINDS:
+        raise JobError(f"不明なジョブの種類です: {kind}")
+    params = {k: str(v) for k, v in params.items() if v not in (None, "")}
+    key = params_key(kind, params)
+    now = datetime.now()
+
+    with db.engine.begin() as conn:
+        existing = _find_reusable(conn, kind, key)
+        if existing:
+            return existing
+        # 古いジョブの片付け（結果の BLOB が溜まらないように）
+        conn.execute(report_jobs.delete().where(
+            report_jobs.c.updated_at < now - timedelta(seconds=JOB_RETENTION)
+        ))
+        job_id = uuid.uuid4().hex
+        conn.execute(report_jobs.insert().values(
+            id=job_id, kind=kind, params=json.dumps(params, ensure_ascii=False), params_key=key,
+            status="queued", progress=0, created_at=now, updated_at=now,
+        ))
+
+    _get_executor().submit(_run, app, job_id, kind, params)
+    return job_id
+
+
+def get_job(job_id: str, with_result: bool = False) -> Optional[dict]:
+    cols = [c for c in report_jobs.c if with_result or c.name != "result"]
+    with db.engine.connect() as conn:
+        row = conn.execute(select(*cols).where(report_jobs.c.id == job_id)).mappings().first()
+    if row is None:
+        return None
+    job = dict(row)
+    job["params"] = json.loads(job["params"])
+    if job["status"] in ("queued", "running") and \
+            datetime.now() - job["updated_at"] > timedelta(seconds=JOB_TIMEOUT):
+        job["status"] = "failed"
+        job["message"] = "時間内に終わりませんでした（実行中のプロセスが停止した可能性があります）"
+    return job
+
+
+# =========================================================================
+# 実行
+# =========================================================================
+def _update(job_id: str, **values):
+    values["updated_at"] = datetime.now()
+    with db.engine.begin() as conn:
+        conn.execute(report_jobs.update().where(report_jobs.c.id == job_id).values(**values))
+
+
+def _run(app, job_id: str, kind: str, params: dict):
+    endpoint, _ = JOB_KINDS[kind]
+    with app.app_context():
+        try:
+            _update(job_id, status="running", progress=10)
+            # 認証デコレータ（require_logs_auth）は投入時に確認済みなので外して呼ぶ
+            view = unwrap(app.view_functions[endpoint])
+            with app.test_request_context(query_string=params):
+                response = app.make_response(view())
+            if response.status_code >= 300:
+                raise RuntimeError(f"HTTP {response.status_code}")
+            # send_file の応答はそのままでは本文を読み出せない
+            response.direct_passthrough = False
+            _update(job_id, status="done", progress=100, result=response.get_data(),
+                    content_type=response.content_type,
+                    disposition=response.headers.get("Content-Disposition"),
+                    finished_at=datetime.now())
+        except Exception as e:
+            app.logger.error(f"report job {job_id} ({kind}) failed: {e}")
+            _update(job_id, status="failed", message=str(e)[:200], finished_at=datetime.now())
@@ -0,0 +1,137 @@
+# metrics.py (Prometheus 形式のメトリクス)
+"""
+/metrics で公開するカウンタ・ヒストグラムの定義と Flask への組み込み。
+
+gunicorn の複数ワーカーで集計する場合（multiprocess モード）:
+  1. 環境変数 PROMETHEUS_MULTIPROC_DIR に空のディレクトリを指定して起動する
+  2. gunicorn.conf.py の child_exit フックで終了ワーカーの値を片付ける
+  このとき /metrics はどのワーカーが応答しても全ワーカー合算の値を返す。
+
+prometheus_client が入っていない環境では、計測呼び出しは全て何もしない（no-op）。
+"""
+import os
+import time
+
+from flask import Response, g, request
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram,
+        generate_latest, multiprocess,
+    )
+    PROMETHEUS_AVAILABLE = True
+except ImportError:  # pragma: no cover - 任意依存
+    PROMETHEUS_AVAILABLE = False
+
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+# レイテンシのバケット（打刻は数ms、帳票は数秒を想定）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _NoopMetric:
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+if PROMETHEUS_AVAILABLE:
+    TAPS_INGESTED = Counter(
+        "attendance_taps_ingested_total", "記録した入退室の打刻数",
+        ["gakka_id", "kubun", "status"],
+    )
+    CAMERA_EVENTS = Counter(
+        "camera_events_total", "受信したカメラログのイベント数", ["status"],
+    )
+    REQUEST_LATENCY = Histogram(
+        "http_request_duration_seconds", "ルートごとの応答時間（秒）",
+        ["endpoint", "method"], buckets=LATENCY_BUCKETS,
+    )
+    DB_POOL_CHECKED_OUT = Gauge(
+        "db_pool_checked_out", "使用中の DB 接続数", multiprocess_mode="livesum",
+    )
+    DB_POOL_SIZE = Gauge(
+        "db_pool_size", "DB 接続プールのサイズ", multiprocess_mode="livesum",
+    )
+    CACHE_REQUESTS = Counter(
+        "cache_requests_total", "キャッシュ参照回数（hit/miss）", ["cache", "result"],
+    )
+    CSV_EXPORT_BYTES = Counter(
+        "csv_export_bytes_total", "CSV エクスポートの出力バイト数", ["export"],
+    )
+else:
+    TAPS_INGESTED = CAMERA_EVENTS = REQUEST_LATENCY = _NoopMetric()
+    DB_POOL_CHECKED_OUT = DB_POOL_SIZE = CACHE_REQUESTS = CSV_EXPORT_BYTES = _NoopMetric()
+
+
+# =========================================================================
+# 計測ヘルパー
+# =========================================================================
+def observe_tap(学科ID, 入室区分: str, 出席状態: str):
+    TAPS_INGESTED.labels(str(学科ID), 入室区分 or "", 出席状態 or "").inc()
+
+
+def observe_camera_event(ステータス: str):
+    CAMERA_EVENTS.labels(ステータス or "").inc()
+
+
+def observe_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def observe_csv_export(export: str, nbytes: int):
+    CSV_EXPORT_BYTES.labels(export).inc(nbytes)
+
+
+def _observe_pool(engine):
+    pool = engine.pool
+    checkedout = getattr(pool, "checkedout", None)
+    size = getattr(pool, "size", None)
+    if callable(checkedout):
+        DB_POOL_CHECKED_OUT.set(checkedout())
+    if callable(size):
+        DB_POOL_SIZE.set(size())
+
+
+def render_latest():
+    """Prometheus のテキスト形式で全メトリクスを返す（multiprocess なら全ワーカー合算）。"""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
+
+
+# =========================================================================
+# Flask への組み込み
+# =========================================================================
+def init_app(app, engine):
+    """リクエストのレイテンシ計測と /metrics を登録する。"""
+
+    @app.before_request
+    def _metrics_start_timer():
+        g._metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _metrics_observe_request(response):
+        started = g.pop("_metrics_started", None)
+        if started is not None:
+            REQUEST_LATENCY.labels(request.endpoint or "unknown", request.method).observe(
+                time.perf_counter() - started
+            )
+            _observe_pool(engine)
+        return response
+
+    @app.route("/metrics")
+    def metrics():
+        if not PROMETHEUS_AVAILABLE:
+            return Response("prometheus_client is not installed\n", status=503, mimetype="text/plain")
+        return Response(render_latest(), mimetype=CONTENT_TYPE_LATEST)
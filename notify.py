@@ -0,0 +1,533 @@
+# notify.py (欠席の LINE 通知)
+"""
+授業開始から ABSENT_THRESHOLD_MINUTES 分を過ぎても入室の記録が無い生徒を、
+連絡先 テーブルに登録した保護者の LINE へ知らせる。
+
+  flask --app web notify absences               … cron で数分おきに実行（例: */5 8-18 * * 1-5）
+  flask --app web notify absences --dry-run     … 送らずに文面だけ表示
+  flask --app web notify stub-server --port 8089 … LINE の push / reply API の代わりになるローカルサーバ
+
+処理の流れ:
+  1. 対象コマ … 今日の授業のうち、欠席の判定時刻（開始 + ABSENT_THRESHOLD_MINUTES 分）を
+                 過ぎてから NOTIFY_MAX_DELAY 分以内のもの（全学科）
+  2. 欠席者   … 連絡先のある生徒と今日の最初の入室時刻を1クエリで読み、判定時刻までに
+                 入室していない生徒を選ぶ（通知済みのコマ・欠席理由を登録済みの科目は除く）
+  3. 確保     … 欠席通知 に「送信中」として INSERT（一意キーで重複を除く）し、
+                 このプロセスが確保できた分だけを送る（cron が重なっても二重に送らない）。
+                 「送信中」のまま NOTIFY_CLAIM_TIMEOUT 分を過ぎた行は、確保したプロセスが
+                 途中で止まったものとみなして確保し直す（もう対象でないコマは 失敗 にする）
+  4. 送信     … 宛先ごとに1通にまとめ、asyncio で並行に送る。
+                 NOTIFY_RATE 通/秒 に抑え、429・5xx・接続エラーは間隔を延ばして再送する
+  5. 記録     … 結果（送信済 / 失敗・試行回数・エラー）を 欠席通知 に書き戻す
+
+送信方法（NOTIFY_TRANSPORT）:
+  line … line-bot-sdk（requirements-notify.txt）で LINE Messaging API に送る（LINE_CHANNEL_ACCESS_TOKEN）
+  http … LINE の push API と同じ形で NOTIFY_STUB_URL に送る（stub-server などの試験用）
+  log  … 送らずに標準出力へ表示する
+  省略時は LINE_CHANNEL_ACCESS_TOKEN があれば line、NOTIFY_STUB_URL があれば http、どちらも無ければ log。
+
+Web ワーカーからは呼ばない（送信は CLI のプロセスで行う）。
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time as time_mod
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+import click
+from sqlalchemy import bindparam, func, select, update
+
+from datastore import (
+    ABSENT_THRESHOLD_MINUTES, _as_school_time, _insert_ignore, get_conn, load_class_sessions, lookup, school_now,
+)
+from models import db, 入退室, 欠席理由, 欠席通知, 生徒, 連絡先
+
+NOTIFY_TRANSPORT = os.environ.get("NOTIFY_TRANSPORT")
+NOTIFY_STUB_URL = os.environ.get("NOTIFY_STUB_URL")
+LINE_CHANNEL_ACCESS_TOKEN = os.environ.get("LINE_CHANNEL_ACCESS_TOKEN")
+NOTIFY_RATE = float(os.environ.get("NOTIFY_RATE", "200"))             # 通/秒
+NOTIFY_CONCURRENCY = int(os.environ.get("NOTIFY_CONCURRENCY", "20"))  # 同時に送る数
+NOTIFY_RETRIES = int(os.environ.get("NOTIFY_RETRIES", "5"))
+NOTIFY_MAX_DELAY = int(os.environ.get("NOTIFY_MAX_DELAY", "90"))      # 分。これより前の判定時刻のコマは送らない
+NOTIFY_CLAIM_TIMEOUT = int(os.environ.get("NOTIFY_CLAIM_TIMEOUT", "15"))  # 分。送信中 のまま残った行を確保し直すまで
+STALE_CLAIM_ERROR = "送信中のまま中断"
+
+# 連絡先のある生徒と、その日の最初の入室時刻（入室が無ければ NULL）
+_first_in = (
+    select(入退室.学科ID, 入退室.学生番号, func.min(入退室.入退出時間).label("最初入室"))
+    .where(入退室.入室区分 == "入室", 入退室.日付 == bindparam("日付"))
+    .group_by(入退室.学科ID, 入退室.学生番号)
+    .subquery()
+)
+SQL_NOTIFY_CANDIDATES = (
+    select(連絡先.学科ID, 連絡先.学生番号, 生徒.生徒名, 連絡先.宛先, _first_in.c.最初入室)
+    .join(生徒, (生徒.学科ID == 連絡先.学科ID) & (生徒.学生番号 == 連絡先.学生番号))
+    .outerjoin(_first_in, (_first_in.c.学科ID == 連絡先.学科ID) & (_first_in.c.学生番号 == 連絡先.学生番号))
+    .where(連絡先.学科ID.in_(bindparam("gakkas", expanding=True)))
+)
+# 通知済み（送信中 のまま確保の期限を過ぎた行は除く。確保し直して送る）
+SQL_NOTIFIED = (
+    select(欠席通知.時限, 欠席通知.学科ID, 欠席通知.学生番号, 欠席通知.宛先)
+    .where(欠席通知.日付 == bindparam("日付"),
+           ~((欠席通知.状態 == "送信中") & (欠席通知.作成時刻 < bindparam("cutoff"))))
+)
+# 期限切れの 送信中 の行を確保し直す（並行して動く別のプロセスとは 作成時刻 の条件で1つに決まる）
+SQL_RECLAIM = (
+    update(欠席通知)
+    .where(欠席通知.日付 == bindparam("_日付"), 欠席通知.状態 == "送信中", 欠席通知.作成時刻 < bindparam("cutoff"),
+           欠席通知.時限 == bindparam("_時限"), 欠席通知.学科ID == bindparam("_学科ID"),
+           欠席通知.学生番号 == bindparam("_学生番号"), 欠席通知.宛先 == bindparam("_宛先"))
+    .values(作成時刻=bindparam("_now"))
+    .returning(欠席通知.id)
+)
+# 確保し直さなかった（もう送らない）期限切れの 送信中 の行
+SQL_EXPIRE_CLAIMS = (
+    update(欠席通知)
+    .where(欠席通知.状態 == "送信中", 欠席通知.作成時刻 < bindparam("cutoff"))
+    .values(状態="失敗", エラー=STALE_CLAIM_ERROR)
+)
+SQL_REASONS_OF_DAY = select(欠席理由.学科ID, 欠席理由.学生番号, 欠席理由.科目ID).where(欠席理由.日付 == bindparam("日付"))
+# SET 句は実行時の引数（_id 以外の列）から組み立てられる
+SQL_RECORD = update(欠席通知).where(欠席通知.id == bindparam("_id"))
+
+
+# =========================================================================
+# 欠席者の抽出
+# =========================================================================
+def due_sessions(now: datetime) -> list:
+    """判定時刻を過ぎた今日の授業コマ [(学科ID, 時限, 科目ID, 開始datetime), ...]"""
+    today = now.date()
+    threshold = timedelta(minutes=ABSENT_THRESHOLD_MINUTES)
+    oldest = now - timedelta(minutes=NOTIFY_MAX_DELAY)
+    period_of = {rec["start"]: rec["period"] for rec in lookup("timetable")}
+    due = []
+    with get_conn() as conn:
+        for g in lookup("gakkas"):
+            for _, subj_id, start_dt, _ in load_class_sessions(conn, g["学科ID"], [1, 2, 3, 4],
+                                                               dmin=today, dmax=today):
+                if oldest < start_dt + threshold <= now:
+                    due.append((g["学科ID"], period_of[start_dt.time()], subj_id, start_dt))
+    return due
+
+
+def find_new_absences(now: datetime) -> list:
+    """
+    まだ通知していない欠席 [{日付, 時限, 学科ID, 学生番号, 生徒名, 宛先, 科目ID, 開始}, ...]
+    連絡先が複数あれば宛先ごとに1件ずつ返す。
+    """
+    due = due_sessions(now)
+    if not due:
+        return []
+    today = now.date()
+    threshold = timedelta(minutes=ABSENT_THRESHOLD_MINUTES)
+    with get_conn() as conn:
+        candidates = conn.execute(SQL_NOTIFY_CANDIDATES, {
+            "日付": today, "gakkas": sorted({d[0] for d in due}),
+        }).mappings().all()
+        cutoff = now - timedelta(minutes=NOTIFY_CLAIM_TIMEOUT)
+        notified = set(conn.execute(SQL_NOTIFIED, {"日付": today, "cutoff": cutoff}).all())
+        reasons = set(conn.execute(SQL_REASONS_OF_DAY, {"日付": today}).all())
+
+    by_gakka = {}
+    for c in candidates:
+        by_gakka.setdefault(c["学科ID"], []).append(c)
+    absences = []
+    for gakka_id, period, subj_id, start_dt in due:
+        for c in by_gakka.get(gakka_id, ()):
+            first_in = c["最初入室"]
+            if first_in is not None and _as_school_time(first_in) <= start_dt + threshold:
+                continue
+            if (period, gakka_id, c["学生番号"], c["宛先"]) in notified:
+                continue
+            if (gakka_id, c["学生番号"], subj_id) in reasons:
+                continue
+            absences.append({
+                "日付": today, "時限": period, "学科ID": gakka_id, "学生番号": c["学生番号"],
+                "生徒名": c["生徒名"], "宛先": c["宛先"], "科目ID": subj_id, "開始": start_dt,
+            })
+    return absences
+
+
+def build_messages(absences) -> dict:
+    """宛先ごとに1通にまとめる。{宛先: 本文}"""
+    subj_map = lookup("subjects")
+    per_to = {}
+    for a in sorted(absences, key=lambda a: (a["宛先"], a["学科ID"], a["学生番号"], a["時限"])):
+        per_to.setdefault(a["宛先"], {}).setdefault((a["学科ID"], a["学生番号"], a["生徒名"]), []).append(a)
+    messages = {}
+    for to, students in per_to.items():
+        day = next(iter(students.values()))[0]["日付"]
+        lines = [f"【欠席のお知らせ】{day.month}月{day.day}日"]
+        for (_, _, name), items in students.items():
+            lines.append(f"{name}さん")
+            for a in items:
+                subject = subj_map.get(a["科目ID"], f"科目{a['科目ID']}")
+                lines.append(f"・{a['時限']}限 {subject}（{a['開始']:%H:%M}〜）")
+        lines.append(f"授業開始から{ABSENT_THRESHOLD_MINUTES}分を過ぎても入室の記録がありません。")
+        messages[to] = "\n".join(lines)
+    return messages
+
+
+# =========================================================================
+# 送信方法（transport）
+# =========================================================================
+class TransientNotifyError(Exception):
+    """再送すれば通る可能性のある失敗（429・5xx・接続エラー）"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LogTransport:
+    """送らずに表示する。"""
+
+    async def push(self, to: str, text: str, retry_key: str):
+        print(f"[notify] → {to}\n{text}")
+
+    async def reply(self, reply_token: str, text: str):
+        print(f"[notify] ↩ {reply_token}\n{text}")
+
+    async def close(self):
+        pass
+
+
+class HttpTransport:
+    """LINE の push / reply API と同じ形（POST /v2/bot/message/push・reply）で任意の URL に送る。"""
+
+    def __init__(self, base_url: str, token: str = "stub", timeout: float = 10.0):
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+        # 標準ライブラリの HTTP はブロックするので、専用のスレッドで待つ
+        self._executor = ThreadPoolExecutor(max_workers=NOTIFY_CONCURRENCY, thread_name_prefix="notify-http")
+
+    async def push(self, to: str, text: str, retry_key: str):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._post, "/v2/bot/message/push",
+                                   {"to": to, "messages": [{"type": "text", "text": text}]}, retry_key)
+
+    async def reply(self, reply_token: str, text: str):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._post, "/v2/bot/message/reply",
+                                   {"replyToken": reply_token, "messages": [{"type": "text", "text": text}]})
+
+    def _post(self, path: str, payload: dict, retry_key: Optional[str] = None):
+        headers = {"Content-Type": "application/json", "Authorization": f"Bearer {self.token}"}
+        if retry_key:
+            headers["X-Line-Retry-Key"] = retry_key
+        body = json.dumps(payload).encode("utf-8")
+        req = urllib.request.Request(self.base_url + path, data=body, method="POST", headers=headers)
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                resp.read()
+        except urllib.error.HTTPError as e:
+            # 409 … 同じ再送キーの依頼は受付済み（前回の応答が届かなかっただけ）
+            if e.code == 409:
+                return
+            if e.code == 429 or e.code >= 500:
+                retry_after = e.headers.get("Retry-After")
+                raise TransientNotifyError(f"HTTP {e.code}", float(retry_after) if retry_after else None)
+            raise RuntimeError(f"HTTP {e.code}: {e.read()[:200].decode('utf-8', 'replace')}")
+        except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+            raise TransientNotifyError(str(e))
+
+    async def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class LineTransport:
+    """line-bot-sdk（v3）の非同期クライアントで LINE Messaging API に送る。"""
+
+    def __init__(self, token: str):
+        from linebot.v3 import messaging
+        from linebot.v3.messaging.exceptions import ApiException
+        self._sdk = messaging
+        self._configuration = messaging.Configuration(access_token=token)
+        self._error_cls = ApiException
+        self._client = self._api = None
+
+    def _get_api(self):
+        # aiohttp のセッションはイベントループの中で作る
+        if self._api is None:
+            self._client = self._sdk.AsyncApiClient(self._configuration)
+            self._api = self._sdk.AsyncMessagingApi(self._client)
+        return self._api
+
+    async def push(self, to: str, text: str, retry_key: str):
+        request = self._sdk.PushMessageRequest(to=to, messages=[self._sdk.TextMessage(text=text)])
+        await self._call(self._get_api().push_message(request, x_line_retry_key=retry_key))
+
+    async def reply(self, reply_token: str, text: str):
+        request = self._sdk.ReplyMessageRequest(reply_token=reply_token, messages=[self._sdk.TextMessage(text=text)])
+        await self._call(self._get_api().reply_message(request))
+
+    async def _call(self, coro):
+        try:
+            await coro
+        except self._error_cls as e:
+            if e.status == 409:
+                return
+            if e.status == 429 or (e.status or 0) >= 500:
+                retry_after = (e.headers or {}).get("Retry-After")
+                raise TransientNotifyError(f"HTTP {e.status}", float(retry_after) if retry_after else None)
+            raise RuntimeError(f"HTTP {e.status}: {e.body}")
+        except (OSError, asyncio.TimeoutError) as e:
+            raise TransientNotifyError(str(e))
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+
+
+def make_transport(name: Optional[str] = None):
+    name = name or NOTIFY_TRANSPORT or (
+        "line" if LINE_CHANNEL_ACCESS_TOKEN else "http" if NOTIFY_STUB_URL else "log"
+    )
+    if name == "line":
+        if not LINE_CHANNEL_ACCESS_TOKEN:
+            raise click.ClickException("LINE_CHANNEL_ACCESS_TOKEN が設定されていません")
+        return LineTransport(LINE_CHANNEL_ACCESS_TOKEN)
+    if name == "http":
+        if not NOTIFY_STUB_URL:
+            raise click.ClickException("NOTIFY_STUB_URL が設定されていません")
+        return HttpTransport(NOTIFY_STUB_URL, LINE_CHANNEL_ACCESS_TOKEN or "stub")
+    if name == "log":
+        return LogTransport()
+    raise click.ClickException(f"不明な NOTIFY_TRANSPORT です: {name}（line / http / log）")
+
+
+# =========================================================================
+# 非同期の一括送信
+# =========================================================================
+class RateLimiter:
+    """トークンバケット（rate 通/秒、最大 rate 通までの連続送信を許す）"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time_mod.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time_mod.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+async def send_with_retry(call, limiter, retries: int):
+    """
+    call(再送キー) の送信を、一時的な失敗なら間隔を延ばして再送する。
+    (成功したか, 試行回数, エラー) を返す。再送しても同じ再送キーを使う。
+    """
+    retry_key = str(uuid.uuid4())
+    for attempt in range(1, retries + 2):
+        await limiter.acquire()
+        try:
+            await call(retry_key)
+            return True, attempt, None
+        except TransientNotifyError as e:
+            if attempt > retries:
+                return False, attempt, str(e)
+            delay = e.retry_after or min(30.0, 0.5 * 2 ** (attempt - 1))
+            await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+        except Exception as e:
+            return False, attempt, str(e)
+
+
+async def send_all(messages: dict, transport, *, rate: float = NOTIFY_RATE,
+                   concurrency: int = NOTIFY_CONCURRENCY, retries: int = NOTIFY_RETRIES) -> dict:
+    """{宛先: 本文} を並行に送り、{宛先: (成功したか, 試行回数, エラー)} を返す。"""
+    limiter = RateLimiter(rate)
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(to, text):
+        async with sem:
+            return to, await send_with_retry(lambda key: transport.push(to, text, key), limiter, retries)
+
+    try:
+        return dict(await asyncio.gather(*(one(to, text) for to, text in messages.items())))
+    finally:
+        await transport.close()
+
+
+# =========================================================================
+# 通知の実行
+# =========================================================================
+def dispatch_absences(now: Optional[datetime] = None, transport=None, dry_run: bool = False) -> dict:
+    """新しく欠席になった生徒を通知する。件数のまとめを返す（アプリコンテキスト内で呼ぶ）。"""
+    now = now or school_now()
+    absences = find_new_absences(now)
+    summary = {"absences": len(absences), "messages": 0, "sent": 0, "failed": 0}
+    if dry_run:
+        messages = build_messages(absences)
+        summary["messages"] = len(messages)
+        for to, text in messages.items():
+            print(f"[notify] → {to}\n{text}")
+        return summary
+
+    # 確保できた（まだ誰も送っていない）分だけを送る
+    cutoff = now - timedelta(minutes=NOTIFY_CLAIM_TIMEOUT)
+    with db.engine.begin() as conn:
+        ids = {}
+        if absences:
+            claim = _insert_ignore(欠席通知, ["日付", "時限", "学科ID", "学生番号", "宛先"]).returning(
+                欠席通知.id, 欠席通知.時限, 欠席通知.学科ID, 欠席通知.学生番号, 欠席通知.宛先,
+            )
+            claimed = conn.execute(claim, [
+                {"日付": a["日付"], "時限": a["時限"], "学科ID": a["学科ID"], "学生番号": a["学生番号"],
+                 "宛先": a["宛先"], "状態": "送信中", "試行回数": 0, "作成時刻": now}
+                for a in absences
+            ]).all()
+            ids = {(r.時限, r.学科ID, r.学生番号, r.宛先): r.id for r in claimed}
+        # 既に行がある分は、期限切れの 送信中 の行だけを確保し直す（送信済・失敗 なら何も返らない）
+        for a in absences:
+            key = (a["時限"], a["学科ID"], a["学生番号"], a["宛先"])
+            if key in ids:
+                continue
+            record_id = conn.execute(SQL_RECLAIM, {
+                "_日付": a["日付"], "cutoff": cutoff, "_now": now, "_時限": a["時限"], "_学科ID": a["学科ID"],
+                "_学生番号": a["学生番号"], "_宛先": a["宛先"],
+            }).scalar()
+            if record_id is not None:
+                ids[key] = record_id
+        # 確保し直さなかった期限切れの 送信中 の行（もう対象でないコマ）は 失敗 にする
+        conn.execute(SQL_EXPIRE_CLAIMS, {"cutoff": cutoff})
+    absences = [a for a in absences if (a["時限"], a["学科ID"], a["学生番号"], a["宛先"]) in ids]
+    messages = build_messages(absences)
+    summary["messages"] = len(messages)
+    if not messages:
+        return summary
+
+    results = asyncio.run(send_all(messages, transport or make_transport()))
+    sent_at = school_now()
+    rows = []
+    for a in absences:
+        ok, attempts, error = results[a["宛先"]]
+        rows.append({
+            "_id": ids[(a["時限"], a["学科ID"], a["学生番号"], a["宛先"])],
+            "状態": "送信済" if ok else "失敗", "試行回数": attempts, "エラー": error,
+            "送信時刻": sent_at if ok else None,
+        })
+    with db.engine.begin() as conn:
+        conn.execute(SQL_RECORD, rows)
+    summary["sent"] = sum(1 for ok, _, _ in results.values() if ok)
+    summary["failed"] = len(results) - summary["sent"]
+    return summary
+
+
+# =========================================================================
+# LINE の代わりのローカルサーバ（試験用）
+# =========================================================================
+def make_stub_server(host: str = "127.0.0.1", port: int = 8089, fail_rate: float = 0.0,
+                     quiet: bool = False) -> ThreadingHTTPServer:
+    """
+    LINE の POST /v2/bot/message/push・reply を受けて 200 を返すサーバ（serve_forever() で起動する）。
+    fail_rate の割合で 429（Retry-After: 1）を返す。同じ再送キーの2回目以降の push は 409、
+    使用済みの replyToken への reply は 400 を返す。
+    受け付けた件数は server.received（push）/ server.replied（reply）に入る。
+    """
+    lock = threading.Lock()
+    seen = set()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            kind = {"/v2/bot/message/push": "push", "/v2/bot/message/reply": "reply"}.get(self.path)
+            if kind is None:
+                return self._reply(404, {"message": "Not found"})
+            if not self.headers.get("Authorization", "").startswith("Bearer "):
+                return self._reply(401, {"message": "Authentication failed"})
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+                to = body["to"] if kind == "push" else body["replyToken"]
+                messages = body["messages"]
+            except (ValueError, KeyError, TypeError):
+                return self._reply(400, {"message": "The request body has 1 error(s)"})
+            key = self.headers.get("X-Line-Retry-Key") if kind == "push" else "reply:" + to
+            with lock:
+                if key and key in seen:
+                    if kind == "reply":
+                        return self._reply(400, {"message": "Invalid reply token"})
+                    return self._reply(409, {"message": "The retry key is already accepted"})
+                if random.random() < fail_rate:
+                    return self._reply(429, {"message": "Too many requests"}, {"Retry-After": "1"})
+                if key:
+                    seen.add(key)
+                if kind == "push":
+                    self.server.received += 1
+                else:
+                    self.server.replied += 1
+                n = self.server.received + self.server.replied
+            if not quiet:
+                arrow = "→" if kind == "push" else "↩"
+                print(f"[notify-stub] #{n} {arrow} {to}: {messages[0].get('text', '').splitlines()[0]}")
+            self._reply(200, {"sentMessages": [{"id": str(n)}]})
+
+        def _reply(self, code, payload, headers=None):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.received = server.replied = 0
+    return server
+
+
+# =========================================================================
+# Flask への組み込み
+# =========================================================================
+def init_app(app, db):
+    """flask notify absences / stub-server コマンドを登録する。"""
+
+    @app.cli.group("notify")
+    def notify_group():
+        """保護者への通知"""
+
+    @notify_group.command("absences")
+    @click.option("--at", "at", default=None, help="この時刻(YYYY-MM-DD HH:MM)として判定する（既定: 現在）")
+    @click.option("--transport", default=None, help="line / http / log（既定: NOTIFY_TRANSPORT）")
+    @click.option("--dry-run", is_flag=True, help="送らずに文面だけ表示する")
+    def absences_command(at, transport, dry_run):
+        """判定時刻を過ぎたコマの欠席者を、宛先ごとにまとめて通知する。"""
+        now = datetime.strptime(at, "%Y-%m-%d %H:%M") if at else None
+        started = time_mod.perf_counter()
+        result = dispatch_absences(now, None if dry_run else make_transport(transport), dry_run=dry_run)
+        print(f"[notify] 欠席 {result['absences']} 件 / {result['messages']} 通"
+              f"（送信 {result['sent']} / 失敗 {result['failed']}, {time_mod.perf_counter() - started:.2f}s）")
+
+    @notify_group.command("stub-server")
+    @click.option("--host", default="127.0.0.1")
+    @click.option("--port", type=int, default=8089)
+    @click.option("--fail-rate", type=float, default=0.0, help="この割合で 429 を返す（再送の確認用）")
+    @click.option("--quiet", is_flag=True, help="受け付けた通知を表示しない")
+    def stub_server_command(host, port, fail_rate, quiet):
+        """LINE の push / reply API の代わりになるローカルサーバを起動する（NOTIFY_STUB_URL に指定）。"""
+        server = make_stub_server(host, port, fail_rate, quiet)
+        print(f"[notify-stub] http://{host}:{port} で待ち受けます（Ctrl+C で終了）")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        print(f"[notify-stub] 受け付けた通知: push {server.received} 件 / reply {server.replied} 件")
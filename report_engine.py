@@ -0,0 +1,243 @@
+# report_engine.py (生徒 × 授業コマの出欠集計エンジン)
+"""
+授業コマ（日付・科目・開始/終了時刻）と生徒ごとの入室時刻から、
+生徒 × 科目の 出席 / 遅刻 / 欠席 / 未記入 / 総回数 を数える。
+
+学科全体・全校の期末集計は「生徒数 × コマ数」の純 Python 処理（日時の比較と判定）が
+大半を占めるので、生徒をいくつかの塊に分けてプロセスプールで並列に数え、最後に合わせる。
+  - 授業コマの一覧と入室時刻（TapColumns）は読み取り専用なので、各ワーカープロセスの起動時に
+    一度だけ渡す（タスクごとには学生番号だけを送る）
+  - 生徒数が REPORT_PARALLEL_MIN_STUDENTS 未満、または REPORT_WORKERS=1 のときは
+    プロセスを使わずにその場で数える（起動・転送のコストの方が大きいため）
+
+このモジュールは標準ライブラリだけに依存する（ワーカープロセスで Flask / SQLAlchemy を
+読み込まないため）。DB からの読み込みは datastore.load_class_sessions / load_gakka_ins で行う。
+入室時刻は打刻ごとの datetime ではなく、日付の序数・0 時からの秒の整数配列（TapColumns）で持つ
+（load_gakka_ins が DB の結果から直接詰める）。
+ワーカーは forkserver（無ければ spawn）で起動するので、独自のスクリプトから呼ぶ場合は
+本体を if __name__ == "__main__": の中に書くこと。
+
+  flask --app web reports term-report --term 1 --out term1.csv   … 全校の期末集計
+"""
+import multiprocessing
+import os
+import threading
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+REPORT_WORKERS = int(os.environ.get("REPORT_WORKERS", str(os.cpu_count() or 1)))
+REPORT_PARALLEL_MIN_STUDENTS = int(os.environ.get("REPORT_PARALLEL_MIN_STUDENTS", "40"))
+
+
+# =========================================================================
+# 入力の表現（授業コマ・入室時刻）
+# =========================================================================
+def seconds_of_day(t) -> int:
+    """time / datetime の 0 時からの秒（秒未満は切り捨て）"""
+    return t.hour * 3600 + t.minute * 60 + t.second
+
+
+def compile_sessions(sessions) -> list:
+    """
+    授業コマを判定用の形にする（全生徒で共通なので集計の前に一度だけ作る）。
+      sessions: [(日付, 科目ID, 開始datetime, 終了datetime), ...]
+      戻り値  : [(日付の序数, "YYYY-MM-DD", 科目ID, 開始秒, 終了秒), ...]
+    """
+    return [
+        (d.toordinal(), d.isoformat(), subj_id, seconds_of_day(start_dt), seconds_of_day(end_dt))
+        for d, subj_id, start_dt, end_dt in sessions
+    ]
+
+
+class TapColumns:
+    """
+    生徒ごとの入室時刻を、打刻1件あたり整数2つの平行配列（array('i')）で持つ。
+    datetime・dict・list を打刻ごとに作らないので、学科全体・1年分でもメモリと GC の負担が小さく、
+    ワーカープロセスへもそのまま小さく送れる。
+      students : 学生番号（昇順。入室の無い生徒も含む）
+      offsets  : students[k] の入室は days / secs の [offsets[k], offsets[k + 1]) にある
+      days     : 日付の序数（date.toordinal()）
+      secs     : その日の 0 時からの秒（学校の現地時刻）
+    各生徒の範囲の中は時刻の昇順。
+    """
+    __slots__ = ("students", "offsets", "days", "secs", "_index")
+
+    def __init__(self, students, offsets, days, secs):
+        self.students = students
+        self.offsets = offsets
+        self.days = days
+        self.secs = secs
+        self._index = {no: k for k, no in enumerate(students)}
+
+    def __reduce__(self):
+        return TapColumns, (self.students, self.offsets, self.days, self.secs)
+
+    def __len__(self):
+        return len(self.days)
+
+    @classmethod
+    def from_rows(cls, student_nos, rows) -> "TapColumns":
+        """
+        rows: (学生番号, 日付の序数, 秒) を 学生番号・時刻 の昇順で（DB の結果を読みながら詰める）。
+        student_nos に無い生徒の行は捨てる。
+        """
+        students = array("i", sorted(set(student_nos)))
+        counts = dict.fromkeys(students, 0)
+        days, secs = array("i"), array("i")
+        for std_no, d, s in rows:
+            if std_no in counts:
+                counts[std_no] += 1
+                days.append(d)
+                secs.append(s)
+        offsets = array("i", [0])
+        for std_no in students:
+            offsets.append(offsets[-1] + counts[std_no])
+        return cls(students, offsets, days, secs)
+
+    def first_ins(self, std_no) -> dict:
+        """{日付の序数: その日の最初の入室の秒}"""
+        k = self._index.get(std_no)
+        if k is None:
+            return {}
+        days, secs = self.days, self.secs
+        first = {}
+        for i in range(self.offsets[k], self.offsets[k + 1]):
+            if days[i] not in first:
+                first[days[i]] = secs[i]
+        return first
+
+
+# =========================================================================
+# 判定・集計（1生徒分）
+# =========================================================================
+def classify(first_in, start_sec: int, d: int, today: int) -> str:
+    """
+    授業終了までの最初の入室時刻（秒。無ければ None）から、その授業コマの出欠を決める。
+    d / today は日付の序数。
+    """
+    if first_in is None:
+        # 既に終わった授業日の未記入は欠席、今日以降は未記入（分母に入れない）
+        return "欠席" if d < today else "未記入"
+    return "出席" if first_in <= start_sec else "遅刻"
+
+
+def aggregate_student(sessions, first_ins: dict, today: int) -> dict:
+    """
+    1生徒分の集計。
+      sessions  : compile_sessions() の結果
+      first_ins : TapColumns.first_ins() の結果
+      today     : 今日の日付の序数
+    戻り値: {科目ID: {"出席", "遅刻", "欠席", "未記入", "総回数", "欠席日"}}
+    """
+    stats = {}
+    for d, day, subj_id, start_sec, end_sec in sessions:
+        s = stats.get(subj_id)
+        if s is None:
+            s = stats[subj_id] = {"出席": 0, "遅刻": 0, "欠席": 0, "未記入": 0, "総回数": 0, "欠席日": []}
+        if d < today:
+            s["総回数"] += 1
+        # 入室は時刻順なので、その日の最初の入室が授業終了より後なら間に合った入室は無い
+        first_in = first_ins.get(d)
+        if first_in is not None and first_in > end_sec:
+            first_in = None
+        status = classify(first_in, start_sec, d, today)
+        s[status] += 1
+        if status == "欠席":
+            s["欠席日"].append(day)
+    return stats
+
+
+def absent_days(sessions, taps: TapColumns, today: date) -> dict:
+    """
+    全生徒の欠席日（欠席理由を登録できる日）。{学生番号: {科目ID: ["YYYY-MM-DD", ...]}}（欠席の無い生徒は含めない）
+    同じ日に同じ科目が複数コマある場合は、どのコマにも間に合わなかった日だけを欠席日とする
+    （/absent_reason と同じ考え方）。今日以降の日は含めない。
+    """
+    today_ord = today.toordinal()
+    compiled = [s for s in compile_sessions(sessions) if s[0] < today_ord]
+    result = {}
+    for std_no in taps.students:
+        first_ins = taps.first_ins(std_no)
+        attended = {}
+        for d, day, subj_id, _start_sec, end_sec in compiled:
+            key = (subj_id, day)
+            if not attended.get(key):
+                first_in = first_ins.get(d)
+                attended[key] = first_in is not None and first_in <= end_sec
+        days = {}
+        for (subj_id, day), ok in attended.items():
+            if not ok:
+                days.setdefault(subj_id, []).append(day)
+        if days:
+            result[std_no] = days
+    return result
+
+
+def apply_excused(stats: dict, excused: dict) -> dict:
+    """
+    aggregate_student() の結果に 公欠 の回数と、公欠を分母から除いた 調整後総回数 を書き足す。
+      excused: {科目ID: {"YYYY-MM-DD", ...}}（欠席理由が 公欠 の日）
+    """
+    for subj_id, c in stats.items():
+        days = excused.get(subj_id, ())
+        c["公欠"] = sum(1 for d in c["欠席日"] if d in days)
+        c["調整後総回数"] = c["総回数"] - c["公欠"]
+    return stats
+
+
+# =========================================================================
+# 並列実行
+# =========================================================================
+_worker_sessions = None
+_worker_taps = None
+_worker_today = None
+
+
+def _init_worker(sessions, taps, today):
+    global _worker_sessions, _worker_taps, _worker_today
+    _worker_sessions = sessions
+    _worker_taps = taps
+    _worker_today = today
+
+
+def _aggregate_chunk(chunk):
+    return [(std_no, aggregate_student(_worker_sessions, _worker_taps.first_ins(std_no), _worker_today))
+            for std_no in chunk]
+
+
+# 同時に複数の全校集計が走っても CPU を取り合わないよう、プールは1つずつ使う
+_pool_lock = threading.Lock()
+
+
+def _mp_context():
+    # gunicorn のスレッドワーカー内から fork するのは危険なので forkserver を使う
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def aggregate_students(sessions, taps: TapColumns, today: date, workers: int = None) -> dict:
+    """
+    全生徒分の集計。{学生番号: aggregate_student() の結果}
+      sessions: [(日付, 科目ID, 開始datetime, 終了datetime), ...]
+      taps    : TapColumns（datastore.load_gakka_ins()。入室の無い生徒も含む）
+    """
+    workers = REPORT_WORKERS if workers is None else workers
+    compiled = compile_sessions(sessions)
+    today_ord = today.toordinal()
+    students = list(taps.students)
+    if workers <= 1 or len(students) < REPORT_PARALLEL_MIN_STUDENTS:
+        return {std_no: aggregate_student(compiled, taps.first_ins(std_no), today_ord) for std_no in students}
+
+    # ワーカーあたり数個の塊に分け、処理時間のばらつきをならす
+    n_chunks = min(len(students), workers * 4)
+    chunks = [students[i::n_chunks] for i in range(n_chunks)]
+    results = {}
+    # 授業コマと入室の配列はタスクごとに送らず、ワーカー起動時に一度だけ渡す（塊は学生番号だけ）
+    with _pool_lock, ProcessPoolExecutor(
+        max_workers=workers, mp_context=_mp_context(),
+        initializer=_init_worker, initargs=(compiled, taps, today_ord),
+    ) as pool:
+        for part in pool.map(_aggregate_chunk, chunks):
+            results.update(part)
+    return results
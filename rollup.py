@@ -0,0 +1,270 @@
+# rollup.py (出欠集計の夜間事前計算)
+"""
+前日までに終わった授業の 出席 / 遅刻 / 欠席 / 総回数 / 必要出席回数 を、
+生徒 × 科目 × 期 ごとに 出欠集計 テーブルへ事前に数えておく。
+
+  flask --app web rollup                   … 昨日までを集計（cron で毎晩実行）
+  flask --app web rollup --as-of 2025-07-31 --gakka 3
+
+  例（crontab）: 10 2 * * *  cd /srv/aribaba && flask --app web rollup
+
+/kamoku・/subject_rate・/summary は attendance_totals() で
+「集計済みの分（〜集計日）」+「集計日より後の授業だけをその場で数えた分」を合わせて表示する。
+その場で数えるのは通常は今日の分だけなので、年度の後半でも応答時間が伸びない。
+
+at_risk_rows() は同じ集計から、全校の生徒 × 科目について「あと何回休むと出席率 80% を
+満たせなくなるか」を求める（/at_risk・flask --app web reports at-risk）。
+
+集計日より前の打刻を後から追加・修正した場合や、過去の時間割を編集した場合は、
+次の rollup 実行まで集計済みの値には反映されない（すぐ反映したいときは rollup を再実行）。
+"""
+import math
+import os
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+import click
+from sqlalchemy import bindparam, delete, func, insert, select
+
+import report_engine
+from datastore import (
+    _as_date, get_conn, load_class_sessions, load_excused_days, load_gakka_ins, lookup, school_now,
+)
+from models import db, 出欠集計, 生徒
+
+# 必要出席回数 = 総回数 × この割合（切り上げ）
+REQUIRED_RATE = 0.8
+# あと休める回数がこれ以下の 生徒 × 科目 を早期警告の対象にする
+AT_RISK_MARGIN = int(os.environ.get("AT_RISK_MARGIN", "3"))
+
+SQL_ROLLUP_AS_OF = (
+    select(func.max(出欠集計.集計日))
+    .where(出欠集計.学科ID == bindparam("学科ID"), 出欠集計.期 == bindparam("期"))
+)
+
+
+def required_count(total: int) -> int:
+    return math.ceil(total * REQUIRED_RATE)
+
+
+def attendance_rate(c: dict, adjusted: bool = False) -> float:
+    """
+    出席率(%) = 出席 / 総回数（今日より前の授業。遅刻は出席に数えない）。
+    adjusted=True なら 公欠 を分母から除いた 調整後総回数 で割る。総回数 0 のときは 0。
+    """
+    total = c["調整後総回数"] if adjusted else c["総回数"]
+    return c["出席"] / max(total, 1) * 100.0
+
+
+# =========================================================================
+# 集計テーブルの作成
+# =========================================================================
+def build_rollup(as_of: Optional[date] = None, gakka: Optional[int] = None) -> dict:
+    """as_of（既定: 昨日）までの授業を集計して 出欠集計 を作り直す。{(学科ID, 期): 行数} を返す。"""
+    as_of = as_of or (school_now().date() - timedelta(days=1))
+    # as_of 当日の授業まで「終わった授業」として数える
+    judge_day = as_of + timedelta(days=1)
+    written = {}
+
+    for g in lookup("gakkas"):
+        gakka_id = g["学科ID"]
+        if gakka is not None and gakka_id != gakka:
+            continue
+        with get_conn() as conn:
+            student_nos = list(conn.execute(
+                select(生徒.学生番号).where(生徒.学科ID == gakka_id).order_by(生徒.学生番号)
+            ).scalars())
+            per_term = {}
+            for term in (1, 2, 3, 4):
+                sessions = load_class_sessions(conn, gakka_id, [term], dmax=as_of)
+                ins = load_gakka_ins(conn, gakka_id, student_nos, sessions)
+                per_term[term] = report_engine.aggregate_students(sessions, ins, judge_day)
+
+        now = school_now()
+        with db.engine.begin() as conn:
+            for term, per_student in per_term.items():
+                rows = [
+                    {
+                        "学科ID": gakka_id, "学生番号": std_no, "科目ID": subj_id, "期": term,
+                        "出席": c["出席"], "遅刻": c["遅刻"], "欠席": c["欠席"], "総回数": c["総回数"],
+                        "必要出席回数": required_count(c["総回数"]),
+                        "欠席日": ",".join(c["欠席日"]), "集計日": as_of, "更新時刻": now,
+                    }
+                    for std_no, stats in per_student.items()
+                    for subj_id, c in stats.items()
+                ]
+                conn.execute(delete(出欠集計).where(出欠集計.学科ID == gakka_id, 出欠集計.期 == term))
+                if rows:
+                    conn.execute(insert(出欠集計), rows)
+                written[(gakka_id, term)] = len(rows)
+    return written
+
+
+# =========================================================================
+# 集計済み + 当日分
+# =========================================================================
+def _merge(dst: dict, src: dict):
+    for key in ("出席", "遅刻", "欠席", "未記入", "総回数"):
+        dst[key] += src.get(key, 0)
+    dst["欠席日"].extend(src.get("欠席日", ()))
+
+
+def attendance_totals(conn, gakka_id: int, term_list, student_nos,
+                      subject_id: Optional[int] = None, today: Optional[date] = None,
+                      dmin: Optional[date] = None, dmax: Optional[date] = None) -> dict:
+    """
+    {学生番号: {科目ID: {"出席", "遅刻", "欠席", "未記入", "総回数", "欠席日", "公欠", "調整後総回数"}}}
+    report_engine.aggregate_students() と同じ結果を、集計済みの分 + 集計日より後の分で返す。
+    集計の無い期・集計後に追加された生徒は、その場で全部数える。
+    dmin / dmax で期間を絞った場合（/summary）は、集計済みの値は期全体の分なので使わずに数える。
+    公欠 は欠席理由から毎回数える（理由の登録はすぐ反映される）。
+    """
+    today = today or school_now().date()
+    result = {no: {} for no in student_nos}
+    ranged = dmin is not None or dmax is not None
+
+    for term in term_list:
+        sessions = load_class_sessions(conn, gakka_id, [term], subject_id=subject_id, dmin=dmin, dmax=dmax)
+        as_of = None if ranged else conn.execute(SQL_ROLLUP_AS_OF, {"学科ID": gakka_id, "期": term}).scalar()
+        rolled = {}
+        if as_of is not None:
+            as_of = as_of if isinstance(as_of, date) else date.fromisoformat(str(as_of))
+            # 集計日が今日以降（--as-of で先の日付を指定した場合など）は、
+            # まだ終わっていない授業を欠席として数えているので使わない
+            if as_of >= today:
+                as_of = None
+        if as_of is not None:
+            stmt = select(出欠集計).where(
+                出欠集計.学科ID == gakka_id, 出欠集計.期 == term,
+                出欠集計.学生番号.in_(list(student_nos)), 出欠集計.集計日 == as_of,
+            )
+            if subject_id is not None:
+                stmt = stmt.where(出欠集計.科目ID == subject_id)
+            for r in conn.execute(stmt).mappings():
+                rolled.setdefault(r["学生番号"], {})[r["科目ID"]] = {
+                    "出席": r["出席"], "遅刻": r["遅刻"], "欠席": r["欠席"], "未記入": 0,
+                    "総回数": r["総回数"], "欠席日": r["欠席日"].split(",") if r["欠席日"] else [],
+                }
+
+        # 集計済みの生徒は集計日より後の授業だけ、それ以外は全授業を数える
+        delta_sessions = [s for s in sessions if as_of is None or s[0] > as_of]
+        fresh = [no for no in student_nos if no not in rolled]
+        live = {}
+        if rolled:
+            ins = load_gakka_ins(conn, gakka_id, list(rolled), delta_sessions)
+            live.update(report_engine.aggregate_students(delta_sessions, ins, today))
+        if fresh:
+            ins = load_gakka_ins(conn, gakka_id, fresh, sessions)
+            live.update(report_engine.aggregate_students(sessions, ins, today))
+
+        for no in student_nos:
+            dst = result[no]
+            for part in (rolled.get(no, {}), live.get(no, {})):
+                for subj_id, c in part.items():
+                    acc = dst.setdefault(subj_id, {"出席": 0, "遅刻": 0, "欠席": 0, "未記入": 0,
+                                                   "総回数": 0, "欠席日": []})
+                    _merge(acc, c)
+
+    excused = load_excused_days(conn, gakka_id, student_nos)
+    for no in student_nos:
+        report_engine.apply_excused(result[no], excused.get(no, {}))
+    return result
+
+
+def fetch_subject_attendance_rates(学生番号: int, 学科ID: int, start_date, end_date, today=None) -> list:
+    """
+    期間内の授業コマについて、科目ごとの 出席 / 遅刻 / 欠席 / 出席率 を返す（科目ID順。/summary 用）。
+    attendance_totals() と attendance_rate() で数えるので /subject_rate・/kamoku と同じ値になる
+    （今日以降の授業は未記入で分母に入れない）。
+    """
+    start, end = _as_date(start_date), _as_date(end_date)
+    with get_conn() as conn:
+        stats = attendance_totals(conn, 学科ID, [1, 2, 3, 4], [学生番号],
+                                  today=today, dmin=start, dmax=end)[学生番号]
+
+    subj_map = lookup("subjects")
+    rows = []
+    for subj_id, c in sorted(stats.items()):
+        rows.append({
+            "科目ID": subj_id,
+            "授業科目": subj_map.get(subj_id, f"科目{subj_id}"),
+            "出席": c["出席"], "遅刻": c["遅刻"], "欠席": c["欠席"],
+            "未記入": c["未記入"], "総回数": c["総回数"], "公欠": c["公欠"],
+            "出席率(%)": f"{attendance_rate(c):.1f}" if c["総回数"] else "-",
+            "調整後出席率(%)": f"{attendance_rate(c, adjusted=True):.1f}" if c["調整後総回数"] else "-",
+        })
+    return rows
+
+
+# =========================================================================
+# 出席不足の早期警告
+# =========================================================================
+def at_risk_rows(term_list, gakka: Optional[int] = None, margin: int = AT_RISK_MARGIN,
+                 today: Optional[date] = None) -> list:
+    """
+    あと休める回数が margin 以下の 生徒 × 科目 を、緊急度の高い順に返す。
+      全回数       = 総回数（今日より前）+ 残り回数（今日以降の授業）
+      必要出席回数 = ceil(全回数 × 0.8)
+      あと休める回数 = 出席 + 未記入 − 必要出席回数（負なら既に満たせない）
+    出席率は /subject_rate と同じく 出席 / 総回数（遅刻は出席に数えない）。
+    """
+    today = today or school_now().date()
+    subj_map = lookup("subjects")
+    rows = []
+    for g in lookup("gakkas"):
+        gakka_id = g["学科ID"]
+        if gakka is not None and gakka_id != gakka:
+            continue
+        with get_conn() as conn:
+            students = conn.execute(
+                select(生徒.学生番号, 生徒.生徒名).where(生徒.学科ID == gakka_id).order_by(生徒.学生番号)
+            ).all()
+            if not students:
+                continue
+            # 残り回数は学科で共通（今日以降の授業コマを科目ごとに数える）
+            remaining = {}
+            for _, subj_id, _, _ in load_class_sessions(conn, gakka_id, term_list, dmin=today):
+                remaining[subj_id] = remaining.get(subj_id, 0) + 1
+            totals = attendance_totals(conn, gakka_id, term_list, [no for no, _ in students], today=today)
+
+        for std_no, name in students:
+            for subj_id, c in totals[std_no].items():
+                planned = c["総回数"] + remaining.get(subj_id, 0)
+                if planned == 0:
+                    continue
+                required = required_count(planned)
+                allowed = c["出席"] + c["未記入"] - required
+                if allowed > margin:
+                    continue
+                rows.append({
+                    "学科ID": gakka_id, "学科名": g["学科名"],
+                    "学生番号": std_no, "生徒名": name,
+                    "科目ID": subj_id, "科目名": subj_map.get(subj_id, f"科目{subj_id}"),
+                    "出席": c["出席"], "遅刻": c["遅刻"], "欠席": c["欠席"], "総回数": c["総回数"],
+                    "出席率": round(attendance_rate(c), 1),
+                    "残り回数": remaining.get(subj_id, 0), "全回数": planned,
+                    "必要出席回数": required, "あと休める回数": allowed,
+                })
+
+    rows.sort(key=lambda r: (r["あと休める回数"], r["出席率"], r["学科ID"], r["学生番号"], r["科目ID"]))
+    return rows
+
+
+# =========================================================================
+# Flask への組み込み
+# =========================================================================
+def init_app(app, db):
+    """flask rollup コマンドを登録する。"""
+
+    @app.cli.command("rollup")
+    @click.option("--as-of", default=None, help="この日(YYYY-MM-DD)までを集計（既定: 昨日）")
+    @click.option("--gakka", type=int, default=None, help="学科ID（省略時は全学科）")
+    def rollup_command(as_of, gakka):
+        """前日までの出欠を 生徒 × 科目 × 期 で集計し、出欠集計 テーブルを作り直す。"""
+        import time
+        as_of_date = datetime.strptime(as_of, "%Y-%m-%d").date() if as_of else None
+        started = time.perf_counter()
+        written = build_rollup(as_of_date, gakka)
+        total = sum(written.values())
+        print(f"[rollup] {len(written)} 学科×期 / {total} 行を集計しました"
+              f"（{time.perf_counter() - started:.2f}s）")
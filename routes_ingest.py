@@ -0,0 +1,163 @@
+# routes_ingest.py (打刻の受け付け API)
+"""
+カード打刻・カメラからの入退室記録を受け付ける API。
+APP_PROFILE=ingest のワーカーはこの Blueprint だけを読み込む（帳票・時間割画面は読み込まない）。
+"""
+from datetime import datetime, timedelta
+
+from flask import Blueprint, request, jsonify
+
+import fusion
+from datastore import (
+    add_camlogs, get_gakka_id_by_name, get_official_student, insert_attendance_input,
+    normalize_ts, resolve_period_for, school_now,
+)
+
+bp = Blueprint("ingest", __name__)
+
+
+@bp.route("/api/add", methods=["POST"])
+def api_add():
+    try:
+        # JSON または FORM のどちらにも対応
+        data = request.get_json(silent=True) or request.form
+
+        # パラメータの取得
+        学生番号 = int(data.get("student"))
+        学科ID = int(data.get("gakka"))
+        ts = normalize_ts(data.get("ts"))
+
+        # 学籍情報が正しいか確認（DBから名前を取得）
+        official_name = get_official_student(学生番号, 学科ID)
+        if not official_name:
+            return jsonify({"ok": False, "error": "student not found"}), 400
+
+        # 入退室記録の追加
+        insert_attendance_input(学生番号, official_name, 学科ID, ts)
+
+        return jsonify({"ok": True})
+
+    except Exception as e:
+        # 予期しないエラーは500として返す
+        return jsonify({"ok": False, "error": str(e)}), 500
+
+@bp.route("/api/add_by_names", methods=["POST"])
+def api_add_by_names():
+    """
+    学科名（gakka_name）と学生番号（student）で1レコード追加。
+    ts を省略した場合は TimeTable に基づいて「該当コマの開始1分前」に自動設定。
+    """
+    try:
+        # JSON / form 両対応
+        data = request.get_json(silent=True) or request.form
+
+        gakka_name = (data.get("gakka_name") or "").strip()
+        学生番号 = int(data.get("student"))
+
+        # 学科名 → 学科ID を取得
+        学科ID = get_gakka_id_by_name(gakka_name)
+        if 学科ID is None:
+            return jsonify({"ok": False, "error": "gakka not found"}), 400
+
+        # 学生番号 + 学科ID から正式な生徒名を取得
+        official_name = get_official_student(学生番号, 学科ID)
+        if not official_name:
+            return jsonify({"ok": False, "error": "student not found"}), 400
+
+        # ts が指定されていれば整形、なければ自動決定
+        ts = normalize_ts(data.get("ts"))
+        if not ts:
+            now = school_now()
+            rec = resolve_period_for(now)  # 時限情報を返す関数（既存前提）
+
+            if rec:
+                # 該当コマの開始 1 分前
+                start_dt = datetime.combine(now.date(), rec["start"])
+                ts_dt = start_dt - timedelta(minutes=1)
+                ts = ts_dt.strftime("%Y-%m-%d %H:%M:%S")
+            else:
+                # 時限情報が取れなかった場合は「今」
+                ts = now.strftime("%Y-%m-%d %H:%M:%S")
+
+        # 入退室レコードを1件追加（中で PostgreSQL に insert する想定）
+        insert_attendance_input(学生番号, official_name, 学科ID, ts)
+
+        return jsonify({"ok": True})
+
+    except Exception as e:
+        # 何か例外が起きたら 500 を返す
+        return jsonify({"ok": False, "error": str(e)}), 500
+
+def _parse_camlog(data):
+    """カメラログ1件分の入力を add_camlogs() の形にする（不正なら ValueError）。"""
+    source  = (data.get("source") or "armarka").strip()
+    status  = (data.get("status") or "").strip().lower()
+    marker  = (data.get("marker") or "").strip() or None
+    message = (data.get("message") or "").strip() or None
+    score   = data.get("score")
+    score   = float(score) if score not in (None, "") else None
+
+    ts = normalize_ts(data.get("ts"))
+    if not ts:
+        ts = school_now().strftime("%Y-%m-%d %H:%M:%S")
+
+    # statusが必須
+    if not status:
+        raise ValueError("status required")
+    return {"記録時刻": ts, "ソース": source, "ステータス": status,
+            "マーカー名": marker, "スコア": score, "メッセージ": message}
+
+def _record_camlogs(events):
+    """カメラログを記録し、マーカーの検出を打刻候補として fusion に渡す。"""
+    add_camlogs(events)
+    return fusion.feed([
+        (datetime.strptime(e["記録時刻"], "%Y-%m-%d %H:%M:%S"), e["ステータス"], e["マーカー名"], e["スコア"])
+        for e in events
+    ])
+
+@bp.route("/api/camlog", methods=["POST"])
+def api_camlog():
+    """
+    Receive camera logs:
+      status: 'detected' | 'ok' | 'lost' (required)
+      marker, score, message, source(optional), ts(optional)
+    """
+    try:
+        # JSONまたはformデータを受け取る
+        data = request.get_json(silent=True) or request.form
+        try:
+            event = _parse_camlog(data)
+        except ValueError as e:
+            return jsonify({"ok": False, "error": str(e)}), 400
+
+        # カメラログをデータベースに追加（生徒に割り当てたマーカーなら入室打刻の候補にもする）
+        taps = _record_camlogs([event])
+
+        return jsonify({"ok": True, "taps": taps})
+    
+    except Exception as e:
+        # エラーが発生した場合、500エラーとして返す
+        return jsonify({"ok": False, "error": str(e)}), 500
+
+@bp.route("/api/camlog/batch", methods=["POST"])
+def api_camlog_batch():
+    """
+    カメラログをまとめて受け付ける（JSON: {"events": [{status, marker, score, ...}, ...]} または配列）。
+    1件でも不正なら何も記録せずに 400 を返す。
+    """
+    try:
+        data = request.get_json(silent=True)
+        items = data.get("events") if isinstance(data, dict) else data
+        if not isinstance(items, list):
+            return jsonify({"ok": False, "error": "events required"}), 400
+        try:
+            events = [_parse_camlog(item) for item in items]
+        except (AttributeError, ValueError) as e:
+            return jsonify({"ok": False, "error": str(e)}), 400
+
+        taps = _record_camlogs(events)
+
+        return jsonify({"ok": True, "count": len(events), "taps": taps})
+
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
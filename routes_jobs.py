@@ -0,0 +1,124 @@
+# routes_jobs.py (バックグラウンドジョブの投入・進捗・結果取得)
+"""
+重い帳票・エクスポートを jobs.py のスレッドプールで作り、できあがったら取り出す。
+
+  POST /jobs/<kind>         … 投入（パラメータは元の画面のクエリと同じ。JSON / フォーム / クエリ）
+                              JSON なら 202 + {id, status_url, result_url}、フォームなら待ち画面へ
+  GET  /jobs/<id>           … 状態と進捗（JSON）
+  GET  /jobs/<id>/wait      … 進捗を表示し、終わったら結果へ移動する待ち画面
+  GET  /jobs/<id>/result    … 結果（HTML / CSV）。未完了なら 202
+
+  例: curl -X POST -H 'Content-Type: application/json' \\
+        -d '{"subject_id": 301, "term": 0}' http://localhost:5000/jobs/kamoku
+"""
+from flask import (
+    Blueprint, Response, current_app, jsonify, redirect, render_template_string, request,
+    session, url_for,
+)
+
+import jobs
+
+bp = Blueprint("jobs", __name__)
+
+
+def _status_json(job):
+    return {
+        "id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "message": job["message"],
+        "created_at": job["created_at"].isoformat(timespec="seconds"),
+        "finished_at": job["finished_at"].isoformat(timespec="seconds") if job["finished_at"] else None,
+        "status_url": url_for("jobs.job_status", job_id=job["id"]),
+        "result_url": url_for("jobs.job_result", job_id=job["id"]),
+    }
+
+
+def _needs_login(kind: str) -> bool:
+    return jobs.JOB_KINDS.get(kind, (None, False))[1] and not session.get("logs_ok")
+
+
+@bp.route("/jobs/<kind>", methods=["POST"])
+def job_submit(kind: str):
+    params = dict(request.args)
+    params.update(request.get_json(silent=True) or request.form)
+    if _needs_login(kind):
+        if request.is_json:
+            return jsonify(error="ログインが必要です"), 403
+        return redirect(url_for("logs.logs_login", next=request.path))
+    try:
+        job_id = jobs.submit(current_app._get_current_object(), kind, params)
+    except jobs.JobError as e:
+        return jsonify(error=str(e)), 404
+
+    if request.is_json:
+        return jsonify(_status_json(jobs.get_job(job_id))), 202
+    return redirect(url_for("jobs.job_wait", job_id=job_id))
+
+
+@bp.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id: str):
+    job = jobs.get_job(job_id)
+    if job is None:
+        return jsonify(error="ジョブが見つかりません"), 404
+    return jsonify(_status_json(job))
+
+
+@bp.route("/jobs/<job_id>/result", methods=["GET"])
+def job_result(job_id: str):
+    job = jobs.get_job(job_id, with_result=True)
+    if job is None:
+        return jsonify(error="ジョブが見つかりません"), 404
+    if _needs_login(job["kind"]):
+        return redirect(url_for("logs.logs_login", next=request.path))
+    if job["status"] == "failed":
+        return jsonify(_status_json(job)), 500
+    if job["status"] != "done":
+        return jsonify(_status_json(job)), 202
+
+    resp = Response(job["result"], content_type=job["content_type"])
+    if job["disposition"]:
+        resp.headers["Content-Disposition"] = job["disposition"]
+    return resp
+
+
+@bp.route("/jobs/<job_id>/wait", methods=["GET"])
+def job_wait(job_id: str):
+    job = jobs.get_job(job_id)
+    if job is None:
+        return "ジョブが見つかりません。", 404
+    return render_template_string("""
+<!doctype html>
+<meta charset="utf-8">
+<title>作成中…</title>
+<style>
+body{font-family:system-ui,Meiryo,sans-serif;margin:40px;background:#f7f7fb}
+.card{background:#fff;border-radius:12px;box-shadow:0 4px 12px rgba(0,0,0,.06);padding:20px;max-width:480px}
+progress{width:100%;height:18px}
+.small{color:#666;font-size:12px}
+</style>
+<div class="card">
+  <h3>帳票を作成しています（{{ job.kind }}）</h3>
+  <progress id="bar" max="100" value="{{ job.progress }}"></progress>
+  <p id="msg" class="small">状態: {{ job.status }}</p>
+  <p class="small">この画面は閉じても構いません。同じ条件で作り直すと、できあがった結果がそのまま表示されます。</p>
+</div>
+<script>
+const statusUrl = {{ url_for('jobs.job_status', job_id=job.id)|tojson }};
+const resultUrl = {{ url_for('jobs.job_result', job_id=job.id)|tojson }};
+async function poll() {
+  const r = await fetch(statusUrl);
+  const j = await r.json();
+  document.getElementById('bar').value = j.progress;
+  if (j.status === 'done') { location.href = resultUrl; return; }
+  if (j.status === 'failed') {
+    document.getElementById('msg').textContent = '失敗しました: ' + (j.message || '');
+    return;
+  }
+  document.getElementById('msg').textContent = '状態: ' + j.status;
+  setTimeout(poll, 1000);
+}
+setTimeout(poll, 500);
+</script>
+""", job=job)
@@ -0,0 +1,264 @@
+# routes_line.py (LINE ボット: 生徒・保護者が自分の出席率を問い合わせる)
+"""
+LINE の Webhook を受け、メッセージを送ってきた人に紐づく生徒の出席率を返信する。
+送ってきた人の LINE ユーザーID を 連絡先.宛先 で引き、登録された生徒の分だけを答える
+（生徒本人・保護者とも 連絡先 に登録しておく。import-master contacts）。
+
+  POST /line/webhook  … 署名（X-Line-Signature）を確かめてすぐ 200 を返し、返信は後で送る
+
+  flask --app web line load-test --url http://127.0.0.1:5000   … 負荷試験（LINE の代わりを内蔵）
+
+返信の作り方:
+  - Webhook の処理はイベントを受け取るだけ。集計と返信はプロセスごとの
+    イベントループ（スレッド1本）と集計用スレッドプールで行う（Web ワーカーを待たせない）
+  - 生徒ごとの返信文はプロセス内にキャッシュする。キャッシュの鍵は
+    （今日の日付, 最後の打刻の記録ID, 欠席理由の件数・最終登録時刻）で、
+    その生徒の打刻か欠席理由が変わったときだけ作り直す（確認は索引だけを引く1クエリ）
+  - 返信は notify.py と同じ送信方法（NOTIFY_TRANSPORT）で送る。
+    試験では notify stub-server を NOTIFY_STUB_URL に指定すれば LINE に繋がずに動く
+
+環境変数:
+  LINE_CHANNEL_SECRET … 署名の検証に使うチャネルシークレット（未設定なら Webhook は 503）
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import statistics
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from flask import Blueprint, current_app, jsonify, request
+from sqlalchemy import bindparam, func, select
+
+import notify
+from datastore import get_conn, lookup, school_now
+from models import 入退室, 欠席理由
+from rollup import attendance_rate, attendance_totals
+
+bp = Blueprint("line", __name__)
+bp.cli.short_help = "LINE ボット"
+
+LINE_CHANNEL_SECRET = os.environ.get("LINE_CHANNEL_SECRET")
+LINE_WORKERS = int(os.environ.get("LINE_WORKERS", "4"))                 # 集計用スレッド数
+LINE_SUMMARY_CACHE_SIZE = int(os.environ.get("LINE_SUMMARY_CACHE_SIZE", "5000"))
+LINE_REPLY_RETRIES = int(os.environ.get("LINE_REPLY_RETRIES", "2"))    # replyToken は約1分で失効する
+
+# 生徒の打刻・欠席理由が変わったかどうかの目印
+SQL_STUDENT_VERSION = select(
+    select(func.max(入退室.記録ID))
+    .where(入退室.学生番号 == bindparam("学生番号"), 入退室.学科ID == bindparam("学科ID"))
+    .scalar_subquery(),
+    select(func.count())
+    .where(欠席理由.学生番号 == bindparam("学生番号"), 欠席理由.学科ID == bindparam("学科ID"))
+    .scalar_subquery(),
+    select(func.max(欠席理由.登録時刻))
+    .where(欠席理由.学生番号 == bindparam("学生番号"), 欠席理由.学科ID == bindparam("学科ID"))
+    .scalar_subquery(),
+)
+
+
+# =========================================================================
+# 署名の検証
+# =========================================================================
+def sign(body: bytes, secret: str) -> str:
+    return base64.b64encode(hmac.new(secret.encode("utf-8"), body, hashlib.sha256).digest()).decode("ascii")
+
+
+def verify_signature(body: bytes, signature: str, secret: str) -> bool:
+    return bool(signature) and hmac.compare_digest(sign(body, secret), signature)
+
+
+# =========================================================================
+# 返信文（生徒ごとのキャッシュ）
+# =========================================================================
+_summary_cache = OrderedDict()  # (学科ID, 学生番号) -> (版, 返信文)
+_summary_lock = threading.Lock()
+
+
+def student_summary(gakka_id: int, std_no: int, name: str) -> str:
+    """1生徒分の出席率の返信文（打刻・欠席理由が変わっていなければキャッシュを返す）。"""
+    today = school_now().date()
+    key = (gakka_id, std_no)
+    with get_conn() as conn:
+        version = (today, *conn.execute(SQL_STUDENT_VERSION, {"学科ID": gakka_id, "学生番号": std_no}).one())
+        with _summary_lock:
+            entry = _summary_cache.get(key)
+            if entry is not None and entry[0] == version:
+                _summary_cache.move_to_end(key)
+                return entry[1]
+        totals = attendance_totals(conn, gakka_id, [1, 2, 3, 4], [std_no], today=today)[std_no]
+
+    subj_map = lookup("subjects")
+    lines = [f"{name}さんの出席状況（{today.month}/{today.day} 時点）"]
+    for subj_id, c in sorted(totals.items()):
+        if c["総回数"] == 0:
+            continue
+        rate = attendance_rate(c)
+        line = (f"・{subj_map.get(subj_id, f'科目{subj_id}')}: {rate:.1f}%"
+                f"（出席{c['出席']} 遅刻{c['遅刻']} 欠席{c['欠席']} / {c['総回数']}回）")
+        if c["公欠"]:
+            line += f" 公欠{c['公欠']}回を除くと {attendance_rate(c, adjusted=True):.1f}%"
+        lines.append(line)
+    if len(lines) == 1:
+        lines.append("まだ終わった授業がありません。")
+    text = "\n".join(lines)
+
+    with _summary_lock:
+        _summary_cache[key] = (version, text)
+        _summary_cache.move_to_end(key)
+        while len(_summary_cache) > LINE_SUMMARY_CACHE_SIZE:
+            _summary_cache.popitem(last=False)
+    return text
+
+
+def reply_text(user_id: str) -> str:
+    students = lookup("contacts").get(user_id)
+    if not students:
+        return "この LINE アカウントは登録されていません。学校に登録を依頼してください。"
+    return "\n\n".join(student_summary(g, no, name) for g, no, name in students)
+
+
+# =========================================================================
+# 返信の送信（プロセスごとのイベントループ。fork 後の子プロセスでは作り直す）
+# =========================================================================
+_runtime = None
+_runtime_pid = None
+_runtime_lock = threading.Lock()
+
+
+class _Runtime:
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(max_workers=LINE_WORKERS, thread_name_prefix="line-summary")
+        self.transport = notify.make_transport()
+        self.limiter = None
+        threading.Thread(target=self.loop.run_forever, name="line-webhook", daemon=True).start()
+
+
+def _get_runtime() -> _Runtime:
+    global _runtime, _runtime_pid
+    with _runtime_lock:
+        if _runtime is None or _runtime_pid != os.getpid():
+            _runtime = _Runtime()
+            _runtime_pid = os.getpid()
+        return _runtime
+
+
+def _text_in_app(app, user_id: str) -> str:
+    with app.app_context():
+        return reply_text(user_id)
+
+
+async def _answer(app, rt: _Runtime, event: dict):
+    if rt.limiter is None:
+        rt.limiter = notify.RateLimiter(notify.NOTIFY_RATE)
+    try:
+        text = await rt.loop.run_in_executor(rt.executor, _text_in_app, app, event["source"].get("userId"))
+    except Exception as e:
+        app.logger.error(f"LINE reply failed (summary): {e}")
+        return
+    ok, _, error = await notify.send_with_retry(
+        lambda _key: rt.transport.reply(event["replyToken"], text), rt.limiter, LINE_REPLY_RETRIES,
+    )
+    if not ok:
+        app.logger.error(f"LINE reply failed: {error}")
+
+
+@bp.route("/line/webhook", methods=["POST"])
+def line_webhook():
+    if not LINE_CHANNEL_SECRET:
+        return jsonify({"ok": False, "error": "LINE_CHANNEL_SECRET not configured"}), 503
+    body = request.get_data()
+    if not verify_signature(body, request.headers.get("X-Line-Signature", ""), LINE_CHANNEL_SECRET):
+        return jsonify({"ok": False, "error": "invalid signature"}), 400
+    try:
+        events = json.loads(body).get("events", [])
+    except (ValueError, AttributeError):
+        return jsonify({"ok": False, "error": "invalid body"}), 400
+
+    # テキストのメッセージだけに答える（返信は後で送り、ここではすぐ 200 を返す）
+    targets = [
+        e for e in events
+        if e.get("type") == "message" and e.get("replyToken")
+        and (e.get("message") or {}).get("type") == "text" and (e.get("source") or {}).get("userId")
+    ]
+    if targets:
+        rt = _get_runtime()
+        app = current_app._get_current_object()
+        for e in targets:
+            asyncio.run_coroutine_threadsafe(_answer(app, rt, e), rt.loop)
+    return jsonify({"ok": True})
+
+
+# =========================================================================
+# 負荷試験
+# =========================================================================
+@bp.cli.command("load-test")
+@click.option("--url", default="http://127.0.0.1:5000", help="Webhook を受けるサーバ")
+@click.option("--messages", type=int, default=1000, help="送るメッセージ数")
+@click.option("--concurrency", type=int, default=8)
+@click.option("--stub-port", type=int, default=8089,
+              help="内蔵の LINE の代わりの待ち受けポート（サーバ側の NOTIFY_STUB_URL に指定）")
+@click.option("--timeout", type=float, default=60.0, help="返信が揃うまで待つ秒数")
+def load_test_command(url, messages, concurrency, stub_port, timeout):
+    """
+    署名付きの Webhook を連続で送り、応答（受付）と返信の速さを測る。
+    サーバは LINE_CHANNEL_SECRET を同じ値にし、NOTIFY_STUB_URL=http://127.0.0.1:<stub-port> で起動しておく。
+    """
+    import urllib.error
+    import urllib.request
+
+    if not LINE_CHANNEL_SECRET:
+        raise click.ClickException("LINE_CHANNEL_SECRET が設定されていません")
+    users = list(lookup("contacts")) or ["U-unregistered"]
+    server = notify.make_stub_server(port=stub_port, quiet=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    webhook = url.rstrip("/") + "/line/webhook"
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+
+    def one(i):
+        body = json.dumps({"destination": "Ustub", "events": [{
+            "type": "message", "mode": "active", "timestamp": int(time.time() * 1000),
+            "replyToken": uuid.uuid4().hex, "webhookEventId": uuid.uuid4().hex,
+            "source": {"type": "user", "userId": users[i % len(users)]},
+            "message": {"type": "text", "id": str(i), "text": "出席率"},
+        }]}).encode("utf-8")
+        req = urllib.request.Request(webhook, data=body, method="POST", headers={
+            "Content-Type": "application/json", "X-Line-Signature": sign(body, LINE_CHANNEL_SECRET),
+        })
+        t0 = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=30) as resp:
+                resp.read()
+                status = resp.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except OSError:
+            status = "exception"
+        with lock:
+            latencies.append((time.perf_counter() - t0) * 1000.0)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        list(ex.map(one, range(messages)))
+    acked = time.perf_counter() - started
+    expected = statuses.get("200", 0)
+    while server.replied < expected and time.perf_counter() - started < acked + timeout:
+        time.sleep(0.05)
+    replied = time.perf_counter() - started
+    server.shutdown()
+
+    latencies.sort()
+    q = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    print(f"[line] Webhook {messages} 件 / {acked:.2f}s = {messages / acked:.1f} 件/s"
+          f"（p50 {q[49]:.1f}ms, p95 {q[94]:.1f}ms, 応答 {statuses}）")
+    print(f"[line] 返信 {server.replied}/{expected} 件 / {replied:.2f}s = {server.replied / replied:.1f} 件/s")
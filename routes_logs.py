@@ -0,0 +1,152 @@
+# routes_logs.py (ログ閲覧・管理操作)
+"""
+入退室ログ・カメラログの閲覧とリセットなどの管理操作。LOGS_PASSWORD で保護する。
+"""
+import os
+from datetime import date
+from functools import wraps
+
+from flask import (
+    Blueprint, render_template, render_template_string, request, url_for, jsonify, redirect,
+    flash, session, abort,
+)
+from sqlalchemy import delete
+
+import instrumentation
+from datastore import _reset_table, fetch_recent_camlogs, fetch_recent_logs, get_conn
+from models import カメラログ, カメラ区間, 入退室
+
+bp = Blueprint("logs", __name__)
+
+# 環境変数からパスワードを取得
+LOGS_PASSWORD = os.environ.get("LOGS_PASSWORD", "kojou")
+
+
+def require_logs_auth(view_func):
+    """ /logs 用の簡易パスワード認証 """
+    @wraps(view_func)
+    def wrapper(*args, **kwargs):
+        # セッションに 'logs_ok' がセットされていれば、認証済みと見なす
+        if session.get("logs_ok"):
+            return view_func(*args, **kwargs)
+        # 未認証 → ログイン画面へリダイレクト。nextパラメータで元のURLを渡す。
+        return redirect(url_for("logs.logs_login", next=request.path))
+    return wrapper
+
+@bp.route("/reset_camlogs", methods=["POST"])
+@require_logs_auth
+def reset_camlogs():
+    """カメラログの全削除"""
+    try:
+        with get_conn() as conn:
+            _reset_table(conn, カメラ区間)  # 自動採番もリセット
+            _reset_table(conn, カメラログ)  # 移行前の旧形式の残り
+            conn.commit()
+        flash("✅ カメラログを全て削除しました。")
+    except Exception as e:
+        flash(f"⚠️ リセットエラー: {e}")
+    return redirect(url_for("logs.logs"))
+
+@bp.route("/reset_logs", methods=["POST"])
+@require_logs_auth
+def reset_logs():
+    """入退室ログのリセット"""
+    try:
+        with get_conn() as conn:
+            _reset_table(conn, 入退室)  # 自動採番もリセット
+            conn.commit()
+        flash("✅ 入退室ログを全て削除しました。記録IDがリセットされました。")
+    except Exception as e:
+        flash(f"⚠️ リセットエラー: {e}")
+    return redirect(url_for("reports.index"))
+
+@bp.route("/login", methods=["GET", "POST"])
+def logs_login():
+    # next パラメータ（ログイン後の遷移先）
+    next_url = request.args.get("next") or url_for("logs.logs")
+    
+    if request.method == "POST":
+        pw = request.form.get("password", "")
+        if pw == LOGS_PASSWORD:
+            session["logs_ok"] = True
+            flash("ログインしました。")
+            return redirect(next_url)
+        else:
+            flash("パスワードが違います。")
+
+    # シンプルなログイン画面
+    return render_template_string("""
+<!doctype html>
+<html lang="ja">
+<head>
+<meta charset="utf-8">
+<title>ログイン</title>
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<style>
+body{font-family:system-ui,-apple-system,Segoe UI,Roboto,'Hiragino Kaku Gothic ProN','Meiryo',sans-serif;margin:20px;background:#f7f7fb;}
+.card{background:#fff;border-radius:12px;box-shadow:0 4px 12px rgba(0,0,0,.06);padding:16px;max-width:420px;margin:40px auto;}
+label{display:block;font-size:12px;color:#555;margin:8px 0 4px;}
+input,button{width:100%;padding:10px;border:1px solid #ddd;border-radius:8px;font-size:14px;}
+button{background:#2f6feb;color:#fff;border:none;cursor:pointer;margin-top:10px}
+button:hover{filter:brightness(.95)}
+.flash{background:#fff3cd;border:1px solid #ffeeba;border-radius:8px;padding:10px;margin:0 0 12px}
+a{text-decoration:none;color:#2f6feb;}
+</style>
+</head>
+<body>
+<div class="card">
+  <h1 style="font-size:18px;margin:0 0 12px;">ログページ認証</h1>
+  {% with messages = get_flashed_messages() %}
+    {% if messages %}
+      <div class="flash">
+        {% for m in messages %}{{m}}<br>{% endfor %}
+      </div>
+    {% endif %}
+  {% endwith %}
+  <form method="post">
+    <input type="hidden" name="next" value="{{ request.args.get('next','') }}">
+    <label>パスワード</label>
+    <input type="password" name="password" required>
+    <button type="submit">ログイン</button>
+  </form>
+  <div style="margin-top:10px;"><a href="{{ url_for('reports.index') }}">← 戻る</a></div>
+</div>
+</body>
+</html>
+""")
+
+@bp.route("/api/reset", methods=["POST"])
+def api_reset():
+    try:
+        with get_conn() as conn:
+            conn.execute(delete(入退室))
+            conn.commit()
+
+        return jsonify({"ok": True, "message": "logs cleared"})
+
+    except Exception as e:
+        # もし何かトラブルが起きたら 500 を返す
+        return jsonify({"ok": False, "error": str(e)}), 500
+
+@bp.route("/logs")
+@require_logs_auth
+def logs():
+    # 認証済みの場合のみ実行される
+    # fetch_recent_logs と fetch_recent_camlogs は他の場所で定義されている必要があります
+    logs = fetch_recent_logs(limit=50)
+    camlogs = fetch_recent_camlogs(limit=100)
+    
+    return render_template(
+        "logs.html", 
+        logs=logs, 
+        camlogs=camlogs, 
+        today=date.today().isoformat() # date.today() を使用するため、datetime モジュールも必要
+    )
+
+@bp.route("/debug/requests")
+@require_logs_auth
+def debug_requests():
+    """直近リクエストのクエリ数・DB時間（QUERY_STATS=1 のときのみ）"""
+    if not instrumentation.QUERY_STATS_ENABLED:
+        abort(404)
+    return jsonify(requests=instrumentation.recent_requests())
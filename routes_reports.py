@@ -0,0 +1,771 @@
+# routes_reports.py (出欠の帳票画面)
+"""
+トップ画面・出席率・科目別集計・欠席理由・サマリーなど、出欠を集計して表示する画面。
+"""
+from io import StringIO
+
+import click
+from flask import Blueprint, render_template, request, url_for, redirect, flash, send_file, Response
+from sqlalchemy import select
+
+import metrics
+import report_engine
+from datastore import (
+    ABSENT_REASON_TYPES, SQL_OFFICIAL_STUDENT,
+    _as_date, compute_absent_days, default_month_range,
+    export_csv_to_memory, fetch_absent_reasons_map, fetch_absent_reasons_range,
+    fetch_attendance_details, fetch_attendance_totals, load_excused_days,
+    fetch_daily_first_checkin, fetch_recent_camlogs, fetch_recent_logs, fetch_students,
+    fetch_timetable_1to4, get_conn, get_official_student,
+    insert_attendance_input, load_class_sessions, load_gakka_ins, lookup, school_now, upsert_absent_reasons,
+)
+from models import DATABASE_URL, 授業科目, 生徒, 週時間割
+from rollup import (
+    AT_RISK_MARGIN, at_risk_rows, attendance_rate, attendance_totals, fetch_subject_attendance_rates, required_count,
+)
+from routes_logs import require_logs_auth
+
+bp = Blueprint("reports", __name__)
+bp.cli.short_help = "出欠の集計"
+
+
+@bp.route("/")
+def index():
+    # データを取得
+    students = fetch_students()            # 生徒データ
+    logs = fetch_recent_logs(limit=50)    # 入退室ログ
+    gakkas = lookup("gakkas")               # 学科データ
+    camlogs = fetch_recent_camlogs(limit=100)  # カメラログデータ
+    tt_1to4 = fetch_timetable_1to4()      # 時限1～4のデータを取得
+    # index.htmlテンプレートをレンダリング
+    return render_template(
+        "index.html",
+        students=students,
+        logs=logs,
+        gakkas=gakkas,
+        today=school_now().date().isoformat(),
+        # ⚠️ ここにカンマがないため次の行がエラーになる
+        db_path=DATABASE_URL, # DBのパス
+        camlogs=camlogs,
+        tt_1to4=tt_1to4
+    )
+
+# 💡 新規追加: submit エンドポイント
+@bp.route("/submit", methods=["POST"])
+def submit():
+    try:
+        # フォームデータから学生番号と学科IDを取得（intに変換）
+        学生番号 = int(request.form.get("student_no"))
+        学科ID = int(request.form.get("gakka_id"))
+
+        # タイムスタンプを正規化
+        #  関数は元のファイルに存在すると仮定します
+        ts = (request.form.get("ts_local") or request.form.get("ts"))
+
+        # 日時形式のチェック
+        if (request.form.get("ts_local") or request.form.get("ts")) and not ts:
+            flash("日時形式が不正です。datetime-local の値を確認してください。")
+            return redirect(url_for("reports.index"))
+
+        # 生徒マスタに存在するかチェック
+        # get_official_student 関数は元のファイルに存在すると仮定します
+        official_name = get_official_student(学生番号, 学科ID)
+        if not official_name:
+            flash("生徒マスタに存在しません。先に『生徒』テーブルへ登録してください。")
+            return redirect(url_for("reports.index"))
+
+        # 入退室の生データ（入力）を記録
+        # insert_attendance_input 関数は元のファイルに存在すると仮定します
+        insert_attendance_input(学生番号, official_name, 学科ID, ts)
+
+        flash(f"学生番号:{学生番号} ({official_name}) の入退室を記録しました。")
+    except Exception as e:
+        # エラー処理
+        flash(f"エラーが発生しました: {e}")
+
+    return redirect(url_for("reports.index"))
+
+@bp.route("/download")
+@require_logs_auth
+def download_csv():
+    # クエリパラメータの取得
+    start = request.args.get("start") or None
+    end = request.args.get("end") or None
+    student = request.args.get("student")
+    gakka = request.args.get("gakka")
+    学生番号 = int(student) if student else None
+    学科ID = int(gakka) if gakka else None
+    
+    try:
+        # CSVをメモリ上で生成
+        buf = export_csv_to_memory(start, end, 学生番号, 学科ID)
+        metrics.observe_csv_export("download", buf.getbuffer().nbytes)
+        
+        # ファイル名の設定
+        fname = "入退室_全件.csv"
+        if start or end or 学生番号 or 学科ID:
+            tag = school_now().strftime("%Y%m%d")
+            fname = f"入退室_条件付き_{tag}.csv"
+        
+        try:
+            # Flask 2.0以降のsend_fileでファイルを返す
+            return send_file(buf, as_attachment=True, download_name=fname,
+                             mimetype="text/csv; charset=utf-8")
+        except TypeError:
+            # Flask 1.x系の場合の対応
+            return send_file(buf, as_attachment=True, attachment_filename=fname,
+                             mimetype="text/csv; charset=utf-8")
+
+    except Exception as e:
+        flash(f"CSV出力エラー: {e}")
+        return redirect(url_for("reports.index"))
+
+@bp.route("/subject_rate", methods=["GET"])
+def subject_rate():
+    """
+    生徒を選ぶだけで該当学科の全科目の出席率を表示。
+    仕様:
+      - グラフ画像は出さず、行ごとの進捗バーのみ表示
+      - 「詳細を見る」→ /absent_reason に遷移（term, student_key, subject_id をクエリ付与）
+      - 今日より前の未記入は欠席、今日以降の未記入は欠席に含めない（未記入）
+      - 出席率の分母（総回数）は“今日より前の授業日”のみをカウント
+    """
+    term = request.args.get("term", type=int, default=0)  # 0=全期
+    student_key = request.args.get("student_key")         # "学生番号-学科ID"
+
+    # UIマスタ
+    students = fetch_students()  # Row: 学科ID, 学生番号, 生徒名, 学科名
+    terms = [{"期ID": 0, "期名": "全期(1-4)"}] + lookup("terms")
+
+    # termラベル
+    term_label = "全期(1-4)" if term == 0 else next(
+        (t["期名"] for t in terms if t["期ID"] == term),
+        "未知の期"
+    )
+
+    # 生徒未選択 → フォームのみ表示
+    if not student_key:
+        return render_template("subject_rate.html", students=students, terms=terms)
+
+    # 複合キー分解 "学生番号-学科ID"
+    try:
+        student_no_str, gakka_id_str = student_key.split("-", 1)
+        student_no = int(student_no_str)
+        gakka_id = int(gakka_id_str)
+    except Exception:
+        return "student_key の形式が不正です（例: 12345-3）。", 400
+
+    # ===== マスタ/必要データ取得 =====
+    with get_conn() as conn:
+        # 生徒氏名
+        student_name = conn.execute(SQL_OFFICIAL_STUDENT, {"学生番号": student_no, "学科ID": gakka_id}).scalar()
+        if not student_name:
+            return "生徒マスタに存在しません（学生番号+学科ID）。", 400
+
+        term_list = [term] if term in (1, 2, 3, 4) else [1, 2, 3, 4]
+
+        # 週時間割（学科×期×平日）… 教員名・教室の表示用
+        wk_rows = conn.execute(
+            select(週時間割.科目ID, 週時間割.教室ID, 週時間割.備考)
+            .where(週時間割.学科ID == gakka_id, 週時間割.期.in_(term_list), 週時間割.曜日.between(1, 5))
+            .order_by(週時間割.期, 週時間割.曜日, 週時間割.時限)
+        ).mappings().all()
+
+        # 前日までは 出欠集計（rollup.py）から、それ以降はその場で数える
+        stats = attendance_totals(conn, gakka_id, term_list, [student_no])[student_no]
+
+    # 科目名／教室名
+    subj_map = lookup("subjects")
+    room_map = lookup("rooms")
+
+    # 教員/教室は時間割で最初に見つかった空でない値
+    teachers, rooms = {}, {}
+    for r in wk_rows:
+        teacher = (r["備考"] or "").strip()
+        room = room_map.get(r["教室ID"], "")
+        if teacher and not teachers.get(r["科目ID"]):
+            teachers[r["科目ID"]] = teacher
+        if room and not rooms.get(r["科目ID"]):
+            rooms[r["科目ID"]] = room
+
+    # テーブル行を構成
+    rows = []
+    for subj_id, s in stats.items():
+        rate = attendance_rate(s)
+        rows.append(
+            {
+                "科目ID": subj_id,
+                "科目名": subj_map.get(subj_id, f"科目{subj_id}"),
+                "教員名": teachers.get(subj_id, ""),
+                "教室例": rooms.get(subj_id, ""),
+                "出席": s["出席"],
+                "遅刻": s["遅刻"],
+                "欠席": s["欠席"],
+                "未記入": s["未記入"],
+                "総回数": s["総回数"],
+                "必要出席回数": required_count(s["総回数"]),
+                "出席率": rate,
+                "公欠": s["公欠"],
+                "調整後総回数": s["調整後総回数"],
+                "調整後出席率": attendance_rate(s, adjusted=True),
+                "欠席日一覧": sorted(set(s["欠席日"])),
+            }
+        )
+
+    # 出席率降順 → 科目名昇順
+    rows.sort(key=lambda r: (-r["出席率"], r["科目名"]))
+
+    # 画面描画
+    return render_template(
+        "subject_rate2.html",
+        terms=terms,
+        students=students,
+        term=term,
+        student_key=student_key,
+        student_name=student_name,
+        term_label=term_label,
+        rows=rows,
+    )
+
+def _kamoku_rows(subject_id: int, term: int):
+    """
+    科目の受講生（学科の全生徒）ごとの出欠集計。(科目名, 学科ID, 行のリスト) を返す。
+    科目が無ければ None。前日までの分は夜間の rollup で集計済みの値を使う。
+    """
+    with get_conn() as conn:
+        subj = conn.execute(
+            select(授業科目.授業科目名, 授業科目.学科ID).where(授業科目.授業科目ID == subject_id)
+        ).mappings().first()
+        if not subj:
+            return None
+        gakka_id = subj["学科ID"]
+        students = conn.execute(
+            select(生徒.学生番号, 生徒.生徒名).where(生徒.学科ID == gakka_id).order_by(生徒.学生番号)
+        ).mappings().all()
+        # 対象期リスト（0=全期なら1〜4）
+        term_list = [term] if term in (1, 2, 3, 4) else [1, 2, 3, 4]
+        # 前日までは 出欠集計（rollup.py）から、それ以降はその場で数える
+        per_student = attendance_totals(
+            conn, gakka_id, term_list, [s["学生番号"] for s in students], subject_id=subject_id,
+        )
+
+    rows = []
+    for s in students:
+        cnt = per_student[s["学生番号"]].get(subject_id) or {
+            "出席": 0, "遅刻": 0, "欠席": 0, "未記入": 0, "総回数": 0, "公欠": 0, "調整後総回数": 0,
+        }
+        rows.append({
+            "学生番号": s["学生番号"], "生徒名": s["生徒名"],
+            "出席": cnt["出席"], "遅刻": cnt["遅刻"], "欠席": cnt["欠席"],
+            "未記入": cnt["未記入"], "総回数": cnt["総回数"],
+            "出席率": round(attendance_rate(cnt), 1),
+            # 公欠を分母から除いた出席率
+            "公欠": cnt["公欠"], "調整後総回数": cnt["調整後総回数"],
+            "調整後出席率": round(attendance_rate(cnt, adjusted=True), 1),
+        })
+    return subj["授業科目名"], gakka_id, rows
+
+@bp.route("/kamoku_csv")
+def kamoku_csv():
+    """現在の科目・期の出席情報をCSVで出力"""
+    subject_id = request.args.get("subject_id", type=int)
+    term = request.args.get("term", type=int, default=0)
+
+    if not subject_id:
+        return "科目が選択されていません。", 400
+
+    # --- CSV 作成 ---
+    import csv
+    output = StringIO()
+
+    # Excel対応：UTF-8 BOMを付ける
+    output.write("\ufeff")
+
+    found = _kamoku_rows(subject_id, term)
+    if found is None:
+        return f"授業科目ID {subject_id} が見つかりません。", 404
+
+    writer = csv.writer(output)
+    writer.writerow(["学生番号", "生徒名", "出席", "遅刻", "欠席", "未記入", "総回数", "出席率(%)",
+                     "公欠", "調整後総回数", "調整後出席率(%)"])
+    for r in found[2]:
+        writer.writerow([r["学生番号"], r["生徒名"], r["出席"], r["遅刻"], r["欠席"],
+                         r["未記入"], r["総回数"], r["出席率"],
+                         r["公欠"], r["調整後総回数"], r["調整後出席率"]])
+
+    csv_data = output.getvalue()
+    output.close()
+    metrics.observe_csv_export("kamoku_csv", len(csv_data.encode("utf-8")))
+
+    # --- Response で返す ---
+    return Response(
+        csv_data,
+        mimetype="text/csv; charset=utf-8",
+        headers={
+            "Content-Disposition": f"attachment; filename=attendance_{subject_id}_{term}.csv"
+        }
+    )
+
+@bp.route("/kamoku", methods=["GET"])
+def kamoku():
+    """授業科目を選択して生徒別の出席情報を表示（CSV出力ボタン付き）"""
+
+    # --- マスタ系の読み込み ---
+    with get_conn() as conn:
+        # 授業科目一覧
+        subjects_all = conn.execute(
+            select(授業科目.授業科目ID, 授業科目.授業科目名, 授業科目.学科ID, 授業科目.単位, 授業科目.備考)
+            .order_by(授業科目.授業科目ID)
+        ).mappings().all()
+
+        # 期マスタ（1〜4期） + 先頭に「全期」
+        terms = [{"期ID": 0, "期名": "全期(1-4)"}] + lookup("terms")
+
+    # --- クエリパラメータ ---
+    subject_id = request.args.get("subject_id", type=int)
+    term = request.args.get("term", type=int, default=0)
+
+    # 科目未選択 → 科目選択画面だけ
+    if not subject_id:
+        return render_template(
+            "kamoku.html",
+            subjects_all=subjects_all,
+            terms=terms
+        )
+
+    found = _kamoku_rows(subject_id, term)
+    if found is None:
+        return f"授業科目ID {subject_id} が見つかりません。", 404
+    subject_name, gakka_id, rows = found
+    term_label = "全期(1-4)" if term == 0 else f"{term}期"
+
+    return render_template(
+        "kamoku2.html",
+        subjects_all=subjects_all,
+        terms=terms,
+        subject_id=subject_id,
+        subject_name=subject_name,
+        gakka_id=gakka_id,
+        term=term,
+        term_label=term_label,
+        rows=rows
+    )
+
+AT_RISK_COLUMNS = ["学科ID", "学科名", "学生番号", "生徒名", "科目ID", "科目名", "出席", "遅刻", "欠席",
+                   "総回数", "出席率", "残り回数", "全回数", "必要出席回数", "あと休める回数"]
+
+
+def _at_risk_args():
+    term = request.args.get("term", type=int, default=0)
+    gakka = request.args.get("gakka", type=int)
+    margin = request.args.get("margin", type=int, default=AT_RISK_MARGIN)
+    term_list = [term] if term in (1, 2, 3, 4) else [1, 2, 3, 4]
+    return term, gakka, margin, term_list
+
+
+def _write_at_risk_csv(f, rows):
+    import csv
+    writer = csv.writer(f)
+    writer.writerow([c if c != "出席率" else "出席率(%)" for c in AT_RISK_COLUMNS])
+    for r in rows:
+        writer.writerow([r[c] for c in AT_RISK_COLUMNS])
+
+
+@bp.route("/at_risk", methods=["GET"])
+def at_risk():
+    """
+    出席率 80% を満たせなくなりそうな 生徒 × 科目 の一覧（全校、緊急度順）。
+    前日までの分は 出欠集計（rollup）を使うので、毎朝開いても数秒で出る。
+    """
+    term, gakka, margin, term_list = _at_risk_args()
+    terms = [{"期ID": 0, "期名": "全期(1-4)"}] + lookup("terms")
+    rows = at_risk_rows(term_list, gakka=gakka, margin=margin)
+    return render_template(
+        "at_risk.html",
+        terms=terms,
+        gakkas=lookup("gakkas"),
+        term=term,
+        gakka=gakka,
+        margin=margin,
+        rows=rows,
+    )
+
+@bp.route("/at_risk_csv", methods=["GET"])
+def at_risk_csv():
+    """/at_risk と同じ条件の一覧を CSV で出力"""
+    term, gakka, margin, term_list = _at_risk_args()
+    output = StringIO()
+    output.write("\ufeff")
+    _write_at_risk_csv(output, at_risk_rows(term_list, gakka=gakka, margin=margin))
+    csv_data = output.getvalue()
+    metrics.observe_csv_export("at_risk_csv", len(csv_data.encode("utf-8")))
+    return Response(
+        csv_data,
+        mimetype="text/csv; charset=utf-8",
+        headers={"Content-Disposition": f"attachment; filename=at_risk_{term}_{school_now():%Y%m%d}.csv"},
+    )
+
+@bp.route("/absent_reason", methods=["GET", "POST"])
+def absent_reason():
+    """
+    科目ごとの欠席日に対して理由を登録するページ。
+    必須: term(0=全期), student_key("学生番号-学科ID"), subject_id(科目ID)
+    """
+    term = request.values.get("term", type=int, default=0)
+    student_key = request.values.get("student_key")
+    subject_id = request.values.get("subject_id", type=int)
+
+    if not student_key or subject_id is None:
+        return "必要なパラメータが不足しています (student_key, subject_id)", 400
+
+    try:
+        student_no_str, gakka_id_str = student_key.split("-", 1)
+        学生番号 = int(student_no_str)
+        学科ID = int(gakka_id_str)
+    except Exception:
+        return "student_key の形式が不正です（例: 12345-3）。", 400
+
+    # ===== 生徒名・科目名・マスタの取得 =====
+    with get_conn() as conn:
+        # 生徒名
+        student_name = conn.execute(SQL_OFFICIAL_STUDENT, {"学生番号": 学生番号, "学科ID": 学科ID}).scalar()
+        if not student_name:
+            return "生徒マスタに存在しません。", 400
+
+        # 科目名
+        subject_name = conn.execute(
+            select(授業科目.授業科目名).where(授業科目.授業科目ID == subject_id)
+        ).scalar() or f"科目{subject_id}"
+
+        # 期マスタ（ラベル用）
+        terms = [{"期ID": 0, "期名": "全期(1-4)"}] + lookup("terms")
+        term_label = (
+            "全期(1-4)"
+            if term == 0
+            else next((t["期名"] for t in terms if t["期ID"] == term), "未知の期")
+        )
+
+        # 絞り込む期リスト
+        term_list = [term] if term in (1, 2, 3, 4) else [1, 2, 3, 4]
+
+    # ===== 欠席日抽出（一括登録・CSV 取り込みと同じ判定） =====
+    absent_dates = compute_absent_days(
+        学科ID, subject_id=subject_id, student_nos=[学生番号], term_list=term_list,
+    ).get(学生番号, {}).get(subject_id, [])
+
+    # ===== POST: 理由の保存 =====
+    if request.method == "POST":
+        batch = []
+        absent_set = set(absent_dates)
+        # name="reason[YYYY-MM-DD]" / name="other[YYYY-MM-DD]"
+        for k in request.form.keys():
+            if not k.startswith("reason[") or not k.endswith("]"):
+                continue
+            day = k[len("reason[") : -1]
+            reason = request.form.get(k, "")
+            other_text = (
+                request.form.get(f"other[{day}]", "").strip()
+                if reason == "その他"
+                else ""
+            )
+            if day in absent_set and reason in ABSENT_REASON_TYPES:
+                batch.append({"学生番号": 学生番号, "学科ID": 学科ID, "科目ID": subject_id,
+                              "日付": day, "理由区分": reason, "その他理由": other_text})
+
+        # まとめて1トランザクションで保存
+        saved = upsert_absent_reasons(batch)
+        flash(f"{saved} 件保存しました。")
+        # 保存後も同ページに戻る
+        return redirect(
+            url_for("reports.absent_reason",
+                term=term,
+                student_key=student_key,
+                subject_id=subject_id,
+            )
+        )
+
+    # 既存の理由（プリセット）
+    preset = fetch_absent_reasons_map(学生番号, 学科ID, subject_id)
+
+    # 画面レンダリング
+    return render_template(
+        "absent_reason.html",
+        term=term,
+        student_key=student_key,
+        subject_id=subject_id,
+        student_name=student_name,
+        gakka_id=学科ID,
+        subject_name=subject_name,
+        term_label=term_label,
+        absent_dates=absent_dates,
+        preset=preset,
+    )
+
+def _bulk_reason_args():
+    start_default, end_default = default_month_range()
+    gakka = request.values.get("gakka", type=int)
+    start = request.values.get("start") or start_default
+    end = request.values.get("end") or end_default
+    subject_id = request.values.get("subject_id", type=int)
+    return gakka, start, end, subject_id
+
+
+def _bulk_reason_redirect(gakka, start, end, subject_id):
+    return redirect(url_for("reports.absent_reason_bulk", gakka=gakka, start=start, end=end,
+                            subject_id=subject_id))
+
+
+def _validate_reasons(gakka_id: int, entries, dmin, dmax):
+    """
+    [(学生番号, 科目ID, 日付, 理由区分, その他理由, 行ラベル), ...] を、
+    計算した欠席日と一度だけ突き合わせる。(保存する行, エラーのリスト) を返す。
+    """
+    absent = compute_absent_days(gakka_id, dmin, dmax)
+    absent_set = {(no, subj, d) for no, per in absent.items() for subj, days in per.items() for d in days}
+    batch, errors = [], []
+    for std_no, subj_id, day, reason, other, label in entries:
+        if reason not in ABSENT_REASON_TYPES:
+            errors.append(f"{label}: 理由区分が不正です（{reason}）")
+        elif (std_no, subj_id, day) not in absent_set:
+            errors.append(f"{label}: {std_no} / 科目{subj_id} / {day} は欠席日ではありません")
+        else:
+            batch.append({"学生番号": std_no, "学科ID": gakka_id, "科目ID": subj_id, "日付": day,
+                          "理由区分": reason, "その他理由": other if reason == "その他" else ""})
+    return batch, errors
+
+
+@bp.route("/absent_reason_bulk", methods=["GET", "POST"])
+def absent_reason_bulk():
+    """
+    学科・期間内の全生徒 × 科目の欠席日に、まとめて理由を登録するページ。
+    欠席日の判定は /absent_reason と同じ（その日のどのコマにも間に合わなかった日）。
+    保存は検証を通った行だけを1トランザクションでまとめて upsert する。
+    """
+    gakka, start, end, subject_id = _bulk_reason_args()
+    gakkas = lookup("gakkas")
+
+    if request.method == "POST":
+        if gakka is None:
+            return "学科が選択されていません。", 400
+        # name="reason[学生番号_科目ID_YYYY-MM-DD]" / name="other[...]"
+        entries = []
+        for k, reason in request.form.items():
+            if not k.startswith("reason[") or not k.endswith("]") or not reason:
+                continue
+            key = k[len("reason[") : -1]
+            try:
+                std_no, subj_id, day = key.split("_", 2)
+                entries.append((int(std_no), int(subj_id), _as_date(day).isoformat(), reason,
+                                request.form.get(f"other[{key}]", "").strip(), key))
+            except ValueError:
+                continue
+        batch, errors = _validate_reasons(gakka, entries, start, end)
+        saved = upsert_absent_reasons(batch)
+        flash(f"{saved} 件保存しました。" + (f"（{len(errors)} 件は保存できませんでした）" if errors else ""))
+        for e in errors[:10]:
+            flash(e)
+        return _bulk_reason_redirect(gakka, start, end, subject_id)
+
+    rows = []
+    if gakka is not None:
+        absent = compute_absent_days(gakka, start, end, subject_id=subject_id)
+        preset = fetch_absent_reasons_range(gakka, start, end)
+        students = {r["学生番号"]: r["生徒名"] for r in fetch_students() if r["学科ID"] == gakka}
+        subj_map = lookup("subjects")
+        for std_no, per_subject in absent.items():
+            for subj_id, days in sorted(per_subject.items()):
+                for d in days:
+                    pre = preset.get((std_no, subj_id, d), {})
+                    rows.append({
+                        "key": f"{std_no}_{subj_id}_{d}",
+                        "学生番号": std_no, "生徒名": students.get(std_no, ""),
+                        "科目ID": subj_id, "科目名": subj_map.get(subj_id, f"科目{subj_id}"),
+                        "日付": d,
+                        "理由区分": pre.get("理由区分", ""), "その他理由": pre.get("その他理由", ""),
+                    })
+        rows.sort(key=lambda r: (r["日付"], r["学生番号"], r["科目ID"]))
+
+    subjects = [
+        {"科目ID": sid, "科目名": name} for sid, name in sorted(lookup("subjects").items())
+    ]
+    return render_template(
+        "absent_reason_bulk.html",
+        gakkas=gakkas,
+        subjects=subjects,
+        gakka=gakka,
+        start=start,
+        end=end,
+        subject_id=subject_id,
+        rows=rows,
+        reason_types=ABSENT_REASON_TYPES,
+    )
+
+@bp.route("/absent_reason_bulk/import", methods=["POST"])
+def absent_reason_bulk_import():
+    """
+    欠席理由を CSV で一括登録する。
+      列: 学生番号, 科目ID, 日付(YYYY-MM-DD), 理由区分, その他理由（見出し行あり・UTF-8 / BOM 可）
+    欠席日でない行・理由区分が不正な行は保存せず、行番号付きで知らせる。
+    """
+    import csv
+
+    gakka, start, end, subject_id = _bulk_reason_args()
+    f = request.files.get("file")
+    if gakka is None or f is None or not f.filename:
+        flash("学科と CSV ファイルを指定してください。")
+        return _bulk_reason_redirect(gakka, start, end, subject_id)
+
+    entries, errors = [], []
+    reader = csv.DictReader(StringIO(f.read().decode("utf-8-sig")))
+    for line_no, r in enumerate(reader, start=2):
+        try:
+            entries.append((int(r["学生番号"]), int(r["科目ID"]), _as_date(r["日付"].strip()).isoformat(),
+                            (r.get("理由区分") or "").strip(), (r.get("その他理由") or "").strip(),
+                            f"{line_no}行目"))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            errors.append(f"{line_no}行目: 学生番号・科目ID・日付を読み取れません")
+
+    saved = 0
+    if entries:
+        days = [e[2] for e in entries]
+        batch, invalid = _validate_reasons(gakka, entries, min(days), max(days))
+        errors += invalid
+        saved = upsert_absent_reasons(batch)
+    flash(f"CSV から {saved} 件保存しました。" + (f"（{len(errors)} 行はエラー）" if errors else ""))
+    for e in errors[:10]:
+        flash(e)
+    return _bulk_reason_redirect(gakka, start, end, subject_id)
+
+@bp.route("/summary")
+def summary():
+    # デフォルト期間：今月1日〜今日
+    from datetime import date
+
+    def default_month_range():
+        """今月の開始日と終了日を返す"""
+        end = school_now().date()
+        start = end.replace(day=1)
+        return start, end
+
+    # デフォルト期間（今月1日〜今日）を設定
+    start_default, end_default = default_month_range()
+
+    # フォーム値を取得（デフォルトは start_default と end_default）
+    student_no = request.values.get("student_no")
+    gakka_id_str = request.values.get("gakka_id")
+    start_date = request.values.get("start") or start_default
+    end_date = request.values.get("end") or end_default
+
+    # ここで students と gakkas を定義
+    students = fetch_students()  # 生徒のリスト
+    gakkas = lookup("gakkas")  # 学科のリスト
+
+    totals = None
+    daily = []
+    subject_rates = []
+    selected_student_name = None
+    selected_gakka_name = None
+    attendance_details = []
+
+    if student_no and gakka_id_str:
+        try:
+            学生番号 = int(student_no)
+            学科ID = int(gakka_id_str)
+
+            # 1. 生徒名を取得
+            selected_student_name = get_official_student(学生番号, 学科ID)
+
+            # 2. 学科名を「gakkas」リストから探す
+            selected_gakka_name = next(
+                (g["学科名"] for g in gakkas if g["学科ID"] == 学科ID),
+                f"ID:{学科ID}"
+            )
+
+            # 3. 各種集計データを取得
+            totals = fetch_attendance_totals(学生番号, 学科ID, start_date, end_date)
+            daily = fetch_daily_first_checkin(学生番号, 学科ID, start_date, end_date)
+            attendance_details = fetch_attendance_details(学生番号, 学科ID, start_date, end_date)
+            subject_rates = fetch_subject_attendance_rates(学生番号, 学科ID, start_date, end_date)
+
+        except Exception as e:
+            print(f"サマリー取得エラー: {e}")  # ログ出力に切り替え（本番では flash 使う）
+
+    # 4. テンプレートをレンダリング
+    return render_template(
+        "summary.html",
+        students=students,
+        gakkas=gakkas,
+        totals=totals,
+        daily=daily,
+        attendance_details=attendance_details,
+        subject_rates=subject_rates,
+        selected_student_name=selected_student_name,
+        selected_gakka_name=selected_gakka_name,
+        start_date=start_date,
+        end_date=end_date,
+        start_default=start_default,
+        end_default=end_default,
+        db_path=DATABASE_URL,  # Render環境向け
+    )
+
+@bp.cli.command("term-report")
+@click.option("--term", type=int, default=0, help="期（0=全期）")
+@click.option("--gakka", type=int, default=None, help="学科ID（省略時は全学科）")
+@click.option("--workers", type=int, default=None, help="並列数（既定: REPORT_WORKERS）")
+@click.option("--out", type=click.Path(dir_okay=False), default="term_report.csv")
+def term_report_command(term, gakka, workers, out):
+    """全校（または学科）の生徒 × 科目の出欠集計を CSV に出力する。"""
+    import csv
+    import time
+
+    term_list = [term] if term in (1, 2, 3, 4) else [1, 2, 3, 4]
+    today = school_now().date()
+    subj_map = lookup("subjects")
+    started = time.perf_counter()
+    n_students = 0
+
+    with open(out, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(["学科ID", "学生番号", "生徒名", "科目ID", "科目名",
+                         "出席", "遅刻", "欠席", "未記入", "総回数", "出席率(%)",
+                         "公欠", "調整後出席率(%)"])
+        for g in lookup("gakkas"):
+            if gakka is not None and g["学科ID"] != gakka:
+                continue
+            with get_conn() as conn:
+                students = conn.execute(
+                    select(生徒.学生番号, 生徒.生徒名).where(生徒.学科ID == g["学科ID"]).order_by(生徒.学生番号)
+                ).mappings().all()
+                sessions = load_class_sessions(conn, g["学科ID"], term_list)
+                ins = load_gakka_ins(conn, g["学科ID"], [s["学生番号"] for s in students], sessions)
+                excused = load_excused_days(conn, g["学科ID"], [s["学生番号"] for s in students])
+            per_student = report_engine.aggregate_students(sessions, ins, today, workers=workers)
+            n_students += len(students)
+            for s in students:
+                stats = report_engine.apply_excused(per_student[s["学生番号"]], excused.get(s["学生番号"], {}))
+                for subj_id, c in sorted(stats.items()):
+                    rate = round(attendance_rate(c), 1)
+                    adjusted = round(attendance_rate(c, adjusted=True), 1)
+                    writer.writerow([g["学科ID"], s["学生番号"], s["生徒名"], subj_id,
+                                     subj_map.get(subj_id, f"科目{subj_id}"),
+                                     c["出席"], c["遅刻"], c["欠席"], c["未記入"], c["総回数"], rate,
+                                     c["公欠"], adjusted])
+
+    print(f"[report] {n_students} 人分を {out} に出力しました（{time.perf_counter() - started:.2f}s）")
+
+
+@bp.cli.command("at-risk")
+@click.option("--term", type=int, default=0, help="期（0=全期）")
+@click.option("--gakka", type=int, default=None, help="学科ID（省略時は全学科）")
+@click.option("--margin", type=int, default=AT_RISK_MARGIN, help="あと休める回数がこれ以下を出力")
+@click.option("--out", type=click.Path(dir_okay=False), default="at_risk.csv")
+def at_risk_command(term, gakka, margin, out):
+    """出席率 80% を満たせなくなりそうな 生徒 × 科目 を CSV に出力する（毎朝の rollup の後に実行）。"""
+    import time
+
+    term_list = [term] if term in (1, 2, 3, 4) else [1, 2, 3, 4]
+    started = time.perf_counter()
+    rows = at_risk_rows(term_list, gakka=gakka, margin=margin)
+    with open(out, "w", newline="", encoding="utf-8-sig") as f:
+        _write_at_risk_csv(f, rows)
+    print(f"[report] 要注意 {len(rows)} 件を {out} に出力しました（{time.perf_counter() - started:.2f}s）")
@@ -0,0 +1,823 @@
+# routes_timetable.py (時間割・科目マスタの管理画面)
+"""
+週時間割・月間時間割・授業科目・教室などのマスタを閲覧・編集する画面。
+"""
+from datetime import date
+from io import BytesIO, StringIO
+
+from flask import (
+    Blueprint, render_template, render_template_string, request, url_for, redirect, flash,
+    abort, send_file,
+)
+from sqlalchemy import func, select, insert, update, delete
+
+import metrics
+from datastore import (
+    SQL_PERIOD_NAMES, SQL_ROOM_NAMES, SQL_SUBJECT_NAMES, _next_subject_id, _parse_int, _upsert,
+    fetch_timetable_for_week, generate_monthly_schedule, get_conn, invalidate_lookups, lookup,
+)
+from models import TimeTable, 学科, 授業科目, 授業計画, 教室, 曜日マスタ, 期マスタ, 特別時間割, 週時間割
+
+bp = Blueprint("timetable", __name__)
+
+
+@bp.route("/basic_week")
+def basic_week():
+    # クエリパラメータを取得
+    year = request.args.get("year", 2025, type=int)
+    gakka = request.args.get("gakka_id", 3, type=int)
+    period = request.args.get("period", 1, type=int)
+
+    # データベースから情報を取得
+    stmt = (
+        select(
+            週時間割.曜日, 曜日マスタ.曜日名, 週時間割.時限, TimeTable.開始時刻, TimeTable.終了時刻,
+            func.coalesce(授業科目.授業科目名, '').label('科目名'),
+            func.coalesce(教室.教室名, '').label('教室名'),
+            func.coalesce(週時間割.備考, '').label('備考'),
+        )
+        .join(曜日マスタ, 曜日マスタ.曜日ID == 週時間割.曜日)
+        .join(TimeTable, TimeTable.時限 == 週時間割.時限)
+        .outerjoin(授業科目, 授業科目.授業科目ID == 週時間割.科目ID)
+        .outerjoin(教室, 教室.教室ID == 週時間割.教室ID)
+        .where(週時間割.年度 == year, 週時間割.学科ID == gakka, 週時間割.期 == period)
+        .order_by(週時間割.曜日, 週時間割.時限)
+    )
+    with get_conn() as conn:
+        rows = conn.execute(stmt).mappings().all()
+
+    # グリッド作成: 曜日(1-5) × 時限(1-5) → セル文字列「科目名（教室名）」
+    days = [1, 2, 3, 4, 5]  # 月〜金
+    periods = [1, 2, 3, 4, 5]
+    grid = { (d, p): "" for d in days for p in periods }
+    for r in rows:
+        key = (r["曜日"], r["時限"])
+        cell = r["科目名"] + (f"（{r['教室名']}）" if r["教室名"] else "")
+        grid[key] = cell
+
+    # 時間情報の取得
+    # （授業の入っていない時限も表の見出しに出すので TimeTable から引く）
+    times = {p: {"開始": "", "終了": ""} for p in periods}
+    for r in lookup("timetable"):
+        times[r["period"]] = {"開始": r["start"], "終了": r["end"]}
+
+    # HTMLを生成して返す
+    return render_template_string("""
+    <!doctype html>
+    <meta charset="utf-8">
+    <title>週間基本予定表</title>
+    <style>
+      body{font-family:system-ui,Meiryo,sans-serif;margin:20px;background:#f7f7fb}
+      table{border-collapse:collapse;width:100%;background:#fff;border-radius:12px;overflow:hidden}
+      th,td{border:1px solid #eee;padding:10px;font-size:14px}
+      th{background:#f3f6ff}
+      .time{color:#666;font-size:12px}
+      .head{display:flex;gap:8px;align-items:center;margin-bottom:10px}
+      .head input,.head select{padding:6px 8px}
+      .small{color:#666;font-size:12px;margin-top:6px}
+    </style>
+    <div class="head">
+      <form method="get">
+        年度 <input type="number" name="year" value="{{year}}" style="width:90px">
+        学科ID <input type="number" name="gakka_id" value="{{gakka}}" style="width:80px">
+        期 <input type="number" name="period" value="{{period}}" style="width:60px">
+        <button>表示</button>
+      </form>
+    </div>
+    <table>
+      <thead>
+        <tr>
+          <th>時限</th>
+          {% for d in [1, 2, 3, 4, 5] %}
+            <th>{{ {1:"月",2:"火",3:"水",4:"木",5:"金"}[d] }}</th>
+          {% endfor %}
+        </tr>
+      </thead>
+      <tbody>
+        {% for p in [1, 2, 3, 4, 5] %}
+        <tr>
+          <th>{{p}}限<br><span class="time">
+            {{ times[p]["開始"] }}〜{{ times[p]["終了"] }}
+          </span></th>
+          {% for d in [1, 2, 3, 4, 5] %}
+            <td>{{ grid[(d,p)] }}</td>
+          {% endfor %}
+        </tr>
+        {% endfor %}
+      </tbody>
+    </table>
+    <div class="small">年度={{year}} / 学科ID={{gakka}} / 期={{period}}</div>
+    """, year=year, gakka=gakka, period=period, grid=grid, times=times)
+
+@bp.route("/schedule")
+def schedule():
+    """授業計画テーブルの一覧を表示"""
+    periods = lookup("periods")
+    weekdays = lookup("weekdays")
+    with get_conn() as conn:
+        rows = conn.execute(
+            select(授業計画.日付, 授業計画.期, 授業計画.授業曜日, 授業計画.備考).order_by(授業計画.日付)
+        ).mappings().all()
+
+    # 授業計画の期IDを期名、授業曜日IDを曜日名に変換
+    rows_with_period_and_weekday = []
+    for row in rows:
+        row_dict = dict(row)
+        row_dict["期名"] = periods.get(row_dict["期"], "不明")
+        row_dict["曜日名"] = weekdays.get(row_dict["授業曜日"], "不明")
+        rows_with_period_and_weekday.append(row_dict)
+
+    return render_template("schedule.html", rows=rows_with_period_and_weekday)
+
+
+@bp.route("/weekly_schedule")
+def weekly_schedule():
+    """週時間割テーブルの一覧を表示"""
+    subjects = lookup("subjects")
+    classrooms = lookup("rooms")
+    periods = lookup("periods")
+    weekdays = lookup("weekdays")
+    with get_conn() as conn:
+        rows = conn.execute(
+            select(週時間割.年度, 週時間割.学科ID, 週時間割.期, 週時間割.曜日,
+                   週時間割.時限, 週時間割.科目ID, 週時間割.教室ID, 週時間割.備考)
+            .order_by(週時間割.曜日, 週時間割.時限)
+        ).mappings().all()
+
+    # 週時間割のデータを整形
+    rows_with_details = []
+    for row in rows:
+        row_dict = dict(row)
+        row_dict["科目名"] = subjects.get(row_dict["科目ID"], "不明")
+        row_dict["教室名"] = classrooms.get(row_dict["教室ID"], "不明")
+        row_dict["期名"] = periods.get(row_dict["期"], "不明")
+        row_dict["曜日名"] = weekdays.get(row_dict["曜日"], "不明")
+        rows_with_details.append(row_dict)
+
+    return render_template("weekly_schedule.html", rows=rows_with_details)
+
+@bp.route("/kamoku_edit", methods=["GET"])
+def kamoku_edit():
+    """授業科目一覧 + 新規追加フォーム"""
+    # 授業科目一覧（学科名付き）
+    stmt = (
+        select(
+            授業科目.授業科目ID,
+            授業科目.授業科目名,
+            授業科目.学科ID.label("科目学科ID"),  # 学科テーブルと衝突しないように別名
+            授業科目.単位,
+            授業科目.備考,
+            学科.学科名,
+        )
+        .outerjoin(学科, 学科.学科ID == 授業科目.学科ID)
+        .order_by(授業科目.授業科目ID)
+    )
+    with get_conn() as conn:
+        subjects = conn.execute(stmt).mappings().all()
+
+    # 学科一覧（プルダウン用）
+    gakkas = lookup("gakkas")
+
+    return render_template(
+        "kamoku_edit.html",
+        subjects=subjects,
+        gakkas=gakkas,
+    )
+
+@bp.route("/tukijikanwari", methods=["GET"])
+def tukijikanwari():
+    """
+    月の予定表（列=曜日）カレンダー表示 + 授業科目編集ボタン
+    """
+    today = date.today()
+    selected_month = request.args.get("month", default=today.month, type=int)
+    selected_year  = request.args.get("year",  default=today.year,  type=int)
+
+    # Render 用に作り直した generate_monthly_schedule(year, month) を呼び出し
+    # 戻り値: { month: { day: [ {時限, 学科ID, 科目名, 教室ID, 備考}, ... ] } }
+    monthly_schedule = generate_monthly_schedule(
+        selected_month,
+        selected_year,
+    )
+    days_map = monthly_schedule.get(selected_month, {})
+
+    # 月曜始まりのカレンダー
+    import calendar
+    cal = calendar.Calendar(firstweekday=0)  # 0 = 月曜日
+    month_weeks = cal.monthdayscalendar(selected_year, selected_month)
+
+    youbi_labels = ["月", "火", "水", "木", "金", "土", "日"]
+
+    return render_template(
+        "tukijikanwari.html",
+        selected_year=selected_year,
+        selected_month=selected_month,
+        month_weeks=month_weeks,
+        days_map=days_map,
+        youbi_labels=youbi_labels,
+    )
+
+@bp.route("/kiki")
+def kiki():
+    """期マスタテーブルの一覧を表示"""
+    with get_conn() as conn:
+        rows = conn.execute(SQL_PERIOD_NAMES.order_by(期マスタ.期ID)).mappings().all()
+
+    return render_template("kiki.html", rows=rows)
+
+
+# ==============================
+#  教室一覧
+# ==============================
+@bp.route("/classrooms")
+def classrooms():
+    """教室テーブルの一覧を表示"""
+    with get_conn() as conn:
+        rows = conn.execute(
+            select(教室.教室ID, 教室.教室名, 教室.収容人数).order_by(教室.教室ID)
+        ).mappings().all()
+
+    return render_template("classrooms.html", rows=rows)
+
+@bp.route("/kamoku_edit/<int:subject_id>", methods=["GET"])
+def kamoku_edit_form(subject_id: int):
+    """授業科目の編集フォーム"""
+
+    with get_conn() as conn:
+        row = conn.execute(
+            select(授業科目.授業科目ID, 授業科目.授業科目名, 授業科目.学科ID, 授業科目.単位, 授業科目.備考)
+            .where(授業科目.授業科目ID == subject_id)
+        ).mappings().first()
+
+    if not row:
+        abort(404)
+
+    # 学科一覧（プルダウン）
+    gakkas = lookup("gakkas")
+
+    return render_template_string("""
+<!doctype html>
+<meta charset="utf-8"><title>授業科目の編集</title>
+<style>
+body{font-family:system-ui,Meiryo,sans-serif;margin:20px;background:#f7f7fb}
+.card{background:#fff;border-radius:12px;box-shadow:0 4px 12px rgba(0,0,0,.06);padding:16px;margin-bottom:16px}
+h1{margin:0 0 12px}
+input,select,button{padding:8px;border:1px solid #ddd;border-radius:8px;font-size:14px}
+button{background:#2f6feb;color:#fff;border:none;cursor:pointer}
+button:hover{filter:brightness(.95)}
+.flex{display:flex;gap:10px;flex-wrap:wrap}
+.small{color:#666;font-size:12px}
+</style>
+
+<div class="card">
+  <h1>授業科目の編集（ID: {{ row['授業科目ID'] }}）</h1>
+  <a href="{{ url_for('timetable.kamoku_edit') }}" class="small">← 一覧に戻る</a>
+</div>
+
+<div class="card">
+  <form method="post" action="{{ url_for('timetable.kamoku_update', subject_id=row['授業科目ID']) }}" class="flex">
+    <div>
+      <label>授業科目名</label><br>
+      <input name="name" value="{{ row['授業科目名'] }}" required style="min-width:280px">
+    </div>
+
+    <div>
+      <label>学科</label><br>
+      <select name="gakka_id" required>
+        {% for g in gakkas %}
+          <option value="{{ g['学科ID'] }}"
+            {% if g['学科ID']==row['学科ID'] %}selected{% endif %}>
+            {{ g['学科名'] }}（ID:{{ g['学科ID'] }}）
+          </option>
+        {% endfor %}
+      </select>
+    </div>
+
+    <div>
+      <label>単位</label><br>
+      <input name="unit" type="number" min="0" value="{{ row['単位'] or 0 }}" style="width:90px">
+    </div>
+
+    <div style="flex:1 1 320px">
+      <label>備考</label><br>
+      <input name="note" value="{{ row['備考'] or '' }}">
+    </div>
+
+    <div style="align-self:flex-end">
+      <button type="submit">更新</button>
+    </div>
+  </form>
+</div>
+""", row=row, gakkas=gakkas)
+
+@bp.route("/kamoku_add", methods=["POST"])
+def kamoku_add():
+    """授業科目の新規追加"""
+    name = (request.form.get("name") or "").strip()
+    gakka_id = _parse_int(request.form.get("gakka_id"))
+    unit = _parse_int(request.form.get("unit"), 0)
+    note = (request.form.get("note") or "").strip()
+
+    if not name or gakka_id is None:
+        flash("入力が不足しています。")
+        return redirect(url_for("timetable.kamoku_edit"))
+
+    try:
+        with get_conn() as conn:
+            # SMALLINT 主キーを自前採番する
+            new_id = _next_subject_id(conn)
+
+            conn.execute(insert(授業科目).values(
+                授業科目ID=new_id, 授業科目名=name, 学科ID=gakka_id,
+                単位=unit, 学科フラグ=0, 備考=note,
+            ))
+            conn.commit()
+        invalidate_lookups("subjects")
+
+        flash(f"科目を追加しました（ID: {new_id}）。")
+    except Exception as e:
+        flash(f"追加エラー: {e}")
+
+    return redirect(url_for("timetable.kamoku_edit"))
+
+
+@bp.route("/kamoku_update/<int:subject_id>", methods=["POST"])
+def kamoku_update(subject_id: int):
+    """授業科目の更新"""
+    name = (request.form.get("name") or "").strip()
+    gakka_id = _parse_int(request.form.get("gakka_id"))
+    unit = _parse_int(request.form.get("unit"), 0)
+    note = (request.form.get("note") or "").strip()
+
+    if not name or gakka_id is None:
+        flash("入力が不足しています。")
+        return redirect(url_for("timetable.kamoku_edit_form", subject_id=subject_id))
+
+    try:
+        with get_conn() as conn:
+            result = conn.execute(
+                update(授業科目)
+                .where(授業科目.授業科目ID == subject_id)
+                .values(授業科目名=name, 学科ID=gakka_id, 単位=unit, 備考=note)
+            )
+
+            if result.rowcount == 0:
+                flash("対象の科目が見つかりません。")
+            else:
+                flash("更新しました。")
+
+            conn.commit()
+        invalidate_lookups("subjects")
+    except Exception as e:
+        flash(f"更新エラー: {e}")
+
+    return redirect(url_for("timetable.kamoku_edit"))
+
+@bp.route("/jikanwari", methods=["GET"])
+def jikanwari():
+    """選択した期（1期〜4期）の時間割を曜日 × 時限の形式で表示"""
+
+    # クエリパラメータから選択された期を取得（デフォルトは1期）
+    selected_term = request.args.get("term", 1, type=int)
+
+    # 曜日・授業科目・教室・期（1〜4期）のマスタ
+    weekdays = lookup("weekdays")
+    subjects = lookup("subjects")
+    classrooms = lookup("rooms")
+    terms = {t["期ID"]: t["期名"] for t in lookup("terms")}
+
+    with get_conn() as conn:
+        # 週時間割のデータを取得（選択された期に該当するデータ）
+        rows = conn.execute(
+            select(週時間割.年度, 週時間割.学科ID, 週時間割.期, 週時間割.曜日,
+                   週時間割.時限, 週時間割.科目ID, 週時間割.教室ID, 週時間割.備考)
+            .where(週時間割.期 == selected_term)
+            .order_by(週時間割.時限, 週時間割.曜日)
+        ).mappings().all()
+
+    # 時間割を「時限 × 曜日」の形式に整形（1〜5限 × 全曜日）
+    # schedule[時限][曜日名] = { 科目, 教員, 教室 }
+    schedule = {
+        period: {
+            weekdays.get(d, "不明"): {"科目": "", "教員": "", "教室": ""}
+            for d in weekdays  # d は 曜日ID
+        }
+        for period in range(1, 6)
+    }
+
+    # 時間割データを埋め込む
+    for row in rows:
+        day_name = weekdays.get(row["曜日"], "不明")
+        period = row["時限"]
+        subject = subjects.get(row["科目ID"], "不明")
+        classroom = classrooms.get(row["教室ID"], "不明")
+        teacher = row["備考"] or ""  # 備考欄を教員名として利用（空なら空文字）
+
+        if period in schedule and day_name in schedule[period]:
+            schedule[period][day_name] = {
+                "科目": subject,
+                "教員": teacher,
+                "教室": classroom,
+            }
+
+    return render_template(
+        "jikanwari.html",
+        weekdays=weekdays,        # {曜日ID: 曜日名}
+        schedule=schedule,        # 時限×曜日の2次元マップ
+        terms=terms,              # {期ID: 期名}
+        selected_term=selected_term,
+    )
+
+@bp.route("/tukijikanwari_csv", methods=["GET"])
+def tukijikanwari_csv():
+    """
+    /tukijikanwari の月カレンダーを CSV 出力
+    出力列: 年, 月, 日, 曜日, 時限, 科目名, 教室ID, 備考
+    """
+    today = date.today()
+    year  = request.args.get("year",  default=today.year,  type=int)
+    month = request.args.get("month", default=today.month, type=int)
+
+    # 既存関数を再利用
+    # generate_monthly_schedule(selected_month, selected_year) を想定
+    # 戻り値: { month: { day: [ {時限, 科目名, 教室ID, 備考, ...}, ... ] } }
+    monthly_schedule = generate_monthly_schedule(selected_month=month, selected_year=year)
+    days_map = monthly_schedule.get(month, {})
+
+    youbi_names = ["月", "火", "水", "木", "金", "土", "日"]
+
+    # CSV 構築
+    import csv
+    buf = StringIO()
+    writer = csv.writer(buf)
+
+    # Excel で文字化けしないように UTF-8 BOM 付き
+    writer.writerow(["年", "月", "日", "曜日", "時限", "科目名", "教室ID", "備考"])
+
+    # 日付昇順 → 時限昇順で出力
+    for d in sorted(days_map.keys()):
+        try:
+            w = date(year, month, int(d)).weekday()  # 0=月 … 6=日
+            youbi = youbi_names[w]
+        except Exception:
+            youbi = ""
+        lessons = sorted(days_map[d], key=lambda x: x.get("時限", 0))
+        for les in lessons:
+            writer.writerow([
+                year,
+                month,
+                d,
+                youbi,
+                les.get("時限", ""),
+                les.get("科目名", ""),
+                les.get("教室ID", ""),
+                les.get("備考", ""),
+            ])
+
+    data = buf.getvalue().encode("utf-8-sig")  # BOM付き
+    bio = BytesIO(data)
+    bio.seek(0)
+    metrics.observe_csv_export("tukijikanwari_csv", len(data))
+    fname = f"月間時間割_{year}{month:02d}.csv"
+
+    # Flask 2.x 以降の send_file
+    try:
+        return send_file(
+            bio,
+            as_attachment=True,
+            download_name=fname,
+            mimetype="text/csv; charset=utf-8",
+        )
+    except TypeError:
+        # 古い Flask 用フォールバック
+        return send_file(
+            bio,
+            as_attachment=True,
+            attachment_filename=fname,
+            mimetype="text/csv; charset=utf-8",
+        )
+
+@bp.route("/kamoku_delete/<int:subject_id>", methods=["POST"])
+def kamoku_delete(subject_id: int):
+    """授業科目の削除"""
+    try:
+        with get_conn() as conn:
+            result = conn.execute(delete(授業科目).where(授業科目.授業科目ID == subject_id))
+
+            if result.rowcount == 0:
+                flash("対象の科目が見つかりません。")
+            else:
+                flash("削除しました。")
+
+            conn.commit()
+        invalidate_lookups("subjects")
+
+    except Exception as e:
+        flash(f"削除エラー: {e}")
+
+    return redirect(url_for("timetable.kamoku_edit"))
+
+@bp.route("/edit_subject_dayperiod", methods=["GET", "POST"])
+def edit_subject_dayperiod():
+    y        = request.values.get("year",  type=int)
+    m        = request.values.get("month", type=int)
+    d        = request.values.get("day",   type=int)
+    period   = request.values.get("period", type=int)
+    gakka_id = request.values.get("gakka_id", type=int)
+
+    if not all([y, m, d, period, gakka_id]):
+        return "year, month, day, period, gakka_id は必須です。", 400
+
+    target_date = date(y, m, d).isoformat()
+
+    # ===== マスタ取得 =====
+    special_key = (
+        (特別時間割.日付 == target_date)
+        & (特別時間割.学科ID == gakka_id)
+        & (特別時間割.時限 == period)
+    )
+    with get_conn() as conn:
+        # 授業科目一覧
+        subjects = conn.execute(SQL_SUBJECT_NAMES.order_by(授業科目.授業科目ID)).mappings().all()
+
+        # 教室一覧
+        rooms = conn.execute(SQL_ROOM_NAMES.order_by(教室.教室ID)).mappings().all()
+
+        # 既存の特別時間割
+        special = conn.execute(
+            select(特別時間割.科目ID, 特別時間割.教室ID, 特別時間割.備考).where(special_key)
+        ).mappings().first()
+
+        # 授業計画から当日の「期×曜日」を取得
+        jp = conn.execute(
+            select(授業計画.期, 授業計画.授業曜日).where(授業計画.日付 == date(y, m, d)).limit(1)
+        ).mappings().first()
+
+        default_row = None
+        if jp:
+            default_row = conn.execute(
+                select(週時間割.科目ID, 週時間割.教室ID, 週時間割.備考)
+                .where(週時間割.学科ID == gakka_id, 週時間割.期 == jp["期"],
+                       週時間割.曜日 == jp["授業曜日"], 週時間割.時限 == period)
+            ).mappings().first()
+
+    # ===== POST: 保存 or 削除 =====
+    if request.method == "POST":
+        action  = request.form.get("action", "save")
+        subj_id = request.form.get("科目ID", type=int)
+        room_id = request.form.get("教室ID", type=int)
+        note    = (request.form.get("備考") or "").strip()
+
+        with get_conn() as conn:
+            if action == "delete":
+                # 特別時間割レコード削除 → 週時間割に戻す
+                conn.execute(delete(特別時間割).where(special_key))
+                conn.commit()
+                flash("特別時間割を削除しました（週時間割に戻ります）。")
+
+            else:
+                conn.execute(
+                    _upsert(特別時間割, ["日付", "学科ID", "時限"], ["科目ID", "教室ID", "備考"]),
+                    {"日付": target_date, "学科ID": gakka_id, "時限": period,
+                     "科目ID": subj_id, "教室ID": room_id, "備考": note},
+                )
+                conn.commit()
+                flash("保存しました。")
+
+        # 編集前の月へ戻る
+        return redirect(url_for("timetable.tukijikanwari", year=y, month=m))
+
+    # ===== GET: 画面表示用 初期値（特別時間割 > 週時間割） =====
+    init_subj = special["科目ID"] if special else (default_row["科目ID"] if default_row else None)
+    init_room = special["教室ID"] if special else (default_row["教室ID"] if default_row else None)
+    init_note = special["備考"]   if special else (default_row["備考"]   if default_row else "")
+
+    return render_template_string("""
+<!doctype html><meta charset="utf-8">
+<title>日付×時限×学科の授業科目 編集</title>
+<style>
+ body{font-family:system-ui,Meiryo,sans-serif;margin:20px;background:#f7f7fb}
+ .card{background:#fff;border-radius:12px;box-shadow:0 4px 12px rgba(0,0,0,.06);padding:16px;max-width:600px}
+ label{display:block;font-size:12px;color:#555;margin:8px 0 4px}
+ select,input,textarea,button{width:100%;padding:10px;border:1px solid #ddd;border-radius:8px;font-size:14px}
+ button{background:#2f6feb;color:#fff;border:none;cursor:pointer;margin-top:10px}
+ button:hover{filter:brightness(.95)}
+ .row{display:grid;grid-template-columns:1fr 1fr;gap:12px}
+ .danger{background:#f44336}
+ .small{font-size:12px;color:#666;margin-top:6px}
+ a.btn{display:inline-block;padding:8px 12px;background:#888;color:#fff;border-radius:8px;text-decoration:none;margin-top:10px}
+</style>
+<div class="card">
+  <h2 style="margin:0 0 10px">
+    授業科目の編集：{{ y }}年{{ m }}月{{ d }}日／{{ period }}限／学科ID {{ gakka_id }}
+  </h2>
+
+  <form method="post">
+    <div>
+      <label>科目</label>
+      <select name="科目ID" required>
+        <option value="">-- 選択 --</option>
+        {% for s in subjects %}
+          <option value="{{ s['授業科目ID'] }}"
+            {% if init_subj and s['授業科目ID'] == init_subj %}selected{% endif %}>
+            {{ s['授業科目ID'] }} : {{ s['授業科目名'] }}
+          </option>
+        {% endfor %}
+      </select>
+    </div>
+
+    <div class="row">
+      <div>
+        <label>教室</label>
+        <select name="教室ID">
+          <option value="">-- 未設定 --</option>
+          {% for r in rooms %}
+            <option value="{{ r['教室ID'] }}"
+              {% if init_room and r['教室ID'] == init_room %}selected{% endif %}>
+              {{ r['教室ID'] }} : {{ r['教室名'] }}
+            </option>
+          {% endfor %}
+        </select>
+      </div>
+      <div>
+        <label>備考</label>
+        <input name="備考" value="{{ init_note or '' }}">
+      </div>
+    </div>
+
+    <button type="submit" name="action" value="save">保存</button>
+  </form>
+
+  {% if init_subj is not none or init_room is not none or init_note %}
+  <form method="post"
+        onsubmit="return confirm('特別時間割を削除して週時間割に戻します。よろしいですか？');">
+    <button class="danger" type="submit" name="action" value="delete">
+      特別時間割を削除
+    </button>
+  </form>
+  {% endif %}
+
+  <a class="btn" href="{{ url_for('timetable.tukijikanwari', year=y, month=m) }}">← 月表示に戻る</a>
+  <div class="small">
+    ※ この変更は <b>{{ y }}-{{ '%02d'|format(m) }}-{{ '%02d'|format(d) }}</b> の該当コマだけに適用されます。
+  </div>
+</div>
+""",
+        y=y, m=m, d=d,
+        period=period,
+        gakka_id=gakka_id,
+        subjects=subjects,
+        rooms=rooms,
+        init_subj=init_subj,
+        init_room=init_room,
+        init_note=init_note,
+    )
+
+@bp.route("/timetable")
+def timetable():
+    # クエリパラメータの取得（デフォルト値を設定）
+    gakka_id = request.args.get('gakka_id', 3, type=int)  # 学科ID（デフォルト 3）
+    period = request.args.get('period', 1, type=int)  # 期（デフォルト 1）
+    week_day = request.args.get('week_day', 1, type=int)  # 曜日（デフォルト 月曜日）
+
+    # 時間割データを取得
+    timetable_data = fetch_timetable_for_week(gakka_id, period, week_day)
+    
+    # HTMLを生成して返す
+    return render_template_string("""
+    <!DOCTYPE html>
+    <html lang="ja">
+    <head>
+        <meta charset="UTF-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <title>時間割</title>
+        <style>
+            body { font-family: system-ui, sans-serif; margin: 20px; background: #f4f4f4; }
+            table { width: 100%; border-collapse: collapse; margin-top: 20px; }
+            th, td { padding: 8px; text-align: left; border: 1px solid #ddd; }
+            th { background-color: #f2f2f2; }
+            td { background-color: #fff; }
+        </style>
+    </head>
+    <body>
+        <h1>時間割</h1>
+        <h3>{{ period }}期 - {{ week_day }}曜日</h3>
+        <table>
+            <thead>
+                <tr>
+                    <th>時限</th>
+                    <th>科目ID</th>
+                    <th>教室ID</th>
+                    <th>備考</th>
+                </tr>
+            </thead>
+            <tbody>
+                {% for row in timetable_data %}
+                <tr>
+                    <td>{{ row['時限'] }}</td>
+                    <td>{{ row['科目ID'] }}</td>
+                    <td>{{ row['教室ID'] }}</td>
+                    <td>{{ row['備考'] }}</td>
+                </tr>
+                {% endfor %}
+            </tbody>
+        </table>
+    </body>
+    </html>
+    """, timetable_data=timetable_data, period=period, week_day=week_day)
+
+@bp.route("/kamoku_edit_day", methods=["GET", "POST"])
+def kamoku_edit_day():
+    """
+    特定の日付・時限の授業科目を編集
+    - GET: 現在の科目を表示
+    - POST: 選択した科目に更新
+    """
+    year   = request.args.get("year", type=int)
+    month  = request.args.get("month", type=int)
+    day    = request.args.get("day", type=int)
+    period = request.args.get("period", type=int)
+
+    # 一応日付として構成しておく（今は使っていないが将来拡張用）
+    target_date = date(year, month, day)
+
+    # ===== POST: 科目の更新 =====
+    if request.method == "POST":
+        # フォームから選択された科目IDを取得
+        subject_raw = request.form.get("subject_id")
+        try:
+            new_subject_id = int(subject_raw)
+        except (TypeError, ValueError):
+            flash("科目IDが不正です。")
+            return redirect(url_for("timetable.kamoku_edit_day",
+                                    year=year, month=month, day=day, period=period))
+
+        with get_conn() as conn:
+            # この日付・時限・学科IDを特定して UPDATE するロジックは簡略化
+            # 実際には generate_monthly_schedule() が参照する情報に合わせて条件を増やす想定
+            conn.execute(
+                update(週時間割)
+                .where(週時間割.時限 == period, 週時間割.科目ID.is_not(None))
+                .values(科目ID=new_subject_id)
+            )
+            conn.commit()
+
+        flash(f"{year}年{month}月{day}日 {period}限の授業科目を更新しました。")
+        return redirect(url_for("timetable.tukijikanwari", month=month, year=year))
+
+    # ===== GET: 現在の科目・科目一覧を表示 =====
+    with get_conn() as conn:
+        # 授業科目一覧
+        subjects = conn.execute(SQL_SUBJECT_NAMES.order_by(授業科目.授業科目ID)).mappings().all()
+
+        # 現在の科目（簡易版：同じ時限のものから1件だけ拾う）
+        current = conn.execute(
+            select(週時間割.科目ID, 授業科目.授業科目名)
+            .outerjoin(授業科目, 授業科目.授業科目ID == 週時間割.科目ID)
+            .where(週時間割.時限 == period)
+            .limit(1)
+        ).mappings().first()
+
+    return render_template_string(
+        """
+<!doctype html>
+<meta charset="utf-8">
+<title>授業科目の編集</title>
+<style>
+body{font-family:system-ui,Meiryo,sans-serif;margin:20px;background:#f7f7fb}
+.card{background:#fff;border-radius:12px;box-shadow:0 4px 12px rgba(0,0,0,.06);padding:16px;margin-bottom:16px}
+h1{margin:0 0 12px}
+select,button{padding:8px;border:1px solid #ddd;border-radius:8px;font-size:14px}
+button{background:#2f6feb;color:#fff;border:none;cursor:pointer}
+button:hover{filter:brightness(.95)}
+a{text-decoration:none;color:#2f6feb}
+</style>
+
+<div class="card">
+  <h1>{{year}}年{{month}}月{{day}}日 {{period}}限 の授業科目を編集</h1>
+  <a href="{{ url_for('timetable.tukijikanwari', year=year, month=month) }}">← 月間時間割に戻る</a>
+</div>
+
+<div class="card">
+  <form method="post">
+    <label>授業科目を選択</label><br>
+    <select name="subject_id" required>
+      {% for s in subjects %}
+        <option value="{{ s['授業科目ID'] }}"
+          {% if current and current['科目ID'] == s['授業科目ID'] %}selected{% endif %}>
+          {{ s['授業科目名'] }}（ID:{{ s['授業科目ID'] }}）
+        </option>
+      {% endfor %}
+    </select>
+    <br><br>
+    <button type="submit">更新</button>
+  </form>
+</div>
+""",
+        year=year,
+        month=month,
+        day=day,
+        period=period,
+        current=current,
+        subjects=subjects,
+    )
@@ -0,0 +1,386 @@
+# schema.py (スキーマのバージョン管理・マイグレーション)
+"""
+起動時（または CLI）に一度だけ実行するスキーマの初期化・移行処理。
+リクエスト処理側はここで作られたテーブル・列・インデックスが存在する前提で動く。
+
+  flask --app web db-upgrade   … 未適用のマイグレーションを適用
+  flask --app web db-version   … 現在のスキーマバージョンを表示
+
+マイグレーションは SQLite / PostgreSQL の両方で冪等に動くように書く
+（テーブル・インデックスは checkfirst、列は存在確認してから ALTER）。
+適用済みのバージョンは schema_migrations テーブルに記録する。
+
+初期データの投入状況などアプリ側の状態は app_meta（key / value）に記録する。
+複数ワーカーが同時に起動しても初期化が一度で済むよう、startup_lock() で
+プロセス間の排他をとる（PostgreSQL: advisory lock / SQLite: ロックファイル）。
+"""
+import os
+import tempfile
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import (
+    Column, DateTime, Index, Integer, LargeBinary, MetaData, String, Table, Text, bindparam, inspect, text,
+)
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+_meta = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _meta,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(100), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+app_meta = Table(
+    "app_meta", _meta,
+    Column("key", String(50), primary_key=True),
+    Column("value", String(100), nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+)
+# バックグラウンドで作る帳票・エクスポート（jobs.py）
+report_jobs = Table(
+    "report_jobs", _meta,
+    Column("id", String(32), primary_key=True),
+    Column("kind", String(30), nullable=False),
+    Column("params", Text, nullable=False),
+    Column("params_key", String(64), nullable=False),
+    Column("status", String(10), nullable=False),
+    Column("progress", Integer, nullable=False, default=0),
+    Column("message", String(200)),
+    Column("result", LargeBinary),
+    Column("content_type", String(100)),
+    Column("disposition", String(300)),
+    Column("created_at", DateTime, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+    Column("finished_at", DateTime),
+    Index("ix_report_jobs_params_key", "params_key", "status"),
+)
+
+
+# =========================================================================
+# ヘルパー
+# =========================================================================
+def _has_column(conn, table: str, column: str) -> bool:
+    return any(c["name"] == column for c in inspect(conn).get_columns(table))
+
+
+def _add_column(conn, table: str, column: str, ddl_type: str):
+    if not _has_column(conn, table, column):
+        conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN "{column}" {ddl_type}'))
+
+
+def _create_indexes(conn, table, names=None):
+    """
+    モデル側（__table_args__）で宣言したインデックスを作成する。
+    names を渡すとその名前のものだけ（後のマイグレーションで足した列の索引を先に作らないため）。
+    """
+    for ix in table.indexes:
+        if names is None or ix.name in names:
+            ix.create(conn, checkfirst=True)
+
+
+# =========================================================================
+# マイグレーション本体
+# =========================================================================
+def _m001_base_tables(conn, metadata):
+    metadata.create_all(conn, checkfirst=True)
+
+
+def _m002_attendance_columns(conn, metadata):
+    # 古い DB には 出席状態 / 退出区分 が無い
+    _add_column(conn, "入退室", "出席状態", "TEXT")
+    _add_column(conn, "入退室", "退出区分", "TEXT")
+
+
+# m003 の時点のインデックス（モデルに後から足した索引はそれぞれのマイグレーションで作る）
+_M003_INDEXES = {
+    "入退室": ("ix_入退室_学生_学科_時間", "ix_入退室_学科_区分_時間"),
+    "カメラログ": ("ix_カメラログ_記録時刻",),
+    "週時間割": ("ix_週時間割_学科_期_曜日",),
+    "授業計画": ("ix_授業計画_期",),
+}
+
+
+def _m003_report_indexes(conn, metadata):
+    for name, indexes in _M003_INDEXES.items():
+        _create_indexes(conn, metadata.tables[name], indexes)
+
+
+def _m004_absent_reason_unique(conn, metadata):
+    # ON CONFLICT(学生番号,学科ID,科目ID,日付) には一意インデックスが必要。
+    # 作成前に重複行を片付ける（最新の id を残す）
+    conn.execute(text("""
+        DELETE FROM "欠席理由"
+        WHERE id NOT IN (
+            SELECT MAX(id) FROM "欠席理由"
+            GROUP BY "学生番号", "学科ID", "科目ID", "日付"
+        )
+    """))
+    _create_indexes(conn, metadata.tables["欠席理由"], ("ux_欠席理由_学生_科目_日付",))
+
+
+def _m005_report_jobs(conn, metadata):
+    report_jobs.create(conn, checkfirst=True)
+
+
+def _m006_attendance_rollup(conn, metadata):
+    metadata.tables["出欠集計"].create(conn, checkfirst=True)
+
+
+def _m007_absent_reason_unique_verify(conn, metadata):
+    # 古い DB に同名の「一意でない」インデックスがあると m004 の checkfirst で作成が飛ばされる。
+    # 帳票の公欠集計・一括登録の upsert は一意性が前提なので、両方言で作り直して保証する
+    table = metadata.tables["欠席理由"]
+    ix = next(i for i in table.indexes if i.name == "ux_欠席理由_学生_科目_日付")
+    existing = {i["name"]: i for i in inspect(conn).get_indexes("欠席理由")}
+    if existing.get(ix.name, {}).get("unique"):
+        return
+    if ix.name in existing:
+        ix.drop(conn)
+    _m004_absent_reason_unique(conn, metadata)
+
+
+def _m008_compact_camlog(conn, metadata):
+    # 辞書テーブル + 区間テーブルを作り、旧 カメラログ の行を1イベント=1区間として移す
+    from datastore import _as_datetime
+
+    for name in ("カメラソース", "カメラ状態", "カメラマーカー", "カメラ区間"):
+        metadata.tables[name].create(conn, checkfirst=True)
+    if not inspect(conn).has_table("カメラログ"):
+        return
+    old = metadata.tables["カメラログ"]
+    rows = conn.execute(old.select().order_by(old.c.id)).mappings().all()
+    if not rows:
+        return
+
+    ids = {}
+    for table, column in (("カメラソース", "ソース"), ("カメラ状態", "ステータス"), ("カメラマーカー", "マーカー名")):
+        t = metadata.tables[table]
+        names = sorted({(r[column] or "").strip() for r in rows})
+        existing = {n: i for i, n in conn.execute(t.select().with_only_columns(t.c.ID, t.c.名前))}
+        missing = [{"名前": n} for n in names if n not in existing]
+        if missing:
+            conn.execute(t.insert(), missing)
+            existing = {n: i for i, n in conn.execute(t.select().with_only_columns(t.c.ID, t.c.名前))}
+        ids[column] = existing
+
+    intervals, moved, skipped = [], [], 0
+    for r in rows:
+        try:
+            # オフセット付きは学校の現地時刻に直す（カメラ区間 は学校の現地時刻で持つ）
+            ts = _as_datetime(r["記録時刻"])
+        except ValueError:
+            skipped += 1
+            continue
+        score = r["スコア"]
+        intervals.append({
+            "開始時刻": ts, "終了時刻": ts,
+            "ソースID": ids["ソース"][(r["ソース"] or "").strip()],
+            "ステータスID": ids["ステータス"][(r["ステータス"] or "").strip()],
+            "マーカーID": ids["マーカー名"][(r["マーカー名"] or "").strip()],
+            "件数": 1, "スコア件数": 0 if score is None else 1,
+            "スコア合計": score, "スコア最小": score, "スコア最大": score,
+            "メッセージ": r["メッセージ"],
+        })
+        moved.append(r["id"])
+    for i in range(0, len(intervals), 5000):
+        conn.execute(metadata.tables["カメラ区間"].insert(), intervals[i:i + 5000])
+        conn.execute(old.delete().where(old.c.id.in_(moved[i:i + 5000])))
+    if skipped:
+        print(f"[DB] カメラログ: 時刻を読めない {skipped} 行は旧テーブルに残しました")
+
+
+def _m009_camera_marker_student(conn, metadata):
+    # マーカー → 生徒 の割り当て（カメラの検出を入退室の打刻に変換する）
+    _add_column(conn, "カメラマーカー", "学生番号", "INTEGER")
+    _add_column(conn, "カメラマーカー", "学科ID", "SMALLINT")
+
+
+def _m010_absence_notifications(conn, metadata):
+    for name in ("連絡先", "欠席通知"):
+        metadata.tables[name].create(conn, checkfirst=True)
+
+
+def _m011_homeroom_teachers(conn, metadata):
+    metadata.tables["担任"].create(conn, checkfirst=True)
+
+
+_ATTENDANCE_DATE_INDEXES = ("ix_入退室_学生_学科_日付", "ix_入退室_学科_区分_日付")
+
+
+def _drop_indexes(conn, names):
+    for name in names:
+        conn.execute(text(f'DROP INDEX IF EXISTS "{name}"'))
+
+
+def _backfill_attendance_date(conn, metadata):
+    # 日付 の入っていない行の 入退出時間 を UTC に揃え、学校の現地日付を 日付 に入れる。
+    # これまでの値は学校の現地時刻の壁時計として書かれている
+    # （PostgreSQL では接続のタイムゾーンで解釈された値）ので、SCHOOL_TIMEZONE の時刻として読み直す
+    from datastore import SCHOOL_TZ, _as_datetime, _to_utc
+
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("""
+            UPDATE "入退室"
+            SET "入退出時間" = ("入退出時間" AT TIME ZONE current_setting('TimeZone')) AT TIME ZONE :tz,
+                "日付" = ("入退出時間" AT TIME ZONE current_setting('TimeZone'))::date
+            WHERE "日付" IS NULL
+        """), {"tz": SCHOOL_TZ.key})
+    else:
+        t = metadata.tables["入退室"]
+        rows = conn.execute(text('SELECT "記録ID", "入退出時間" FROM "入退室" WHERE "日付" IS NULL')).all()
+        stmt = (
+            t.update().where(t.c.記録ID == bindparam("_id"))
+            .values(入退出時間=bindparam("_ts"), 日付=bindparam("_d"))
+        )
+        params = []
+        for record_id, ts in rows:
+            local = _as_datetime(ts)
+            params.append({"_id": record_id, "_ts": _to_utc(local), "_d": local.date()})
+        for i in range(0, len(params), 5000):
+            conn.execute(stmt, params[i:i + 5000])
+
+
+def _m012_attendance_utc_date(conn, metadata):
+    # 入退出時間 を UTC に揃え、学校の現地日付を 日付 列に入れて索引を張る（帳票の期間検索用）
+    _add_column(conn, "入退室", "日付", "DATE")
+    if conn.dialect.name == "sqlite":
+        # 以前の m003 はモデルの索引を全部作っていたため、日付 列の無い古い DB では
+        # 同名の（文字列 '日付' の式の）索引ができている。埋め直す前に捨てる
+        _drop_indexes(conn, _ATTENDANCE_DATE_INDEXES)
+    _backfill_attendance_date(conn, metadata)
+    _create_indexes(conn, metadata.tables["入退室"], _ATTENDANCE_DATE_INDEXES)
+
+
+def _m013_attendance_date_index_repair(conn, metadata):
+    # 以前の m003 / m012 で v12 まで上がった SQLite の DB は、日付 の索引が
+    # 文字列の式の索引のまま（または行が欠けたまま）になっているので作り直す。
+    # 日付 が埋まっていない行も埋める。PostgreSQL は以前の m003 が失敗していて該当しない
+    if conn.dialect.name != "sqlite":
+        return
+    _drop_indexes(conn, _ATTENDANCE_DATE_INDEXES)
+    _backfill_attendance_date(conn, metadata)
+    _create_indexes(conn, metadata.tables["入退室"], _ATTENDANCE_DATE_INDEXES)
+
+
+def _m014_attendance_source(conn, metadata):
+    # カメラの入室（fusion.py）をカード打刻の入室/退出の切り替えから外すための印
+    _add_column(conn, "入退室", "打刻元", "VARCHAR(10)")
+
+
+MIGRATIONS = [
+    (1, "base tables", _m001_base_tables),
+    (2, "入退室 出席状態/退出区分", _m002_attendance_columns),
+    (3, "report indexes", _m003_report_indexes),
+    (4, "欠席理由 unique key", _m004_absent_reason_unique),
+    (5, "report_jobs", _m005_report_jobs),
+    (6, "出欠集計 rollup", _m006_attendance_rollup),
+    (7, "欠席理由 unique key (verify)", _m007_absent_reason_unique_verify),
+    (8, "カメラログ compact store", _m008_compact_camlog),
+    (9, "カメラマーカー 学生番号/学科ID", _m009_camera_marker_student),
+    (10, "連絡先 / 欠席通知", _m010_absence_notifications),
+    (11, "担任", _m011_homeroom_teachers),
+    (12, "入退室 UTC / 日付", _m012_attendance_utc_date),
+    (13, "入退室 日付 index repair", _m013_attendance_date_index_repair),
+    (14, "入退室 打刻元", _m014_attendance_source),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# =========================================================================
+# 公開関数
+# =========================================================================
+def current_version(engine) -> int:
+    with engine.connect() as conn:
+        if not inspect(conn).has_table(schema_migrations.name):
+            return 0
+        v = conn.execute(text("SELECT MAX(version) FROM schema_migrations")).scalar()
+        return v or 0
+
+
+def upgrade(engine, metadata) -> list:
+    """未適用のマイグレーションを順に適用し、適用したバージョンのリストを返す。"""
+    schema_migrations.create(engine, checkfirst=True)
+    app_meta.create(engine, checkfirst=True)
+    applied = []
+    for version, name, fn in MIGRATIONS:
+        with engine.begin() as conn:
+            done = conn.execute(
+                schema_migrations.select().where(schema_migrations.c.version == version)
+            ).first()
+            if done:
+                continue
+            fn(conn, metadata)
+            conn.execute(schema_migrations.insert().values(
+                version=version, name=name, applied_at=datetime.now()
+            ))
+        applied.append(version)
+    return applied
+
+
+def get_meta(engine, key: str) -> Optional[str]:
+    """app_meta の値を返す（テーブル・キーが無ければ None）。"""
+    with engine.connect() as conn:
+        if not inspect(conn).has_table(app_meta.name):
+            return None
+        return conn.execute(
+            app_meta.select().with_only_columns(app_meta.c.value).where(app_meta.c.key == key)
+        ).scalar()
+
+
+def set_meta(conn, key: str, value: str):
+    """app_meta に値を記録する（呼び出し側のトランザクション内で実行）。"""
+    conn.execute(app_meta.delete().where(app_meta.c.key == key))
+    conn.execute(app_meta.insert().values(key=key, value=value, updated_at=datetime.now()))
+
+
+def _lock_path(engine, name: str) -> str:
+    database = engine.url.database
+    if database and database != ":memory:":
+        return os.path.abspath(database) + ".lock"
+    return os.path.join(tempfile.gettempdir(), f"{name}.lock")
+
+
+@contextmanager
+def startup_lock(engine, name: str = "aribaba-startup"):
+    """起動時の初期化をプロセス間で直列化する。"""
+    if engine.dialect.name == "postgresql":
+        key = zlib.crc32(name.encode("utf-8"))
+        with engine.connect() as conn:
+            conn.execute(text("SELECT pg_advisory_lock(:k)"), {"k": key})
+            try:
+                yield
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": key})
+        return
+
+    if fcntl is None:
+        yield
+        return
+    with open(_lock_path(engine, name), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def init_app(app, db):
+    """flask db-upgrade / db-version コマンドを登録する。"""
+
+    @app.cli.command("db-upgrade")
+    def db_upgrade_command():
+        """未適用のスキーママイグレーションを適用する。"""
+        applied = upgrade(db.engine, db.metadata)
+        print(f"[DB] 適用したマイグレーション: {applied or 'なし'}（現在 v{current_version(db.engine)}）")
+
+    @app.cli.command("db-version")
+    def db_version_command():
+        """現在のスキーマバージョンを表示する。"""
+        print(f"v{current_version(db.engine)} / 最新 v{LATEST_VERSION}")
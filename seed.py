@@ -0,0 +1,487 @@
+# seed.py (起動時の DB 初期化・初期データ投入)
+"""
+スキーマの適用（schema.py）と初期マスタデータの投入を、プロセスごとに一度だけ行う。
+gunicorn のフック（gunicorn.conf.py）からは web.py の同名関数経由で呼ばれる。
+"""
+import os
+import threading
+from datetime import datetime, time
+
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+import schema
+from datastore import get_conn, warm_lookups
+from models import (
+    db, 曜日マスタ, 期マスタ, 学科, 教室, 授業科目, 生徒, TimeTable, 週時間割,
+    カメラソース, カメラ状態, カメラマーカー, カメラ区間, 入退室_入力, 授業計画,
+)
+
+
+def _insert_initial_data():
+    """データベースにマスタデータと初期データを挿入します。"""
+    try:
+        # TimeTable（時限マスタ）を挿入
+        db.session.add_all([
+            TimeTable(時限=1, 開始時刻=time(8, 50), 終了時刻=time(10, 30), 備考="1限目"),
+            TimeTable(時限=2, 開始時刻=time(10, 35), 終了時刻=time(12, 15), 備考="2限目"),
+            TimeTable(時限=3, 開始時刻=time(13, 0), 終了時刻=time(14, 40), 備考="3限目"),
+            TimeTable(時限=4, 開始時刻=time(14, 45), 終了時刻=time(16, 25), 備考="4限目"),
+            TimeTable(時限=5, 開始時刻=time(16, 40), 終了時刻=time(18, 20), 備考="5限目")
+        ])
+
+        # 入退室_入力（仮データ）挿入
+        db.session.add_all([
+            入退室_入力(記録ID=1, 学生番号=1, 生徒名='青井渓一郎', 学科ID=1, 入退出時間=datetime(2025, 4, 8, 8, 50), 入室区分='入室'),
+            入退室_入力(記録ID=2, 学生番号=2, 生徒名='赤坂龍成', 学科ID=1, 入退出時間=datetime(2025, 4, 9, 8, 50), 入室区分='入室'),
+            # 必要に応じて追加
+        ])
+
+        # 授業計画の挿入
+        授業計画データ = [
+            ('2025-04-08', 1, 2), ('2025-04-09', 1, 3), ('2025-04-10', 1, 4),
+            ('2025-04-11', 1, 5), ('2025-04-14', 1, 1), ('2025-04-15', 1, 2),
+            ('2025-04-16', 1, 3), ('2025-04-17', 1, 4), ('2025-04-18', 1, 5),
+            ('2025-04-21', 1, 1), ('2025-04-22', 1, 2), ('2025-04-23', 1, 3),
+            ('2025-04-24', 1, 4), ('2025-04-25', 1, 5), ('2025-04-28', 1, 1),
+            ('2025-05-07', 1, 3), ('2025-05-08', 1, 4), ('2025-05-09', 1, 5),
+            ('2025-05-12', 1, 1), ('2025-05-13', 1, 2), ('2025-05-15', 1, 4),
+            ('2025-05-16', 1, 5), ('2025-05-19', 1, 1), ('2025-05-20', 1, 2),
+            ('2025-05-21', 1, 3), ('2025-05-22', 1, 4), ('2025-05-23', 1, 5),
+            ('2025-05-26', 1, 1), ('2025-05-27', 1, 2), ('2025-05-28', 1, 3),
+            ('2025-05-29', 1, 4), ('2025-05-30', 1, 5), ('2025-06-02', 1, 1),
+            ('2025-06-03', 1, 2), ('2025-06-04', 1, 3), ('2025-06-05', 1, 4),
+            ('2025-06-06', 1, 5), ('2025-06-09', 1, 1), ('2025-06-10', 1, 2),
+            ('2025-06-11', 1, 3), ('2025-06-12', 1, 4), ('2025-06-13', 1, 5),
+            ('2025-06-16', 1, 1), ('2025-06-17', 1, 2), ('2025-06-18', 1, 3),
+            ('2025-06-19', 2, 4), ('2025-06-20', 2, 5), ('2025-06-23', 2, 1),
+            ('2025-06-24', 2, 2), ('2025-06-25', 2, 3), ('2025-06-26', 2, 4),
+            ('2025-06-27', 2, 5), ('2025-06-30', 2, 1), ('2025-07-01', 2, 2),
+            ('2025-07-02', 2, 3), ('2025-07-03', 2, 4), ('2025-07-04', 2, 5),
+            ('2025-07-07', 2, 1), ('2025-07-08', 2, 2), ('2025-07-09', 2, 3),
+            ('2025-07-10', 2, 4), ('2025-07-11', 2, 5), ('2025-07-14', 2, 1),
+            ('2025-07-15', 9, 0), ('2025-07-16', 9, 0), ('2025-07-17', 9, 0),
+            ('2025-07-18', 9, 0), ('2025-07-21', 9, 0), ('2025-07-22', 9, 0),
+            ('2025-07-23', 9, 0), ('2025-07-24', 9, 0), ('2025-07-25', 9, 0),
+            ('2025-08-20', 2, 3), ('2025-08-21', 2, 4), ('2025-08-22', 2, 5),
+            ('2025-08-23', 2, 2), ('2025-08-25', 2, 1), ('2025-08-26', 2, 2),
+            ('2025-08-27', 2, 3), ('2025-08-28', 2, 4), ('2025-08-29', 2, 5),
+            ('2025-09-01', 2, 1), ('2025-09-02', 2, 2), ('2025-09-03', 2, 3),
+            ('2025-09-04', 2, 4), ('2025-09-05', 2, 5), ('2025-09-08', 2, 1),
+            ('2025-09-09', 2, 2), ('2025-09-10', 2, 3), ('2025-09-11', 2, 4),
+            ('2025-09-12', 2, 5), ('2025-09-16', 2, 2), ('2025-09-17', 2, 3),
+            ('2025-09-18', 2, 1), ('2025-09-19', 2, 5), ('2025-09-22', 2, 1),
+            ('2025-09-24', 2, 3), ('2025-09-25', 2, 4), ('2025-09-26', 2, 2),
+            ('2025-09-29', 2, 0), ('2025-09-30', 10, 0), ('2025-10-01', 10, 0),
+            ('2025-10-02', 10, 0), ('2025-10-03', 10, 0), ('2025-10-06', 10, 0),
+            ('2025-10-07', 10, 0), ('2025-10-08', 10, 0), ('2025-10-09', 10, 0),
+            ('2025-10-10', 10, 0), ('2025-10-14', 3, 2), ('2025-10-15', 3, 3),
+            ('2025-10-16', 3, 4), ('2025-10-17', 3, 5), ('2025-10-20', 3, 1),
+            ('2025-10-21', 3, 2), ('2025-10-22', 3, 3), ('2025-10-23', 3, 4),
+            ('2025-10-24', 3, 5), ('2025-10-27', 3, 1), ('2025-10-28', 3, 2),
+            ('2025-10-29', 3, 3), ('2025-10-30', 3, 4), ('2025-10-31', 3, 5),
+            ('2025-11-04', 3, 2), ('2025-11-05', 3, 3), ('2025-11-06', 3, 1),
+            ('2025-11-07', 3, 5), ('2025-11-10', 3, 1), ('2025-11-11', 3, 2),
+            ('2025-11-12', 3, 3), ('2025-11-13', 3, 4), ('2025-11-14', 3, 5),
+            ('2025-11-17', 3, 1), ('2025-11-18', 3, 2), ('2025-11-19', 3, 3),
+            ('2025-11-20', 3, 4), ('2025-11-21', 3, 5), ('2025-11-25', 3, 1),
+            ('2025-11-26', 3, 3), ('2025-11-27', 3, 4), ('2025-11-28', 3, 5),
+            ('2025-12-01', 3, 1), ('2025-12-02', 3, 2), ('2025-12-03', 3, 3),
+            ('2025-12-04', 3, 4), ('2025-12-08', 3, 1), ('2025-12-09', 3, 2),
+            ('2025-12-10', 3, 3), ('2025-12-11', 3, 4), ('2025-12-12', 3, 5),
+            ('2025-12-15', 3, 1), ('2025-12-16', 3, 2), ('2025-12-18', 3, 4),
+            ('2025-12-19', 3, 5), ('2025-12-17', 4, 3), ('2025-12-22', 4, 1),
+            ('2025-12-23', 4, 2), ('2025-12-24', 4, 3), ('2025-12-25', 4, 4),
+            ('2025-12-26', 4, 5), ('2026-01-13', 4, 1), ('2026-01-14', 4, 3),
+            ('2026-01-15', 4, 4), ('2026-01-16', 4, 5), ('2026-01-19', 4, 1),
+            ('2026-01-20', 4, 2), ('2026-01-21', 4, 3), ('2026-01-22', 4, 4),
+            ('2026-01-23', 4, 5), ('2026-01-26', 4, 1), ('2026-01-27', 4, 2),
+            ('2026-01-28', 4, 3), ('2026-01-29', 4, 4), ('2026-01-30', 4, 5),
+            ('2026-02-02', 4, 1), ('2026-02-03', 4, 2), ('2026-02-04', 4, 3),
+            ('2026-02-06', 4, 5), ('2026-02-09', 4, 1), ('2026-02-10', 4, 2),
+            ('2026-02-12', 4, 4), ('2026-02-13', 4, 5), ('2026-02-16', 4, 1),
+            ('2026-02-17', 4, 2), ('2026-02-18', 4, 3), ('2026-02-19', 4, 4),
+            ('2026-02-20', 4, 5), ('2026-02-21', 4, 4), ('2026-02-24', 4, 2),
+            ('2026-02-25', 4, 3), ('2026-02-26', 4, 4), ('2026-02-27', 4, 5),
+            ('2026-03-02', 4, 1), ('2026-03-03', 4, 2), ('2026-03-04', 4, 3),
+            ('2026-03-05', 4, 4), ('2026-03-06', 4, 5), ('2026-03-09', 4, 1),
+            ('2026-03-10', 4, 2), ('2026-03-11', 4, 0)
+        ]
+        db.session.add_all([
+            授業計画(日付=datetime.strptime(date_str, '%Y-%m-%d').date(), 期=期, 授業曜日=曜日)
+            for date_str, 期, 曜日 in 授業計画データ
+        ])
+
+        # 期マスタを挿入
+        db.session.add_all([
+            期マスタ(期ID=1, 期名='Ⅰ'),
+            期マスタ(期ID=2, 期名='Ⅱ'),
+            期マスタ(期ID=3, 期名='Ⅲ'),
+            期マスタ(期ID=4, 期名='Ⅳ'),
+            期マスタ(期ID=5, 期名='Ⅴ'),
+            期マスタ(期ID=6, 期名='Ⅵ'),
+            期マスタ(期ID=7, 期名='Ⅶ'),
+            期マスタ(期ID=8, 期名='Ⅷ'),
+            期マスタ(期ID=9, 期名='前期(Ⅱ期)集中'),
+            期マスタ(期ID=10, 期名='後期(Ⅲ期)集中'),
+        ])
+
+        # カメラログの挿入（仮データ）
+        cam_src, cam_status, cam_marker = カメラソース(名前='カメラ1'), カメラ状態(名前='正常'), カメラマーカー(名前='青井')
+        db.session.add_all([cam_src, cam_status, cam_marker])
+        db.session.flush()
+        db.session.add_all([
+            カメラ区間(開始時刻=datetime(2025, 4, 8, 8, 50), 終了時刻=datetime(2025, 4, 8, 8, 50),
+                     ソースID=cam_src.ID, ステータスID=cam_status.ID, マーカーID=cam_marker.ID, 件数=1,
+                     スコア件数=1, スコア合計=0.95, スコア最小=0.95, スコア最大=0.95, メッセージ=''),
+            # 必要に応じて追加
+        ])
+
+        # 学科を挿入
+        db.session.add_all([
+            学科(学科ID=1, 学科名='生産機械システム技術科'),
+            学科(学科ID=2, 学科名='生産電気システム技術科'),
+            学科(学科ID=3, 学科名='生産電子情報システム技術科'),
+        ])
+
+        # 教室を挿入
+        db.session.add_all([
+            教室(教室ID=1205, 教室名='A205', 収容人数=20),
+            教室(教室ID=2102, 教室名='B102/103', 収容人数=20),
+            教室(教室ID=2201, 教室名='B201', 収容人数=20),
+            教室(教室ID=2202, 教室名='B202', 収容人数=20),
+            教室(教室ID=2204, 教室名='B204', 収容人数=20),
+            教室(教室ID=2205, 教室名='B205', 収容人数=20),
+            教室(教室ID=2301, 教室名='B301', 収容人数=20),
+            教室(教室ID=2302, 教室名='B302', 収容人数=20),
+            教室(教室ID=2303, 教室名='B303', 収容人数=20),
+            教室(教室ID=2304, 教室名='B304', 収容人数=20),
+            教室(教室ID=2305, 教室名='B305', 収容人数=20),
+            教室(教室ID=2306, 教室名='B306(視聴覚室)', 収容人数=20),
+            教室(教室ID=3101, 教室名='C101(生産ロボット室)', 収容人数=20),
+            教室(教室ID=3103, 教室名='C103(開発課題実習室)', 収容人数=20),
+            教室(教室ID=3201, 教室名='C201', 収容人数=20),
+            教室(教室ID=3202, 教室名='C202(応用課程計測制御応用実習室)', 収容人数=20),
+            教室(教室ID=3203, 教室名='C203', 収容人数=20),
+            教室(教室ID=3204, 教室名='C204', 収容人数=20),
+            教室(教室ID=3231, 教室名='C231(資料室)', 収容人数=20),
+            教室(教室ID=3301, 教室名='C301(マルチメディア実習室)', 収容人数=20),
+            教室(教室ID=3302, 教室名='C302(システム開発実習室)', 収容人数=20),
+            教室(教室ID=3303, 教室名='C303(システム開発実習室Ⅱ)', 収容人数=20),
+            教室(教室ID=3304, 教室名='C304/305(応用課程生産管理ネットワーク応用実習室)', 収容人数=20),
+            教室(教室ID=3306, 教室名='C306(共通実習室)', 収容人数=20),
+            教室(教室ID=4102, 教室名='D102(回路基板加工室)', 収容人数=20),
+            教室(教室ID=4201, 教室名='D201(開発課題実習室)', 収容人数=20),
+            教室(教室ID=4202, 教室名='D202(電子情報技術科教官室)', 収容人数=20),
+            教室(教室ID=4231, 教室名='D231(準備室)', 収容人数=20),
+            教室(教室ID=4301, 教室名='D301', 収容人数=20),
+            教室(教室ID=4302, 教室名='D302(PC実習室)', 収容人数=20),
+        ])
+
+        # 生徒を挿入
+        db.session.add_all([
+            生徒(学科ID=1, 学生番号=1, 生徒名='青井渓一郎'),
+            生徒(学科ID=1, 学生番号=2, 生徒名='赤坂龍成'),
+            生徒(学科ID=1, 学生番号=3, 生徒名='秋好拓海'),
+            生徒(学科ID=1, 学生番号=4, 生徒名='伊川翔'),
+            生徒(学科ID=1, 学生番号=5, 生徒名='岩切亮太'),
+            生徒(学科ID=1, 学生番号=6, 生徒名='上田和輝'),
+            生徒(学科ID=1, 学生番号=7, 生徒名='江本龍之介'),
+            生徒(学科ID=1, 学生番号=8, 生徒名='大久保碧瀧'),
+            生徒(学科ID=1, 学生番号=9, 生徒名='加來涼雅'),
+            生徒(学科ID=1, 学生番号=10, 生徒名='梶原悠平'),
+            生徒(学科ID=1, 学生番号=11, 生徒名='管野友富紀'),
+            生徒(学科ID=1, 学生番号=12, 生徒名='髙口翔真'),
+            生徒(学科ID=1, 学生番号=13, 生徒名='古城静雅'),
+            生徒(学科ID=1, 学生番号=14, 生徒名='小柳知也'),
+            生徒(学科ID=1, 学生番号=15, 生徒名='酒元翼'),
+            生徒(学科ID=1, 学生番号=16, 生徒名='光寺孝彦'),
+            生徒(学科ID=1, 学生番号=17, 生徒名='佐野勇太'),
+            生徒(学科ID=1, 学生番号=18, 生徒名='清水健心'),
+            生徒(学科ID=1, 学生番号=19, 生徒名='新谷雄飛'),
+            生徒(学科ID=1, 学生番号=20, 生徒名='関原響樹'),
+            生徒(学科ID=1, 学生番号=21, 生徒名='髙橋優人'),
+            生徒(学科ID=1, 学生番号=22, 生徒名='武富義樹'),
+            生徒(学科ID=1, 学生番号=23, 生徒名='内藤俊介'),
+            生徒(学科ID=1, 学生番号=24, 生徒名='野田千尋'),
+            生徒(学科ID=1, 学生番号=25, 生徒名='野中雄学'),
+            生徒(学科ID=1, 学生番号=26, 生徒名='東奈月'),
+            生徒(学科ID=1, 学生番号=27, 生徒名='古田雅也'),
+            生徒(学科ID=1, 学生番号=28, 生徒名='牧野倭大'),
+            生徒(学科ID=1, 学生番号=29, 生徒名='松隈駿介'),
+            生徒(学科ID=1, 学生番号=30, 生徒名='宮岡嘉熙'),
+            生徒(学科ID=3, 学生番号=1, 生徒名='青井渓一郎'),
+            生徒(学科ID=3, 学生番号=2, 生徒名='赤坂龍成'),
+            生徒(学科ID=3, 学生番号=3, 生徒名='秋好拓海'),
+            生徒(学科ID=3, 学生番号=4, 生徒名='伊川翔'),
+            生徒(学科ID=3, 学生番号=5, 生徒名='岩切亮太'),
+            生徒(学科ID=3, 学生番号=6, 生徒名='上田和輝'),
+            生徒(学科ID=3, 学生番号=7, 生徒名='江本龍之介'),
+            生徒(学科ID=3, 学生番号=8, 生徒名='大久保碧瀧'),
+            生徒(学科ID=3, 学生番号=9, 生徒名='加來涼雅'),
+            生徒(学科ID=3, 学生番号=10, 生徒名='梶原悠平'),
+            生徒(学科ID=3, 学生番号=11, 生徒名='管野友富紀'),
+            生徒(学科ID=3, 学生番号=12, 生徒名='髙口翔真'),
+            生徒(学科ID=3, 学生番号=13, 生徒名='古城静雅'),
+            生徒(学科ID=3, 学生番号=14, 生徒名='小柳知也'),
+            生徒(学科ID=3, 学生番号=15, 生徒名='酒元翼'),
+            生徒(学科ID=3, 学生番号=16, 生徒名='光寺孝彦'),
+            生徒(学科ID=3, 学生番号=17, 生徒名='佐野勇太'),
+            生徒(学科ID=3, 学生番号=18, 生徒名='清水健心'),
+            生徒(学科ID=3, 学生番号=19, 生徒名='新谷雄飛'),
+            生徒(学科ID=3, 学生番号=20, 生徒名='関原響樹'),
+            生徒(学科ID=3, 学生番号=21, 生徒名='髙橋優人'),
+            生徒(学科ID=3, 学生番号=22, 生徒名='武富義樹'),
+            生徒(学科ID=3, 学生番号=23, 生徒名='内藤俊介'),
+            生徒(学科ID=3, 学生番号=24, 生徒名='野田千尋'),
+            生徒(学科ID=3, 学生番号=25, 生徒名='野中雄学'),
+            生徒(学科ID=3, 学生番号=26, 生徒名='東奈月'),
+            生徒(学科ID=3, 学生番号=27, 生徒名='古田雅也'),
+            生徒(学科ID=3, 学生番号=28, 生徒名='牧野倭大'),
+            生徒(学科ID=3, 学生番号=29, 生徒名='松隈駿介'),
+            生徒(学科ID=3, 学生番号=30, 生徒名='宮岡嘉熙'),
+        ])
+
+        # 授業科目を挿入
+        db.session.add_all([
+            授業科目(授業科目ID=301, 授業科目名='工業技術英語', 学科ID=3, 単位=2, 学科フラグ=0),
+            授業科目(授業科目ID=302, 授業科目名='生産管理', 学科ID=3, 単位=2, 学科フラグ=0),
+            授業科目(授業科目ID=303, 授業科目名='品質管理', 学科ID=3, 単位=2, 学科フラグ=0),
+            授業科目(授業科目ID=304, 授業科目名='経営管理', 学科ID=3, 単位=2, 学科フラグ=0),
+            授業科目(授業科目ID=305, 授業科目名='創造的開発技法', 学科ID=3, 単位=2, 学科フラグ=0),
+            授業科目(授業科目ID=306, 授業科目名='工業法規', 学科ID=3, 単位=2, 学科フラグ=0),
+            授業科目(授業科目ID=307, 授業科目名='職業能力開発体系論', 学科ID=3, 単位=2, 学科フラグ=0),
+            授業科目(授業科目ID=308, 授業科目名='機械工学概論', 学科ID=3, 単位=2, 学科フラグ=0),
+            授業科目(授業科目ID=309, 授業科目名='アナログ回路応用設計技術', 学科ID=3, 単位=2, 学科フラグ=0),
+            授業科目(授業科目ID=310, 授業科目名='ディジタル回路応用設計技術', 学科ID=3, 単位=2, 学科フラグ=0),
+            授業科目(授業科目ID=311, 授業科目名='複合電子回路応用設計技術', 学科ID=3, 単位=2, 学科フラグ=0),
+            授業科目(授業科目ID=312, 授業科目名='ロボット工学', 学科ID=3, 単位=2, 学科フラグ=0),
+            授業科目(授業科目ID=313, 授業科目名='通信プロトコル実装設計', 学科ID=3, 単位=2, 学科フラグ=0),
+            授業科目(授業科目ID=314, 授業科目名='セキュアシステム設計', 学科ID=3, 単位=2, 学科フラグ=0),
+            授業科目(授業科目ID=315, 授業科目名='組込システム設計', 学科ID=3, 単位=4, 学科フラグ=0),
+            授業科目(授業科目ID=316, 授業科目名='安全衛生管理', 学科ID=3, 単位=2, 学科フラグ=0),
+            授業科目(授業科目ID=317, 授業科目名='機械工作・組立実習', 学科ID=3, 単位=4, 学科フラグ=0),
+            授業科目(授業科目ID=318, 授業科目名='実装設計製作実習', 学科ID=3, 単位=4, 学科フラグ=0),
+            授業科目(授業科目ID=319, 授業科目名='EMC応用実習', 学科ID=3, 単位=4, 学科フラグ=0),
+            授業科目(授業科目ID=320, 授業科目名='電子回路設計製作応用実習', 学科ID=3, 単位=4, 学科フラグ=0),
+            授業科目(授業科目ID=321, 授業科目名='制御回路設計製作実習', 学科ID=3, 単位=4, 学科フラグ=0),
+            授業科目(授業科目ID=322, 授業科目名='センシングシステム構築実習', 学科ID=3, 単位=4, 学科フラグ=0),
+            授業科目(授業科目ID=323, 授業科目名='ロボット工学実習', 学科ID=3, 単位=2, 学科フラグ=0),
+            授業科目(授業科目ID=324, 授業科目名='通信プロトコル実装実習', 学科ID=3, 単位=4, 学科フラグ=0),
+            授業科目(授業科目ID=325, 授業科目名='セキュアシステム構築実習', 学科ID=3, 単位=4, 学科フラグ=0),
+            授業科目(授業科目ID=326, 授業科目名='生産管理システム構築実習Ⅰ', 学科ID=3, 単位=2, 学科フラグ=0),
+            授業科目(授業科目ID=327, 授業科目名='生産管理システム構築実習Ⅱ', 学科ID=3, 単位=2, 学科フラグ=0),
+            授業科目(授業科目ID=328, 授業科目名='組込システム構築実習', 学科ID=3, 単位=4, 学科フラグ=0),
+            授業科目(授業科目ID=329, 授業科目名='組込デバイス設計実習', 学科ID=3, 単位=4, 学科フラグ=0),
+            授業科目(授業科目ID=330, 授業科目名='組込システム構築課題実習', 学科ID=3, 単位=10, 学科フラグ=0),
+            授業科目(授業科目ID=331, 授業科目名='電子通信機器設計制作課題実習', 学科ID=3, 単位=10, 学科フラグ=0),
+            授業科目(授業科目ID=332, 授業科目名='ロボット機器制作課題実習(電子情報)', 学科ID=3, 単位=10, 学科フラグ=0),
+            授業科目(授業科目ID=333, 授業科目名='ロボット機器運用課題実習(電子情報)', 学科ID=3, 単位=10, 学科フラグ=0),
+            授業科目(授業科目ID=380, 授業科目名='標準課題Ⅰ', 学科ID=3, 単位=10, 学科フラグ=0),
+            授業科目(授業科目ID=381, 授業科目名='標準課題Ⅱ', 学科ID=3, 単位=10, 学科フラグ=0),
+            授業科目(授業科目ID=334, 授業科目名='電子装置設計製作応用課題実習', 学科ID=3, 単位=54, 学科フラグ=0),
+            授業科目(授業科目ID=335, 授業科目名='組込システム応用課題実習', 学科ID=3, 単位=54, 学科フラグ=0),
+            授業科目(授業科目ID=336, 授業科目名='通信システム応用課題実習', 学科ID=3, 単位=54, 学科フラグ=0),
+            授業科目(授業科目ID=337, 授業科目名='ロボットシステム応用課題実習', 学科ID=3, 単位=54, 学科フラグ=0),
+            授業科目(授業科目ID=390, 授業科目名='開発課題', 学科ID=3, 単位=54, 学科フラグ=0)
+        ])
+
+        # 曜日マスタを挿入
+        db.session.add_all([
+            曜日マスタ(曜日ID=0, 曜日名='授業日'),
+            曜日マスタ(曜日ID=1, 曜日名='月曜日'),
+            曜日マスタ(曜日ID=2, 曜日名='火曜日'),
+            曜日マスタ(曜日ID=3, 曜日名='水曜日'),
+            曜日マスタ(曜日ID=4, 曜日名='木曜日'),
+            曜日マスタ(曜日ID=5, 曜日名='金曜日'),
+            曜日マスタ(曜日ID=6, 曜日名='土曜日'),
+            曜日マスタ(曜日ID=7, 曜日名='日曜日'),
+            曜日マスタ(曜日ID=8, 曜日名='祝祭日'),
+        ])
+
+        # 週時間割を挿入
+        db.session.add_all([
+            週時間割(年度=2025, 学科ID=3, 期=1, 曜日=1, 時限=1, 科目ID=325, 教室ID=3301, 備考='C304/寺内'),
+            週時間割(年度=2025, 学科ID=3, 期=1, 曜日=1, 時限=2, 科目ID=325, 教室ID=3301, 備考='C304/寺内'),
+            週時間割(年度=2025, 学科ID=3, 期=1, 曜日=1, 時限=3, 科目ID=301, 教室ID=2201, 備考='/ワット'),
+            週時間割(年度=2025, 学科ID=3, 期=1, 曜日=1, 時限=4, 科目ID=313, 教室ID=3301, 備考='C302/中山'),
+            週時間割(年度=2025, 学科ID=3, 期=1, 曜日=2, 時限=1, 科目ID=314, 教室ID=3301, 備考='C304/寺内'),
+            週時間割(年度=2025, 学科ID=3, 期=1, 曜日=2, 時限=2, 科目ID=309, 教室ID=3301, 備考='C304/諏訪原'),
+            週時間割(年度=2025, 学科ID=3, 期=1, 曜日=2, 時限=3, 科目ID=310, 教室ID=3301, 備考='/岡田'),
+            週時間割(年度=2025, 学科ID=3, 期=1, 曜日=2, 時限=4, 科目ID=311, 教室ID=3301, 備考='C302/近藤'),
+            週時間割(年度=2025, 学科ID=3, 期=1, 曜日=3, 時限=1, 科目ID=312, 教室ID=2301, 備考='B102/玉井'),
+            週時間割(年度=2025, 学科ID=3, 期=1, 曜日=3, 時限=2, 科目ID=312, 教室ID=2301, 備考='B102/玉井'),
+            週時間割(年度=2025, 学科ID=3, 期=1, 曜日=4, 時限=1, 科目ID=315, 教室ID=3302, 備考='/下泉'),
+            週時間割(年度=2025, 学科ID=3, 期=1, 曜日=4, 時限=2, 科目ID=328, 教室ID=3302, 備考='/下泉'),
+            週時間割(年度=2025, 学科ID=3, 期=1, 曜日=4, 時限=3, 科目ID=322, 教室ID=3302, 備考='/寺内'),
+            週時間割(年度=2025, 学科ID=3, 期=1, 曜日=4, 時限=4, 科目ID=322, 教室ID=3302, 備考='/寺内'),
+            週時間割(年度=2025, 学科ID=3, 期=1, 曜日=5, 時限=1, 科目ID=315, 教室ID=3302, 備考='/下泉'),
+            週時間割(年度=2025, 学科ID=3, 期=1, 曜日=5, 時限=2, 科目ID=328, 教室ID=3302, 備考='/下泉'),
+            週時間割(年度=2025, 学科ID=3, 期=1, 曜日=5, 時限=3, 科目ID=318, 教室ID=3302, 備考='/近藤'),
+            週時間割(年度=2025, 学科ID=3, 期=1, 曜日=5, 時限=4, 科目ID=318, 教室ID=3302, 備考='/近藤'),
+            週時間割(年度=2025, 学科ID=3, 期=2, 曜日=1, 時限=1, 科目ID=325, 教室ID=3301, 備考='/寺内'),
+            週時間割(年度=2025, 学科ID=3, 期=2, 曜日=1, 時限=2, 科目ID=325, 教室ID=3301, 備考='/寺内'),
+            週時間割(年度=2025, 学科ID=3, 期=2, 曜日=1, 時限=3, 科目ID=301, 教室ID=2201, 備考='/ワット'),
+            週時間割(年度=2025, 学科ID=3, 期=2, 曜日=1, 時限=4, 科目ID=313, 教室ID=3301, 備考='/中山'),
+            週時間割(年度=2025, 学科ID=3, 期=2, 曜日=2, 時限=1, 科目ID=325, 教室ID=3301, 備考='/寺内'),
+            週時間割(年度=2025, 学科ID=3, 期=2, 曜日=2, 時限=2, 科目ID=309, 教室ID=3301, 備考='/諏訪原'),
+            週時間割(年度=2025, 学科ID=3, 期=2, 曜日=2, 時限=3, 科目ID=310, 教室ID=3301, 備考='/岡田'),
+            週時間割(年度=2025, 学科ID=3, 期=2, 曜日=2, 時限=4, 科目ID=311, 教室ID=3302, 備考='/近藤'),
+            週時間割(年度=2025, 学科ID=3, 期=2, 曜日=3, 時限=1, 科目ID=324, 教室ID=3301, 備考='/中山'),
+            週時間割(年度=2025, 学科ID=3, 期=2, 曜日=3, 時限=2, 科目ID=324, 教室ID=3301, 備考='/中山'),
+            週時間割(年度=2025, 学科ID=3, 期=2, 曜日=4, 時限=1, 科目ID=323, 教室ID=3101, 備考='/電気系'),
+            週時間割(年度=2025, 学科ID=3, 期=2, 曜日=4, 時限=2, 科目ID=323, 教室ID=3101, 備考='/電気系'),
+            週時間割(年度=2025, 学科ID=3, 期=2, 曜日=4, 時限=3, 科目ID=315, 教室ID=3302, 備考='/下泉'),
+            週時間割(年度=2025, 学科ID=3, 期=2, 曜日=4, 時限=4, 科目ID=328, 教室ID=3302, 備考='/下泉'),
+            週時間割(年度=2025, 学科ID=3, 期=2, 曜日=5, 時限=3, 科目ID=322, 教室ID=3302, 備考='/玉井'),
+            週時間割(年度=2025, 学科ID=3, 期=2, 曜日=5, 時限=4, 科目ID=322, 教室ID=3302, 備考='/玉井'),
+            週時間割(年度=2025, 学科ID=3, 期=3, 曜日=1, 時限=1, 科目ID=327, 教室ID=3301, 備考='/中山'),
+            週時間割(年度=2025, 学科ID=3, 期=3, 曜日=1, 時限=2, 科目ID=327, 教室ID=3301, 備考='/中山'),
+            週時間割(年度=2025, 学科ID=3, 期=3, 曜日=1, 時限=3, 科目ID=380, 教室ID=3301, 備考='C302/電子情報系'),
+            週時間割(年度=2025, 学科ID=3, 期=3, 曜日=1, 時限=4, 科目ID=380, 教室ID=3301, 備考='C302/電子情報系'),
+            週時間割(年度=2025, 学科ID=3, 期=3, 曜日=2, 時限=1, 科目ID=317, 教室ID=3302, 備考='K302/機械系'),
+            週時間割(年度=2025, 学科ID=3, 期=3, 曜日=2, 時限=2, 科目ID=317, 教室ID=3302, 備考='K302/機械系'),
+            週時間割(年度=2025, 学科ID=3, 期=3, 曜日=2, 時限=3, 科目ID=380, 教室ID=3301, 備考='C302/電子情報系'),
+            週時間割(年度=2025, 学科ID=3, 期=3, 曜日=2, 時限=4, 科目ID=380, 教室ID=3301, 備考='C302/電子情報系'),
+            週時間割(年度=2025, 学科ID=3, 期=3, 曜日=3, 時限=1, 科目ID=329, 教室ID=3301, 備考='/岡田'),
+            週時間割(年度=2025, 学科ID=3, 期=3, 曜日=3, 時限=2, 科目ID=329, 教室ID=3301, 備考='/岡田'),
+            週時間割(年度=2025, 学科ID=3, 期=3, 曜日=3, 時限=3, 科目ID=308, 教室ID=2301, 備考='/上野'),
+            週時間割(年度=2025, 学科ID=3, 期=3, 曜日=3, 時限=4, 科目ID=380, 教室ID=3301, 備考='C302/電子情報系'),
+            週時間割(年度=2025, 学科ID=3, 期=3, 曜日=3, 時限=5, 科目ID=321, 教室ID=3302, 備考='/玉井'),
+            週時間割(年度=2025, 学科ID=3, 期=3, 曜日=4, 時限=1, 科目ID=381, 教室ID=3302, 備考='C101/電子情報系'),
+            週時間割(年度=2025, 学科ID=3, 期=3, 曜日=4, 時限=2, 科目ID=381, 教室ID=3302, 備考='C101/電子情報系'),
+            週時間割(年度=2025, 学科ID=3, 期=3, 曜日=4, 時限=3, 科目ID=329, 教室ID=3301, 備考='/岡田'),
+            週時間割(年度=2025, 学科ID=3, 期=3, 曜日=4, 時限=4, 科目ID=331, 教室ID=3302, 備考='C101/電子情報系'),
+            週時間割(年度=2025, 学科ID=3, 期=3, 曜日=4, 時限=5, 科目ID=331, 教室ID=3302, 備考='C101/電子情報系'),
+            週時間割(年度=2025, 学科ID=3, 期=3, 曜日=5, 時限=1, 科目ID=331, 教室ID=3302, 備考='C101/電子情報系'),
+            週時間割(年度=2025, 学科ID=3, 期=3, 曜日=5, 時限=2, 科目ID=331, 教室ID=3302, 備考='C101/電子情報系'),
+            週時間割(年度=2025, 学科ID=3, 期=3, 曜日=5, 時限=3, 科目ID=380, 教室ID=3301, 備考='C302/電子情報系'),
+            週時間割(年度=2025, 学科ID=3, 期=3, 曜日=5, 時限=4, 科目ID=380, 教室ID=3301, 備考='C302/電子情報系'),
+            週時間割(年度=2025, 学科ID=3, 期=4, 曜日=1, 時限=1, 科目ID=381, 教室ID=3302, 備考='C101/電子情報系'),
+            週時間割(年度=2025, 学科ID=3, 期=4, 曜日=1, 時限=2, 科目ID=381, 教室ID=3302, 備考='C101/電子情報系'),
+            週時間割(年度=2025, 学科ID=3, 期=4, 曜日=2, 時限=1, 科目ID=317, 教室ID=3302, 備考='K302/機械系'),
+            週時間割(年度=2025, 学科ID=3, 期=4, 曜日=2, 時限=2, 科目ID=317, 教室ID=3302, 備考='K302/機械系'),
+            週時間割(年度=2025, 学科ID=3, 期=4, 曜日=2, 時限=3, 科目ID=381, 教室ID=3302, 備考='C101/電子情報系'),
+            週時間割(年度=2025, 学科ID=3, 期=4, 曜日=2, 時限=4, 科目ID=381, 教室ID=3302, 備考='C101/電子情報系'),
+            週時間割(年度=2025, 学科ID=3, 期=4, 曜日=3, 時限=1, 科目ID=329, 教室ID=3301, 備考='/岡田'),
+            週時間割(年度=2025, 学科ID=3, 期=4, 曜日=3, 時限=2, 科目ID=329, 教室ID=3301, 備考='/岡田'),
+            週時間割(年度=2025, 学科ID=3, 期=4, 曜日=3, 時限=3, 科目ID=308, 教室ID=2301, 備考='/上野'),
+            週時間割(年度=2025, 学科ID=3, 期=4, 曜日=4, 時限=1, 科目ID=331, 教室ID=3302, 備考='C101/電子情報系'),
+            週時間割(年度=2025, 学科ID=3, 期=4, 曜日=4, 時限=2, 科目ID=331, 教室ID=3302, 備考='C101/電子情報系'),
+            週時間割(年度=2025, 学科ID=3, 期=4, 曜日=4, 時限=3, 科目ID=331, 教室ID=3302, 備考='C101/電子情報系'),
+            週時間割(年度=2025, 学科ID=3, 期=4, 曜日=4, 時限=4, 科目ID=331, 教室ID=3302, 備考='C101/電子情報系'),
+            週時間割(年度=2025, 学科ID=3, 期=4, 曜日=5, 時限=1, 科目ID=331, 教室ID=3302, 備考='C101/電子情報系'),
+            週時間割(年度=2025, 学科ID=3, 期=4, 曜日=5, 時限=2, 科目ID=331, 教室ID=3302, 備考='C101/電子情報系'),
+        ])
+
+        db.session.commit()
+        print('マスタデータの挿入が完了しました。')
+    except IntegrityError:
+        # 既にデータが存在する場合 (UNIQUE制約違反など) はスキップ
+        db.session.rollback()
+        print('マスタデータは既に挿入されています。スキップしました。')
+    except Exception as e:
+        db.session.rollback()
+        print(f"初期データ挿入中にエラーが発生しました: {e}")
+
+# =========================================================================
+# 初期化（スキーマのマイグレーションは schema.py で一度だけ実行）
+# =========================================================================
+# 0 にすると起動時は適用せず、`flask --app web db-upgrade` で明示的に適用する
+SCHEMA_AUTO_UPGRADE = os.environ.get("SCHEMA_AUTO_UPGRADE", "1") == "1"
+# _insert_initial_data() の内容を変えたら上げる（app_meta.seed_version と比較）
+SEED_VERSION = "1"
+
+_db_initialized = False
+_db_init_lock = threading.Lock()
+
+
+def _db_is_ready() -> bool:
+    """スキーマが最新で初期データも投入済みか（起動ごとの確認はこの2クエリだけ）。"""
+    return (schema.current_version(db.engine) >= schema.LATEST_VERSION
+            and schema.get_meta(db.engine, "seed_version") == SEED_VERSION)
+
+
+def _seed_initial_data():
+    seeded = schema.get_meta(db.engine, "seed_version")
+    if seeded == SEED_VERSION:
+        return
+    with get_conn() as conn:
+        has_master = conn.execute(select(TimeTable.時限).limit(1)).first() is not None
+    # マーカー導入前から使っている DB はマスタ投入済みとみなし、印だけ付ける
+    if seeded is None and has_master:
+        print("[DB] 既存のマスタデータを検出しました。初期データの投入は省略します。")
+    else:
+        _insert_initial_data()
+    with db.engine.begin() as conn:
+        schema.set_meta(conn, "seed_version", SEED_VERSION)
+
+
+def init_db_on_startup(app):
+    """
+    スキーマの適用と初期データの投入（プロセスごとに一度だけ）。
+    済んでいれば数クエリで戻る。未了の場合だけプロセス間ロックをとって実行するので、
+    gunicorn の複数ワーカーが同時に起動しても二重に投入されない。
+    失敗した場合（スキーマが最新にならない場合を含む）は例外をそのまま上げ、
+    済んだ印も付けない（古いスキーマのまま処理させず、次のリクエストでやり直す）。
+    """
+    global _db_initialized
+    if _db_initialized:
+        return
+    with _db_init_lock:
+        if _db_initialized:
+            return
+        with app.app_context():
+            try:
+                if not _db_is_ready():
+                    with schema.startup_lock(db.engine):
+                        # ロック待ちの間に他のプロセスが済ませているかもしれない
+                        if not _db_is_ready():
+                            _upgrade_and_seed()
+            except Exception as e:
+                print(f"[DB] エラー: {e}")
+                raise
+        _db_initialized = True
+
+
+def _upgrade_and_seed():
+    if SCHEMA_AUTO_UPGRADE:
+        applied = schema.upgrade(db.engine, db.metadata)
+        if applied:
+            print(f"[DB] マイグレーションを適用しました: {applied}")
+    version = schema.current_version(db.engine)
+    if version < schema.LATEST_VERSION:
+        raise RuntimeError(f"スキーマが古い状態です（v{version} < v{schema.LATEST_VERSION}）。"
+                           "flask --app web db-upgrade を実行してください。")
+    _seed_initial_data()
+
+
+def prepare_preload(app):
+    """
+    gunicorn の preload モードで、マスタープロセスが fork 前に呼ぶ。
+    スキーマ・初期データを確認し、読み取り専用キャッシュを温めてから
+    マスターの DB 接続を閉じる（接続はワーカー間で共有できないため）。
+    """
+    init_db_on_startup(app)
+    with app.app_context():
+        warm_lookups()
+        db.engine.dispose()
+
+
+def reset_after_fork(app):
+    """fork 直後のワーカーで呼ぶ。親から引き継いだプールを捨てて作り直す。"""
+    with app.app_context():
+        # close=False: 親プロセスの接続（ソケット）を子から閉じない
+        db.engine.dispose(close=False)
+
+
+def init_app(app):
+    """最初のリクエストで init_db_on_startup() を呼ぶ before_request を登録する。"""
+
+    # インポート時には DB に触らない。最初のリクエスト（または gunicorn の
+    # post_worker_init / __main__）で初期化する。
+    @app.before_request
+    def _ensure_db_initialized():
+        if not _db_initialized:
+            init_db_on_startup(current_app._get_current_object())